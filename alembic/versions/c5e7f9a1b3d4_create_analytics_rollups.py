@@ -0,0 +1,87 @@
+"""create_analytics_rollups
+
+Revision ID: c5e7f9a1b3d4
+Revises: b4d6e8f0a2c3
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c5e7f9a1b3d4"
+down_revision: Union[str, Sequence[str], None] = "b4d6e8f0a2c3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "analytics_daily_sales",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("orders", sa.Integer(), nullable=False),
+        sa.Column("units", sa.Integer(), nullable=False),
+        sa.Column("revenue", sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.PrimaryKeyConstraint("day"),
+    )
+    op.create_table(
+        "analytics_daily_category_sales",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("category_id", sa.Integer(), nullable=False),
+        sa.Column("orders", sa.Integer(), nullable=False),
+        sa.Column("units", sa.Integer(), nullable=False),
+        sa.Column("revenue", sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.PrimaryKeyConstraint("day", "category_id"),
+    )
+    op.create_index(
+        op.f("ix_analytics_daily_category_sales_category_id"),
+        "analytics_daily_category_sales",
+        ["category_id"],
+        unique=False,
+    )
+    op.create_table(
+        "analytics_daily_product_sales",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("category_id", sa.Integer(), nullable=False),
+        sa.Column("orders", sa.Integer(), nullable=False),
+        sa.Column("units", sa.Integer(), nullable=False),
+        sa.Column("revenue", sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.PrimaryKeyConstraint("day", "product_id"),
+    )
+    op.create_index(
+        op.f("ix_analytics_daily_product_sales_product_id"),
+        "analytics_daily_product_sales",
+        ["product_id"],
+        unique=False,
+    )
+    op.create_table(
+        "analytics_dirty_days",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("marked_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+        sa.PrimaryKeyConstraint("day"),
+    )
+    # пересчёт итогов выбирает заказы по диапазону дат создания
+    op.create_index(op.f("ix_orders_created_at"), "orders", ["created_at"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_orders_created_at"), table_name="orders")
+    op.drop_table("analytics_dirty_days")
+    op.drop_index(
+        op.f("ix_analytics_daily_product_sales_product_id"),
+        table_name="analytics_daily_product_sales",
+    )
+    op.drop_table("analytics_daily_product_sales")
+    op.drop_index(
+        op.f("ix_analytics_daily_category_sales_category_id"),
+        table_name="analytics_daily_category_sales",
+    )
+    op.drop_table("analytics_daily_category_sales")
+    op.drop_table("analytics_daily_sales")
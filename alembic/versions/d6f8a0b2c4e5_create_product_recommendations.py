@@ -0,0 +1,46 @@
+"""create_product_recommendations
+
+Revision ID: d6f8a0b2c4e5
+Revises: c5e7f9a1b3d4
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d6f8a0b2c4e5"
+down_revision: Union[str, Sequence[str], None] = "c5e7f9a1b3d4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "product_recommendations",
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("rank", sa.SmallInteger(), nullable=False),
+        sa.Column("related_product_id", sa.Integer(), nullable=False),
+        sa.Column("score", sa.Float(), nullable=False),
+        sa.Column("orders", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["product_id"], ["products.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["related_product_id"], ["products.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("product_id", "rank"),
+    )
+    op.create_index(
+        op.f("ix_product_recommendations_related_product_id"),
+        "product_recommendations",
+        ["related_product_id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_product_recommendations_related_product_id"), table_name="product_recommendations")
+    op.drop_table("product_recommendations")
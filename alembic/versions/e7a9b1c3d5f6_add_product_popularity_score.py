@@ -0,0 +1,33 @@
+"""add_product_popularity_score
+
+Revision ID: e7a9b1c3d5f6
+Revises: d6f8a0b2c4e5
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e7a9b1c3d5f6"
+down_revision: Union[str, Sequence[str], None] = "d6f8a0b2c4e5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("products", sa.Column("popularity_score", sa.Float(), server_default="0", nullable=False))
+    op.create_index(
+        "ix_products_popularity", "products", [sa.literal_column("popularity_score DESC"), "id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_products_popularity", table_name="products")
+    op.drop_column("products", "popularity_score")
@@ -0,0 +1,52 @@
+"""add_category_tree
+
+Revision ID: f8b0c2d4e6a7
+Revises: e7a9b1c3d5f6
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f8b0c2d4e6a7"
+down_revision: Union[str, Sequence[str], None] = "e7a9b1c3d5f6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "category_closure",
+        sa.Column("ancestor_id", sa.Integer(), nullable=False),
+        sa.Column("descendant_id", sa.Integer(), nullable=False),
+        sa.Column("depth", sa.SmallInteger(), nullable=False),
+        sa.ForeignKeyConstraint(["ancestor_id"], ["categories.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["descendant_id"], ["categories.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("ancestor_id", "descendant_id"),
+    )
+    op.create_index(
+        op.f("ix_category_closure_descendant_id"), "category_closure", ["descendant_id"], unique=False
+    )
+    op.add_column("categories", sa.Column("parent_id", sa.Integer(), nullable=True))
+    op.create_index(op.f("ix_categories_parent_id"), "categories", ["parent_id"], unique=False)
+    op.create_foreign_key("categories_parent_id_fkey", "categories", "categories", ["parent_id"], ["id"])
+
+    # существующие категории - корневые: в таблице замыкания только путь к самой себе
+    op.execute(
+        "INSERT INTO category_closure (ancestor_id, descendant_id, depth) SELECT id, id, 0 FROM categories"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint("categories_parent_id_fkey", "categories", type_="foreignkey")
+    op.drop_index(op.f("ix_categories_parent_id"), table_name="categories")
+    op.drop_column("categories", "parent_id")
+    op.drop_index(op.f("ix_category_closure_descendant_id"), table_name="category_closure")
+    op.drop_table("category_closure")
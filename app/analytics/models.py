@@ -0,0 +1,63 @@
+from datetime import date, datetime
+
+from sqlalchemy import Date, DateTime, Integer, Numeric, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.database import Base
+
+
+class DailySales(Base):
+    """Итоги продаж за день"""
+
+    __tablename__ = "analytics_daily_sales"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    orders: Mapped[int] = mapped_column(Integer, nullable=False)
+    units: Mapped[int] = mapped_column(Integer, nullable=False)
+    revenue: Mapped[float] = mapped_column(Numeric(12, 2), nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<DailySales(day={self.day}, orders={self.orders}, revenue={self.revenue})>"
+
+
+class DailyCategorySales(Base):
+    """Продажи категории за день; orders - количество заказов с товарами категории"""
+
+    __tablename__ = "analytics_daily_category_sales"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    category_id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    orders: Mapped[int] = mapped_column(Integer, nullable=False)
+    units: Mapped[int] = mapped_column(Integer, nullable=False)
+    revenue: Mapped[float] = mapped_column(Numeric(12, 2), nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<DailyCategorySales(day={self.day}, category_id={self.category_id}, revenue={self.revenue})>"
+
+
+class DailyProductSales(Base):
+    """Продажи товара за день"""
+
+    __tablename__ = "analytics_daily_product_sales"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    product_id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    category_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    orders: Mapped[int] = mapped_column(Integer, nullable=False)
+    units: Mapped[int] = mapped_column(Integer, nullable=False)
+    revenue: Mapped[float] = mapped_column(Numeric(12, 2), nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<DailyProductSales(day={self.day}, product_id={self.product_id}, revenue={self.revenue})>"
+
+
+class DirtyDay(Base):
+    """День, итоги которого нужно пересчитать (появились или изменились заказы)"""
+
+    __tablename__ = "analytics_dirty_days"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    marked_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+
+    def __repr__(self) -> str:
+        return f"<DirtyDay(day={self.day})>"
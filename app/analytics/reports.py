@@ -0,0 +1,233 @@
+"""
+Отчёты для админов на NumPy.
+
+Позиции заказов за период читаются серверным курсором пачками и превращаются в
+структурированные массивы; группировки, перцентили и гистограммы считаются
+векторно (`np.unique`, `np.bincount`, `np.cumsum`), а не циклом по ORM-объектам.
+
+Отчёт - объект с методами `update(chunk)` и `result()`. В режиме ограниченной
+памяти (`chunk_size > 0`) отчёт получает пачки целых заказов (строки
+последнего заказа пачки переносятся в следующую) и хранит только накопленные
+суммы по ключам, поэтому память зависит от числа товаров/категорий, а не от
+размера периода. При `chunk_size == 0` период загружается в память одним массивом.
+"""
+
+import math
+from collections.abc import AsyncIterator, Sequence
+from typing import Any, Protocol
+
+import numpy as np
+from sqlalchemy import Float, Select, cast, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.orders.models import Order, OrderItem
+from app.orders.schemas import EXCLUDED_STATUSES, OrderStatus
+from app.products.models import Product
+
+# колонки позиции заказа в том порядке, в котором их возвращает запрос
+ROW_FIELDS = (
+    ("order_id", "i8"),
+    ("product_id", "i8"),
+    ("category_id", "i8"),
+    ("quantity", "i8"),
+    ("amount", "f8"),
+    ("sold", "?"),
+    ("delivered", "?"),
+)
+ROW_DTYPE = np.dtype(list(ROW_FIELDS))
+
+# границы корзин гистограммы размера заказа (штук товара): 1, 2, ..., 6-10, 11-20, 21+
+BASKET_SIZE_EDGES = (1, 2, 3, 4, 5, 6, 11, 21)
+
+
+class Report(Protocol):
+    def update(self, chunk: "np.ndarray") -> None: ...
+
+    def result(self) -> Any: ...
+
+
+def order_items_query(date_from, date_to) -> Select:
+    """Позиции заказов, созданных в [date_from, date_to), упорядоченные по заказу"""
+    return (
+        select(
+            Order.id,
+            OrderItem.product_id,
+            Product.category_id,
+            OrderItem.quantity,
+            cast(OrderItem.quantity * OrderItem.product_price, Float),
+            Order.order_status.not_in(EXCLUDED_STATUSES),
+            Order.order_status == OrderStatus.DELIVERED,
+        )
+        .join(OrderItem, OrderItem.order_id == Order.id)
+        .join(Product, Product.id == OrderItem.product_id)
+        .where(Order.created_at >= date_from, Order.created_at < date_to)
+        .order_by(Order.id)
+    )
+
+
+def _to_array(rows: Sequence) -> "np.ndarray":
+    return np.fromiter((tuple(row) for row in rows), dtype=ROW_DTYPE, count=len(rows))
+
+
+async def iter_order_chunks(
+    session: AsyncSession,
+    query: Select,
+    chunk_size: int,
+) -> AsyncIterator["np.ndarray"]:
+    """Массивы позиций заказов; каждая пачка содержит только целые заказы
+
+    Args:
+        session (AsyncSession): Асинхронная сессия БД
+        query (Select): Запрос позиций, упорядоченный по ID заказа
+        chunk_size (int): Строк в пачке серверного курсора (0 - весь результат одним массивом)
+    """
+    if chunk_size <= 0:
+        result = await session.execute(query)
+        rows = result.all()
+        if rows:
+            yield _to_array(rows)
+        return
+
+    result = await session.stream(query.execution_options(yield_per=chunk_size))
+    carry = None
+    async for rows in result.partitions():
+        chunk = _to_array(rows)
+        if carry is not None:
+            chunk = np.concatenate([carry, chunk])
+
+        # последний заказ пачки может продолжиться в следующей - придерживаем его строки
+        split = int(np.searchsorted(chunk["order_id"], chunk["order_id"][-1]))
+        carry = chunk[split:]
+        if split:
+            yield chunk[:split]
+
+    if carry is not None and len(carry):
+        yield carry
+
+
+async def run_report(session: AsyncSession, report: Report, query: Select, chunk_size: int) -> Any:
+    async for chunk in iter_order_chunks(session, query, chunk_size):
+        report.update(chunk)
+
+    return report.result()
+
+
+class GroupedSums:
+    """Суммы нескольких величин по целочисленному ключу, накапливаемые по пачкам
+
+    Attributes:
+        keys (np.ndarray): Отсортированные уникальные ключи
+        sums (np.ndarray): Суммы, по строке на каждую величину
+    """
+
+    def __init__(self, values: int) -> None:
+        self.keys = np.empty(0, dtype=np.int64)
+        self.sums = np.empty((values, 0), dtype=np.float64)
+
+    def add(self, keys: "np.ndarray", *values: "np.ndarray") -> None:
+        all_keys = np.concatenate([self.keys, keys])
+        self.keys, inverse = np.unique(all_keys, return_inverse=True)
+        self.sums = np.vstack(
+            [
+                np.bincount(inverse, weights=np.concatenate([old, new]), minlength=len(self.keys))
+                for old, new in zip(self.sums, values, strict=True)
+            ]
+        )
+
+
+class TopSellersReport:
+    """Товары с наибольшей выручкой (без отменённых и возвращённых заказов)"""
+
+    def __init__(self, limit: int = 20) -> None:
+        self.limit = limit
+        self._totals = GroupedSums(values=2)
+
+    def update(self, chunk: "np.ndarray") -> None:
+        sold = chunk[chunk["sold"]]
+        self._totals.add(sold["product_id"], sold["quantity"], sold["amount"])
+
+    def result(self) -> list[dict[str, Any]]:
+        units, revenue = self._totals.sums
+        top = np.argsort(-revenue, kind="stable")[: self.limit]
+        return [
+            {
+                "product_id": int(self._totals.keys[i]),
+                "units": int(units[i]),
+                "revenue": round(float(revenue[i]), 2),
+            }
+            for i in top
+        ]
+
+
+class BasketSizeReport:
+    """Распределение количества товаров в заказе: среднее, перцентили, гистограмма"""
+
+    percentiles = (50, 90, 99)
+
+    def __init__(self) -> None:
+        # ключ - размер заказа в штуках, значение - количество таких заказов;
+        # размеры целые, поэтому перцентили по этим счётчикам точные и в режиме пачек
+        self._sizes = GroupedSums(values=1)
+
+    def update(self, chunk: "np.ndarray") -> None:
+        sold = chunk[chunk["sold"]]
+        _, order_index = np.unique(sold["order_id"], return_inverse=True)
+        sizes = np.bincount(order_index, weights=sold["quantity"]).astype(np.int64)
+        self._sizes.add(sizes, np.ones(len(sizes)))
+
+    def result(self) -> dict[str, Any]:
+        sizes = self._sizes.keys
+        counts = self._sizes.sums[0]
+        orders = int(counts.sum())
+        if not orders:
+            return {"orders": 0, "mean": 0.0, "percentiles": {}, "histogram": []}
+
+        cumulative = np.cumsum(counts)
+        percentiles = {
+            f"p{p}": int(sizes[np.searchsorted(cumulative, math.ceil(p / 100 * orders))])
+            for p in self.percentiles
+        }
+
+        edges = np.array(BASKET_SIZE_EDGES)
+        buckets = np.bincount(
+            np.searchsorted(edges, sizes, side="right") - 1, weights=counts, minlength=len(edges)
+        )
+        labels = [
+            str(low) if high - low == 1 else f"{low}-{high - 1}"
+            for low, high in zip(BASKET_SIZE_EDGES, BASKET_SIZE_EDGES[1:])
+        ] + [f"{BASKET_SIZE_EDGES[-1]}+"]
+
+        return {
+            "orders": orders,
+            "mean": round(float((sizes * counts).sum() / orders), 2),
+            "percentiles": percentiles,
+            "histogram": [{"size": label, "orders": int(n)} for label, n in zip(labels, buckets)],
+        }
+
+
+class CategoryConversionReport:
+    """Доля доставленных заказов среди всех заказов с товарами категории"""
+
+    def __init__(self) -> None:
+        self._totals = GroupedSums(values=2)
+
+    def update(self, chunk: "np.ndarray") -> None:
+        # заказ считается в категории один раз, сколько бы её товаров в нём ни было
+        pairs, first = np.unique(
+            np.stack([chunk["order_id"], chunk["category_id"]], axis=1), axis=0, return_index=True
+        )
+        self._totals.add(pairs[:, 1], np.ones(len(pairs)), chunk["delivered"][first].astype(np.float64))
+
+    def result(self) -> list[dict[str, Any]]:
+        orders, delivered = self._totals.sums
+        conversion = np.divide(delivered, orders, out=np.zeros_like(orders), where=orders > 0)
+        ranking = np.argsort(-conversion, kind="stable")
+        return [
+            {
+                "category_id": int(self._totals.keys[i]),
+                "orders": int(orders[i]),
+                "delivered": int(delivered[i]),
+                "conversion": round(float(conversion[i]), 4),
+            }
+            for i in ranking
+        ]
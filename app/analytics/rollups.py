@@ -0,0 +1,181 @@
+"""
+Поддержка дневных итогов продаж.
+
+Итоги хранятся по дням в трёх таблицах: общие (`analytics_daily_sales`), по
+категориям и по товарам. Продажа - позиция заказа, который не отменён и не
+возвращён; день - дата создания заказа.
+
+Итоги пересчитываются инкрементально: обработчик outbox-событий заказа
+(создание, смена статуса) помечает день заказа в `analytics_dirty_days`, а
+периодическая задача пересчитывает помеченные дни целиком. Пересчёт дня
+идемпотентен, поэтому повторная доставка события (at-least-once) ничего не
+портит, а частые изменения заказов одного дня схлопываются в один пересчёт.
+Для истории служит `backfill_rollups`, пересчитывающий диапазон дат пачками.
+"""
+
+import logging
+from datetime import date, timedelta
+
+from sqlalchemy import Date, Select, cast, delete, distinct, func, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.core.database import async_session_factory
+from app.core.tasks import register_periodic_task
+from app.events.dispatcher import outbox_dispatcher
+from app.events.models import OutboxEvent
+from app.orders.models import Order, OrderItem
+from app.orders.schemas import EXCLUDED_STATUSES
+from app.products.models import Product
+
+from .models import DailyCategorySales, DailyProductSales, DailySales, DirtyDay
+
+logger = logging.getLogger(__name__)
+
+
+def _sales_lines(date_from: date, date_to: date):
+    """Позиции проданных заказов, созданных в [date_from, date_to)"""
+    return (
+        select(
+            cast(Order.created_at, Date).label("day"),
+            Order.id.label("order_id"),
+            OrderItem.product_id,
+            Product.category_id,
+            OrderItem.quantity,
+            (OrderItem.quantity * OrderItem.product_price).label("amount"),
+        )
+        .join(OrderItem, OrderItem.order_id == Order.id)
+        .join(Product, Product.id == OrderItem.product_id)
+        .where(
+            Order.created_at >= date_from,
+            Order.created_at < date_to,
+            Order.order_status.not_in(EXCLUDED_STATUSES),
+        )
+        .subquery()
+    )
+
+
+def _totals(lines, *group_by) -> Select:
+    return select(
+        lines.c.day,
+        *group_by,
+        func.count(distinct(lines.c.order_id)),
+        func.sum(lines.c.quantity),
+        func.sum(lines.c.amount),
+    ).group_by(lines.c.day, *group_by)
+
+
+async def rebuild_rollups(session: AsyncSession, date_from: date, date_to: date) -> None:
+    """Пересчитывает итоги за дни [date_from, date_to) в транзакции сессии (без коммита)"""
+    lines = _sales_lines(date_from, date_to)
+    measures = ["orders", "units", "revenue"]
+
+    for model in (DailySales, DailyCategorySales, DailyProductSales):
+        await session.execute(delete(model).where(model.day >= date_from, model.day < date_to))
+
+    await session.execute(insert(DailySales).from_select(["day", *measures], _totals(lines)))
+    await session.execute(
+        insert(DailyCategorySales).from_select(
+            ["day", "category_id", *measures],
+            _totals(lines, lines.c.category_id),
+        )
+    )
+    await session.execute(
+        insert(DailyProductSales).from_select(
+            ["day", "product_id", "category_id", *measures],
+            _totals(lines, lines.c.product_id, lines.c.category_id),
+        )
+    )
+
+
+@outbox_dispatcher.register("order.created")
+@outbox_dispatcher.register("order.status_changed")
+@outbox_dispatcher.register("order.payment_status_changed")
+async def mark_order_day_dirty(event: OutboxEvent, session: AsyncSession) -> None:
+    """Обработчик outbox: помечает день заказа для пересчёта итогов
+
+    Уже помеченному дню обновляется `marked_at`: если день сейчас пересчитывается,
+    обновление дождётся конца пересчёта, и отметка не будет снята вместе со старой.
+    """
+    stmt = insert(DirtyDay).from_select(
+        ["day", "marked_at"],
+        select(cast(Order.created_at, Date), func.clock_timestamp()).where(Order.id == event.aggregate_id),
+    )
+    await session.execute(
+        stmt.on_conflict_do_update(index_elements=[DirtyDay.day], set_={"marked_at": stmt.excluded.marked_at})
+    )
+
+
+async def refresh_dirty_days(
+    session: AsyncSession,
+    limit: int = settings.ANALYTICS_REFRESH_BATCH_DAYS,
+) -> int:
+    """Пересчитывает пачку помеченных дней и снимает с них отметку
+
+    Дни блокируются через SKIP LOCKED, поэтому несколько воркеров не пересчитывают
+    один день одновременно. Снимаются только отметки с `marked_at`, прочитанным при
+    захвате: если день пометят снова во время пересчёта, новая отметка останется
+    и попадёт в следующий запуск.
+
+    Returns:
+        int: Количество пересчитанных дней
+    """
+    result = await session.execute(
+        select(DirtyDay.day, DirtyDay.marked_at)
+        .order_by(DirtyDay.day)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    claimed = [tuple(row) for row in result.all()]
+
+    for day, _ in claimed:
+        await rebuild_rollups(session, day, day + timedelta(days=1))
+
+    if claimed:
+        await session.execute(delete(DirtyDay).where(tuple_(DirtyDay.day, DirtyDay.marked_at).in_(claimed)))
+    await session.commit()
+
+    return len(claimed)
+
+
+async def refresh_rollups(session_factory: async_sessionmaker = async_session_factory) -> None:
+    """Периодическая задача: пересчитывает все помеченные дни"""
+    async with session_factory() as session:
+        while await refresh_dirty_days(session) >= settings.ANALYTICS_REFRESH_BATCH_DAYS:
+            pass
+
+
+async def backfill_rollups(
+    date_from: date,
+    date_to: date,
+    chunk_days: int = 7,
+    session_factory: async_sessionmaker = async_session_factory,
+) -> int:
+    """Пересчитывает итоги за дни [date_from, date_to] пачками по `chunk_days` дней
+
+    Каждая пачка - отдельная транзакция: блокировки и размер транзакции не
+    зависят от глубины истории, а прерванный backfill можно продолжить с нужной даты.
+
+    Returns:
+        int: Количество обработанных пачек
+    """
+    chunks = 0
+    start = date_from
+    while start <= date_to:
+        end = min(start + timedelta(days=chunk_days), date_to + timedelta(days=1))
+        async with session_factory() as session:
+            await rebuild_rollups(session, start, end)
+            await session.commit()
+        logger.info("Итоги продаж пересчитаны за %s - %s", start, end - timedelta(days=1))
+        chunks += 1
+        start = end
+
+    return chunks
+
+
+register_periodic_task(
+    "analytics-rollups",
+    interval=settings.ANALYTICS_REFRESH_INTERVAL,
+    func=refresh_rollups,
+)
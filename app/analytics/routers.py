@@ -0,0 +1,93 @@
+from fastapi import APIRouter, Depends, status
+
+from app.auth.services import validate_user_admin_service
+
+from . import rollups  # noqa: F401 - регистрирует обработчик outbox и периодический пересчёт
+from .schemas import (
+    BasketSizeRead,
+    CategoryConversionRead,
+    CategorySalesRead,
+    DailySalesRead,
+    ProductSalesRead,
+    TopSellerRead,
+)
+from .services import (
+    get_basket_size_report_service,
+    get_category_conversion_report_service,
+    get_category_sales_service,
+    get_daily_sales_service,
+    get_product_sales_service,
+    get_top_sellers_report_service,
+)
+
+router = APIRouter(prefix="/analytics", tags=["Аналитика"])
+
+admin_deps = [Depends(validate_user_admin_service)]
+
+
+@router.get(
+    "/sales/daily",
+    status_code=status.HTTP_200_OK,
+    response_model=list[DailySalesRead],
+    dependencies=admin_deps,
+    summary="Продажи по дням (только для админов)",
+)
+async def get_daily_sales(sales: list[DailySalesRead] = Depends(get_daily_sales_service)):
+    return sales
+
+
+@router.get(
+    "/sales/categories",
+    status_code=status.HTTP_200_OK,
+    response_model=list[CategorySalesRead],
+    dependencies=admin_deps,
+    summary="Продажи по категориям за период (только для админов)",
+)
+async def get_category_sales(sales: list[CategorySalesRead] = Depends(get_category_sales_service)):
+    return sales
+
+
+@router.get(
+    "/sales/products",
+    status_code=status.HTTP_200_OK,
+    response_model=list[ProductSalesRead],
+    dependencies=admin_deps,
+    summary="Самые продаваемые товары за период (только для админов)",
+)
+async def get_product_sales(sales: list[ProductSalesRead] = Depends(get_product_sales_service)):
+    return sales
+
+
+@router.get(
+    "/reports/top-sellers",
+    status_code=status.HTTP_200_OK,
+    response_model=list[TopSellerRead],
+    dependencies=admin_deps,
+    summary="Самые продаваемые товары по заказам за период (только для админов)",
+)
+async def get_top_sellers_report(report: list[TopSellerRead] = Depends(get_top_sellers_report_service)):
+    return report
+
+
+@router.get(
+    "/reports/basket-size",
+    status_code=status.HTTP_200_OK,
+    response_model=BasketSizeRead,
+    dependencies=admin_deps,
+    summary="Распределение размера заказа за период (только для админов)",
+)
+async def get_basket_size_report(report: BasketSizeRead = Depends(get_basket_size_report_service)):
+    return report
+
+
+@router.get(
+    "/reports/category-conversion",
+    status_code=status.HTTP_200_OK,
+    response_model=list[CategoryConversionRead],
+    dependencies=admin_deps,
+    summary="Доля доставленных заказов по категориям за период (только для админов)",
+)
+async def get_category_conversion_report(
+    report: list[CategoryConversionRead] = Depends(get_category_conversion_report_service),
+):
+    return report
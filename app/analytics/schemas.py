@@ -0,0 +1,53 @@
+from datetime import date
+
+from pydantic import BaseModel
+
+
+class SalesTotals(BaseModel):
+    orders: int
+    units: int
+    revenue: float
+
+
+class DailySalesRead(SalesTotals):
+    day: date
+
+    model_config = {"from_attributes": True}
+
+
+class CategorySalesRead(SalesTotals):
+    category_id: int
+    category_name: str | None = None
+
+
+class ProductSalesRead(SalesTotals):
+    product_id: int
+    product_title: str | None = None
+    category_id: int
+
+
+class TopSellerRead(BaseModel):
+    product_id: int
+    product_title: str | None = None
+    units: int
+    revenue: float
+
+
+class BasketSizeBucket(BaseModel):
+    size: str
+    orders: int
+
+
+class BasketSizeRead(BaseModel):
+    orders: int
+    mean: float
+    percentiles: dict[str, int]
+    histogram: list[BasketSizeBucket]
+
+
+class CategoryConversionRead(BaseModel):
+    category_id: int
+    category_name: str | None = None
+    orders: int
+    delivered: int
+    conversion: float
@@ -0,0 +1,222 @@
+from datetime import date, timedelta
+from typing import Annotated, NamedTuple
+
+from fastapi import Depends, HTTPException, Query, status
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.categories.models import Category
+from app.core.config import settings
+from app.core.database import get_async_read_session
+from app.monitoring.tracing import traced
+from app.products.models import Product
+
+from .models import DailyCategorySales, DailyProductSales, DailySales
+from .reports import (
+    BasketSizeReport,
+    CategoryConversionReport,
+    TopSellersReport,
+    order_items_query,
+    run_report,
+)
+
+
+class DateRange(NamedTuple):
+    date_from: date
+    date_to: date
+
+
+async def get_date_range(
+    date_from: Annotated[date, Query(description="Первый день периода")],
+    date_to: Annotated[date, Query(description="Последний день периода (включительно)")],
+) -> DateRange:
+    """Dependency - период отчёта с проверкой границ"""
+    if date_to < date_from:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Дата окончания периода раньше даты начала",
+        )
+
+    if (date_to - date_from).days + 1 > settings.ANALYTICS_MAX_RANGE_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Период отчёта не может быть больше {settings.ANALYTICS_MAX_RANGE_DAYS} дней",
+        )
+
+    return DateRange(date_from=date_from, date_to=date_to)
+
+
+def _measures(model):
+    return (
+        func.sum(model.orders).label("orders"),
+        func.sum(model.units).label("units"),
+        func.sum(model.revenue).label("revenue"),
+    )
+
+
+@traced()
+async def get_daily_sales_service(
+    period: DateRange = Depends(get_date_range),
+    session: AsyncSession = Depends(get_async_read_session, scope="function"),
+):
+    """Сервис - итоги продаж по дням (дни без продаж не возвращаются)
+
+    Args:
+        period (DateRange): Период отчёта
+        session (AsyncSession): Асинхронная сессия БД (реплика, если доступна)
+
+    Returns:
+        Список дневных итогов
+    """
+    result = await session.execute(
+        select(DailySales)
+        .where(DailySales.day.between(period.date_from, period.date_to))
+        .order_by(DailySales.day)
+    )
+
+    return result.scalars().all()
+
+
+@traced()
+async def get_category_sales_service(
+    period: DateRange = Depends(get_date_range),
+    session: AsyncSession = Depends(get_async_read_session, scope="function"),
+):
+    """Сервис - продажи по категориям за период, по убыванию выручки
+
+    Args:
+        period (DateRange): Период отчёта
+        session (AsyncSession): Асинхронная сессия БД (реплика, если доступна)
+
+    Returns:
+        Список итогов по категориям
+    """
+    totals = (
+        select(DailyCategorySales.category_id, *_measures(DailyCategorySales))
+        .where(DailyCategorySales.day.between(period.date_from, period.date_to))
+        .group_by(DailyCategorySales.category_id)
+        .subquery()
+    )
+    result = await session.execute(
+        select(totals, Category.name.label("category_name"))
+        .outerjoin(Category, Category.id == totals.c.category_id)
+        .order_by(totals.c.revenue.desc())
+    )
+
+    return result.mappings().all()
+
+
+@traced()
+async def get_product_sales_service(
+    period: DateRange = Depends(get_date_range),
+    category_id: Annotated[int | None, Query(gt=0)] = None,
+    limit: Annotated[int, Query(gt=0, le=100)] = 20,
+    session: AsyncSession = Depends(get_async_read_session, scope="function"),
+):
+    """Сервис - самые продаваемые товары за период (по выручке)
+
+    Args:
+        period (DateRange): Период отчёта
+        category_id (int | None): Ограничить товарами категории
+        limit (int): Количество товаров в отчёте
+        session (AsyncSession): Асинхронная сессия БД (реплика, если доступна)
+
+    Returns:
+        Список итогов по товарам
+    """
+    query = select(
+        DailyProductSales.product_id,
+        DailyProductSales.category_id,
+        *_measures(DailyProductSales),
+    ).where(DailyProductSales.day.between(period.date_from, period.date_to))
+    if category_id is not None:
+        query = query.where(DailyProductSales.category_id == category_id)
+
+    totals = (
+        query.group_by(DailyProductSales.product_id, DailyProductSales.category_id)
+        .order_by(func.sum(DailyProductSales.revenue).desc())
+        .limit(limit)
+        .subquery()
+    )
+    result = await session.execute(
+        select(totals, Product.title.label("product_title"))
+        .outerjoin(Product, Product.id == totals.c.product_id)
+        .order_by(totals.c.revenue.desc())
+    )
+
+    return result.mappings().all()
+
+
+def _period_query(period: DateRange):
+    return order_items_query(period.date_from, period.date_to + timedelta(days=1))
+
+
+@traced()
+async def get_top_sellers_report_service(
+    period: DateRange = Depends(get_date_range),
+    limit: Annotated[int, Query(gt=0, le=100)] = 20,
+    session: AsyncSession = Depends(get_async_read_session, scope="function"),
+):
+    """Сервис - товары с наибольшей выручкой за период (по заказам, не по итогам)
+
+    Args:
+        period (DateRange): Период отчёта
+        limit (int): Количество товаров в отчёте
+        session (AsyncSession): Асинхронная сессия БД (реплика, если доступна)
+
+    Returns:
+        Список товаров с количеством и выручкой
+    """
+    top = await run_report(
+        session, TopSellersReport(limit=limit), _period_query(period), settings.REPORTS_CHUNK_SIZE
+    )
+
+    result = await session.execute(
+        select(Product.id, Product.title).where(Product.id.in_([row["product_id"] for row in top]))
+    )
+    titles = dict(result.all())
+
+    return [{**row, "product_title": titles.get(row["product_id"])} for row in top]
+
+
+@traced()
+async def get_basket_size_report_service(
+    period: DateRange = Depends(get_date_range),
+    session: AsyncSession = Depends(get_async_read_session, scope="function"),
+):
+    """Сервис - распределение размера заказа (в штуках) за период
+
+    Args:
+        period (DateRange): Период отчёта
+        session (AsyncSession): Асинхронная сессия БД (реплика, если доступна)
+
+    Returns:
+        Количество заказов, среднее, перцентили и гистограмма
+    """
+    return await run_report(session, BasketSizeReport(), _period_query(period), settings.REPORTS_CHUNK_SIZE)
+
+
+@traced()
+async def get_category_conversion_report_service(
+    period: DateRange = Depends(get_date_range),
+    session: AsyncSession = Depends(get_async_read_session, scope="function"),
+):
+    """Сервис - доля доставленных заказов по категориям за период
+
+    Args:
+        period (DateRange): Период отчёта
+        session (AsyncSession): Асинхронная сессия БД (реплика, если доступна)
+
+    Returns:
+        Список категорий с количеством заказов, доставленных заказов и конверсией
+    """
+    conversion = await run_report(
+        session, CategoryConversionReport(), _period_query(period), settings.REPORTS_CHUNK_SIZE
+    )
+
+    result = await session.execute(
+        select(Category.id, Category.name).where(Category.id.in_([row["category_id"] for row in conversion]))
+    )
+    names = dict(result.all())
+
+    return [{**row, "category_name": names.get(row["category_id"])} for row in conversion]
@@ -7,11 +7,13 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.security import decode_jwt
+from app.monitoring.tracing import traced
 from app.users.models import User
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
+@traced()
 def get_current_token_payload(
     token: str = Depends(oauth2_scheme),
 ) -> dict[str, Any]:
@@ -50,6 +52,7 @@ def get_current_token_payload(
         )
 
 
+@traced()
 async def get_user_from_sub(
     payload: dict[str, Any],
     session: AsyncSession,
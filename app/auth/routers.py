@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, status
 
+from app.core.rate_limit import RateLimiter
 from app.core.security import (
     create_access_token,
     create_refresh_token,
@@ -17,12 +18,17 @@ router = APIRouter(
     tags=["Регистрация/Авторизация"],
 )
 
+# лимиты проверяются до хэширования/проверки пароля
+register_rate_limit = RateLimiter("auth_register", rate="5/minute")
+login_rate_limit = RateLimiter("auth_login", rate="10/minute")
+
 
 @router.post(
     "/register",
     status_code=status.HTTP_201_CREATED,
     response_model=UserRead,
     summary="Регистрация пользователя",
+    dependencies=[Depends(register_rate_limit)],
 )
 async def register(new_user: UserRead = Depends(register_user_service)):
     return new_user
@@ -33,6 +39,7 @@ async def register(new_user: UserRead = Depends(register_user_service)):
     status_code=status.HTTP_200_OK,
     summary="Авторизация пользователя",
     response_model=TokenInfo,
+    dependencies=[Depends(login_rate_limit)],
 )
 async def login(
     user: UserRead = Depends(authenticate_user_service),
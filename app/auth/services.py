@@ -10,6 +10,7 @@ from app.core.security import (
     get_password_hash,
     verify_password,
 )
+from app.monitoring.tracing import traced
 from app.users.helpers import get_user_by_username
 from app.users.models import User
 from app.users.schemas import UserCreate, UserRead
@@ -22,7 +23,7 @@ from .validations import validate_token_type
 async def authenticate_user_service(
     username: Annotated[str, Form()],
     password: Annotated[str, Form()],
-    session: AsyncSession = Depends(get_async_session),
+    session: AsyncSession = Depends(get_async_session, scope="function"),
 ):
     user = await get_user_by_username(
         username=username,
@@ -39,7 +40,7 @@ async def authenticate_user_service(
 
 async def register_user_service(
     data: UserCreate,
-    session: AsyncSession = Depends(get_async_session),
+    session: AsyncSession = Depends(get_async_session, scope="function"),
 ):
     # Проверяем, нет ли пользователя с таким email и username
     await validate_user_unique(
@@ -62,10 +63,11 @@ class UserGetterFromToken:
     def __init__(self, token_type: str) -> None:
         self.token_type = token_type
 
+    @traced("UserGetterFromToken")
     async def __call__(
         self,
         payload: dict[str, Any] = Depends(get_current_token_payload),
-        session: AsyncSession = Depends(get_async_session),
+        session: AsyncSession = Depends(get_async_session, scope="function"),
     ) -> User:
         """
         Получает пользователя на основе токена.
@@ -5,7 +5,8 @@ from sqlalchemy import delete
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.auth.services import get_current_auth_user
-from app.core.database import get_async_session
+from app.core.database import get_async_read_session, get_async_session, replica_router
+from app.monitoring.tracing import traced
 from app.products import (
     helpers as productHelper,
 )
@@ -28,8 +29,12 @@ from .schemas import CartAddProduct, CartItemQuantityUpdate
 
 async def get_cart_service(
     user: userSchemas.UserRead = Depends(get_current_auth_user),
-    session: AsyncSession = Depends(get_async_session),
+    session: AsyncSession = Depends(get_async_session, scope="function"),
+    read_session: AsyncSession = Depends(get_async_read_session, scope="function"),
 ):
+    # сразу после изменения корзины читаем из основной БД
+    session = replica_router.choose(user.id, session=session, read_session=read_session)
+
     # получаем корзину по ID пользователя
     cart: Cart | None = await get_cart_by_user_id(
         user_id=user.id,
@@ -52,7 +57,7 @@ async def get_cart_service(
 async def add_product_cart_service(
     data: CartAddProduct,
     user: userSchemas.UserRead = Depends(get_current_auth_user),
-    session: AsyncSession = Depends(get_async_session),
+    session: AsyncSession = Depends(get_async_session, scope="function"),
 ):
     try:
         # получаем товар по ID товара
@@ -93,6 +98,7 @@ async def add_product_cart_service(
             session.add(cart_item)
 
         await session.commit()
+        replica_router.mark_write(user.id)
         await session.refresh(cart_item)
 
         cart_item = await get_cart_item_by_cart_id_and_product_id(
@@ -118,7 +124,7 @@ async def update_product_quantity_from_cart_service(
     product_id: Annotated[int, Path(ge=1)],
     data: Annotated[CartItemQuantityUpdate, Body()],
     user: userSchemas.UserRead = Depends(get_current_auth_user),
-    session: AsyncSession = Depends(get_async_session),
+    session: AsyncSession = Depends(get_async_session, scope="function"),
 ):
     try:
         cart_id = await get_cart_id_by_user_id_or_error_404(
@@ -136,6 +142,7 @@ async def update_product_quantity_from_cart_service(
         if data.quantity == 0:
             await session.delete(cart_item)
             await session.commit()
+            replica_router.mark_write(user.id)
 
             return None
 
@@ -147,6 +154,7 @@ async def update_product_quantity_from_cart_service(
         cart_item.quantity = data.quantity
 
         await session.commit()
+        replica_router.mark_write(user.id)
         await session.refresh(cart_item)
 
         # Загружаем обновленные данные с связями
@@ -171,7 +179,7 @@ async def update_product_quantity_from_cart_service(
 async def delete_product_from_cart_service(
     product_id: Annotated[int, Path(ge=1)],
     user: userSchemas.UserRead = Depends(get_current_auth_user),
-    session: AsyncSession = Depends(get_async_session),
+    session: AsyncSession = Depends(get_async_session, scope="function"),
 ):
     try:
         cart_id = await get_cart_id_by_user_id_or_error_404(
@@ -187,6 +195,7 @@ async def delete_product_from_cart_service(
 
         await session.delete(cart_item)
         await session.commit()
+        replica_router.mark_write(user.id)
 
     except HTTPException:
         raise
@@ -200,9 +209,10 @@ async def delete_product_from_cart_service(
         )
 
 
+@traced()
 async def delete_cart_service(
     user: userSchemas.UserRead = Depends(get_current_auth_user),
-    session: AsyncSession = Depends(get_async_session),
+    session: AsyncSession = Depends(get_async_session, scope="function"),
     commit: bool = True,
     flush: bool = False,
     rollback: bool = True,
@@ -220,6 +230,7 @@ async def delete_cart_service(
         await session.execute(delete(CartItem).where(CartItem.cart_id == cart.id))
         if commit:
             await session.commit()
+            replica_router.mark_write(user.id)
         if flush:
             await session.flush()
 
@@ -2,6 +2,8 @@ from typing import Sequence
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.monitoring.tracing import traced
+
 from .helpers import (
     get_cart_id_by_user_id_or_error_404,
     get_cart_item_by_cart_id_or_error_404,
@@ -9,6 +11,7 @@ from .helpers import (
 from .models import CartItem
 
 
+@traced()
 async def validate_non_empty_cart(
     user_id: int,
     session: AsyncSession,
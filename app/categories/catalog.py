@@ -0,0 +1,187 @@
+"""
+Справочник категорий в памяти процесса.
+
+Категории меняются редко, а читаются на каждой странице витрины, поэтому
+`GET /category/` и `GET /category/{id}` отдают готовый JSON из неизменяемого
+снимка `CategorySnapshot`, не обращаясь к БД. В снимке все категории по
+порядку id, сериализованные по одной; страницы списка собираются из них и
+запоминаются в снимке. Там же дерево категорий (`GET /category/tree`) одним
+готовым JSON и дочерние категории каждой - для раскрытия подкатегорий в
+фильтрах без запроса к БД.
+
+Снимок перечитывается одним запросом при первом чтении после изменения и
+подменяется целиком одним присваиванием: читатель работает либо со старой
+версией, либо с новой. Читается основная БД, а не реплика: реплика могла ещё
+не получить изменение, и старые данные остались бы в снимке до следующего.
+Сервисы категорий вызывают `mark_categories_changed` в своей транзакции -
+после коммита снимок этого процесса устаревает, остальные воркеры узнают об
+изменении через NOTIFY (а после переподключения LISTEN перечитывают снимок).
+Любая запись категорий через ORM (и в обход сервисов) тоже помечает снимок
+этого процесса устаревшим.
+"""
+
+import asyncio
+from collections import defaultdict
+from collections.abc import Collection
+from itertools import chain
+
+from pydantic import TypeAdapter
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import async_session_factory
+from app.events.broker import notify, pg_listener
+
+from .models import Category
+from .schemas import CategoryRead, CategoryTreeNode
+
+CATEGORIES_CHANNEL = "category_changes"
+_PENDING_KEY = "categories_changed"
+_NOTIFIED_KEY = "categories_notified"
+
+_tree_adapter = TypeAdapter(list[CategoryTreeNode])
+
+
+class CategorySnapshot:
+    """Неизменяемая версия справочника категорий
+
+    Attributes:
+        version (int): Номер версии в этом процессе
+        ids (list[int]): ID категорий по возрастанию
+        by_id (dict[int, bytes]): JSON категории по ID
+        tree (bytes): JSON дерева категорий
+    """
+
+    def __init__(self, version: int, categories: list[CategoryRead], page_cache_size: int) -> None:
+        self.version = version
+        self.ids = [category.id for category in categories]
+        self.by_id = {category.id: category.model_dump_json().encode() for category in categories}
+        self._page_cache_size = page_cache_size
+        self._pages: dict[tuple[int, int], bytes] = {}
+
+        self._children: defaultdict[int | None, list[CategoryRead]] = defaultdict(list)
+        for category in categories:
+            self._children[category.parent_id].append(category)
+        self.tree = _tree_adapter.dump_json(self._subtree(None))
+
+    def _subtree(self, parent_id: int | None) -> list[CategoryTreeNode]:
+        return [
+            CategoryTreeNode(id=category.id, name=category.name, children=self._subtree(category.id))
+            for category in self._children.get(parent_id, ())
+        ]
+
+    def page(self, offset: int, limit: int) -> bytes:
+        """JSON-массив категорий страницы (в порядке id)"""
+        key = (offset, limit)
+        page = self._pages.get(key)
+        if page is None:
+            items = (self.by_id[category_id] for category_id in self.ids[offset : offset + limit])
+            page = b"[" + b",".join(items) + b"]"
+            if len(self._pages) < self._page_cache_size:
+                self._pages[key] = page
+
+        return page
+
+    def missing(self, category_ids: Collection[int]) -> set[int]:
+        """ID из `category_ids`, которых нет в снимке"""
+        return set(category_ids) - self.by_id.keys()
+
+    def descendants(self, category_ids: Collection[int]) -> frozenset[int]:
+        """`category_ids` вместе со всеми подкатегориями"""
+        found = set(category_ids)
+        stack = list(found)
+        while stack:
+            for child in self._children.get(stack.pop(), ()):
+                if child.id not in found:
+                    found.add(child.id)
+                    stack.append(child.id)
+
+        return frozenset(found)
+
+
+class CategoryCatalog:
+    """Текущий снимок справочника категорий
+
+    Attributes:
+        session_factory (async_sessionmaker): Фабрика сессий основной БД для перечитывания
+        page_cache_size (int): Сколько страниц списка запоминать в снимке
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker = async_session_factory,
+        page_cache_size: int = settings.CATEGORY_PAGE_CACHE_SIZE,
+    ) -> None:
+        self.session_factory = session_factory
+        self.page_cache_size = page_cache_size
+        self._snapshot: CategorySnapshot | None = None
+        self._version = 0
+        self._stale = True
+        self._lock = asyncio.Lock()
+
+    def mark_stale(self) -> None:
+        self._stale = True
+
+    async def get(self) -> CategorySnapshot:
+        """Текущий снимок; устаревший перечитывается из основной БД"""
+        if self._stale or self._snapshot is None:
+            async with self._lock:
+                if self._stale or self._snapshot is None:
+                    # изменения, закоммиченные во время чтения, снова пометят снимок устаревшим
+                    self._stale = False
+                    try:
+                        await self._reload()
+                    except BaseException:
+                        self._stale = True
+                        raise
+
+        return self._snapshot
+
+    async def _reload(self) -> None:
+        async with self.session_factory() as session:
+            result = await session.execute(select(Category).order_by(Category.id))
+            categories = [CategoryRead.model_validate(category) for category in result.scalars()]
+
+        self._version += 1
+        self._snapshot = CategorySnapshot(self._version, categories, self.page_cache_size)
+
+
+category_catalog = CategoryCatalog()
+
+pg_listener.listen(
+    CATEGORIES_CHANNEL,
+    lambda payload: category_catalog.mark_stale(),
+    resync=category_catalog.mark_stale,
+)
+
+
+async def mark_categories_changed(session: AsyncSession) -> None:
+    """Отмечает изменение категорий в транзакции сессии (без коммита)
+
+    Снимок этого процесса устареет после коммита, остальных воркеров - по NOTIFY.
+    """
+    session.info[_PENDING_KEY] = True
+    if not session.info.get(_NOTIFIED_KEY):
+        session.info[_NOTIFIED_KEY] = True
+        await notify(session, CATEGORIES_CHANNEL, {})
+
+
+@event.listens_for(Session, "after_flush")
+def _detect_category_writes(session, flush_context):
+    if any(isinstance(obj, Category) for obj in chain(session.new, session.dirty, session.deleted)):
+        session.info[_PENDING_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_category_changes(session):
+    session.info.pop(_NOTIFIED_KEY, None)
+    if session.info.pop(_PENDING_KEY, False):
+        category_catalog.mark_stale()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_category_changes(session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_NOTIFIED_KEY, None)
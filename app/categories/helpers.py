@@ -1,7 +1,15 @@
+from collections.abc import Collection
+
 from fastapi import HTTPException, status
+from sqlalchemy import Select, delete, exists, func, insert, select, true
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from .catalog import category_catalog
+from .models import Category, CategoryClosure
 
-from .models import Category
+# ключ advisory-блокировки перемещений в дереве категорий
+CATEGORY_TREE_LOCK = 4_810_248
 
 
 async def get_category_by_id(category_id: int, session: AsyncSession):
@@ -16,3 +24,71 @@ async def get_category_by_id(category_id: int, session: AsyncSession):
         )
 
     return category
+
+
+async def validate_categories_exist(category_ids: Collection[int]) -> None:
+    """
+    Проверяет, что все категории существуют (по справочнику категорий в памяти процесса).
+    """
+    snapshot = await category_catalog.get()
+    if snapshot.missing(category_ids):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Категория не найдена",
+        )
+
+
+def descendant_ids_query(category_ids: Collection[int]) -> Select:
+    """
+    ID категорий вместе со всеми подкатегориями - чтение по первичному ключу таблицы замыкания.
+    """
+    return select(CategoryClosure.descendant_id).where(CategoryClosure.ancestor_id.in_(sorted(category_ids)))
+
+
+async def move_in_closure(category_id: int, parent_id: int | None, session: AsyncSession) -> None:
+    """
+    Переносит категорию со всем поддеревом под нового родителя (None - в корень).
+
+    Перемещения выполняются по одному под advisory-блокировкой транзакции, иначе два
+    встречных переноса могли бы замкнуть дерево в цикл.
+    """
+    await session.execute(select(func.pg_advisory_xact_lock(CATEGORY_TREE_LOCK)))
+
+    if parent_id is not None:
+        cycle = await session.scalar(
+            select(
+                exists().where(
+                    CategoryClosure.ancestor_id == category_id,
+                    CategoryClosure.descendant_id == parent_id,
+                )
+            )
+        )
+        if cycle:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Категорию нельзя вложить в саму себя или в её подкатегорию",
+            )
+
+    subtree = select(CategoryClosure.descendant_id).where(CategoryClosure.ancestor_id == category_id)
+    old_ancestors = select(CategoryClosure.ancestor_id).where(
+        CategoryClosure.descendant_id == category_id,
+        CategoryClosure.ancestor_id != category_id,
+    )
+    await session.execute(
+        delete(CategoryClosure).where(
+            CategoryClosure.descendant_id.in_(subtree),
+            CategoryClosure.ancestor_id.in_(old_ancestors),
+        )
+    )
+
+    if parent_id is not None:
+        # каждый предок нового родителя становится предком каждой категории поддерева
+        above, below = aliased(CategoryClosure), aliased(CategoryClosure)
+        paths = (
+            select(above.ancestor_id, below.descendant_id, above.depth + below.depth + 1)
+            .join(below, true())
+            .where(above.descendant_id == parent_id, below.ancestor_id == category_id)
+        )
+        await session.execute(
+            insert(CategoryClosure).from_select(["ancestor_id", "descendant_id", "depth"], paths)
+        )
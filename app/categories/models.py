@@ -1,6 +1,17 @@
 from datetime import datetime
 
-from sqlalchemy import DateTime, String, func
+from sqlalchemy import (
+    DateTime,
+    ForeignKey,
+    Integer,
+    SmallInteger,
+    String,
+    event,
+    func,
+    insert,
+    literal,
+    select,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.database import Base
@@ -12,9 +23,39 @@ class Category(Base):
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String(100), nullable=False, unique=True)
     description: Mapped[str] = mapped_column(String(255))
+    parent_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("categories.id"), index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
 
     products = relationship("Product", back_populates="category")
 
     def __repr__(self) -> str:
         return f"<Category(id={self.id}, name='{self.name}')>"
+
+
+class CategoryClosure(Base):
+    """Таблица замыкания дерева категорий: пара (предок, потомок) на каждый путь, включая (id, id)"""
+
+    __tablename__ = "category_closure"
+
+    ancestor_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True
+    )
+    descendant_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True, index=True
+    )
+    depth: Mapped[int] = mapped_column(SmallInteger, nullable=False)
+
+
+@event.listens_for(Category, "after_insert")
+def _add_to_closure(mapper, connection, category: Category) -> None:
+    # любая новая категория (и созданная в обход сервисов) попадает в таблицу замыкания в той же транзакции:
+    # путь к самой себе и пути от всех предков родителя
+    paths = select(literal(category.id), literal(category.id), literal(0))
+    if category.parent_id is not None:
+        paths = paths.union_all(
+            select(CategoryClosure.ancestor_id, literal(category.id), CategoryClosure.depth + 1).where(
+                CategoryClosure.descendant_id == category.parent_id
+            )
+        )
+
+    connection.execute(insert(CategoryClosure).from_select(["ancestor_id", "descendant_id", "depth"], paths))
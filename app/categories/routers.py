@@ -1,15 +1,11 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, Path, Query, Response, status
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Response, status
 
 from app.auth.services import validate_user_admin_service
-from app.core.database import get_async_session
 
-from .helpers import get_category_by_id
-from .models import Category
-from .schemas import CategoryRead
+from .catalog import category_catalog
+from .schemas import CategoryRead, CategoryTreeNode
 from .services import (
     create_category_service,
     delete_category_service,
@@ -24,14 +20,18 @@ admin_deps = [Depends(validate_user_admin_service)]
 
 @router.get("/", response_model=list[CategoryRead], summary="Получить список всех категорий")
 async def get_categories(
-    session: AsyncSession = Depends(get_async_session),
     offset: Annotated[int, Query(ge=0)] = 0,
     limit: Annotated[int, Query(gt=0)] = 100,
 ):
-    query = select(Category).order_by(Category.id).offset(offset).limit(limit)
-    categories = await session.execute(query)
+    # готовый JSON из справочника в памяти процесса, без запроса к БД
+    snapshot = await category_catalog.get()
+    return Response(content=snapshot.page(offset, limit), media_type="application/json")
 
-    return categories.scalars().all()
+
+@router.get("/tree", response_model=list[CategoryTreeNode], summary="Получить дерево категорий")
+async def get_category_tree():
+    snapshot = await category_catalog.get()
+    return Response(content=snapshot.tree, media_type="application/json")
 
 
 @router.get(
@@ -41,14 +41,16 @@ async def get_categories(
 )
 async def get_category(
     category_id: Annotated[int, Path(title="ID категории", ge=1)],
-    session: AsyncSession = Depends(get_async_session),
 ):
-    category = await get_category_by_id(
-        category_id=category_id,
-        session=session,
-    )
-
-    return category
+    snapshot = await category_catalog.get()
+    category = snapshot.by_id.get(category_id)
+    if category is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Категория не найдена",
+        )
+
+    return Response(content=category, media_type="application/json")
 
 
 @router.post(
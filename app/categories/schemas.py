@@ -7,6 +7,7 @@ from pydantic import BaseModel, Field
 class CategoryBase(BaseModel):
     name: Annotated[str, Field(..., min_length=3, max_length=100, description="Название категории")]
     description: Annotated[str | None, Field(max_length=500, description="Описание категории")] = None
+    parent_id: Annotated[int | None, Field(gt=0, description="ID родительской категории")] = None
 
     model_config = {"str_strip_whitespace": True}
 
@@ -28,5 +29,15 @@ class CategoryUpdate(BaseModel):
         Field(min_length=3, max_length=100, description="Название категории"),
     ] = None
     description: Annotated[str | None, Field(max_length=500, description="Описание категории")] = None
+    parent_id: Annotated[
+        int | None,
+        Field(gt=0, description="ID родительской категории, null - перенести в корень"),
+    ] = None
 
     model_config = {"str_strip_whitespace": True}
+
+
+class CategoryTreeNode(BaseModel):
+    id: int
+    name: str
+    children: list["CategoryTreeNode"] = []
@@ -1,19 +1,29 @@
+from contextlib import nullcontext
 from typing import Annotated
 
 from fastapi import Depends, HTTPException, Path, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_async_session
+from app.core.database import foreign_key_errors, get_async_session
+from app.products.facets import mark_catalog_changed
+from app.products.suggest import index_category, unindex_category
 from app.validations.request import validate_non_empty_body
 
-from .helpers import get_category_by_id
+from .catalog import mark_categories_changed
+from .helpers import get_category_by_id, move_in_closure
 from .models import Category
 from .schemas import CategoryCreate, CategoryUpdate
 
 
+def _checking_parent(session: AsyncSession):
+    return foreign_key_errors(
+        session, "parent_id", status.HTTP_404_NOT_FOUND, "Родительская категория не найдена"
+    )
+
+
 async def create_category_service(
     data: CategoryCreate,
-    session: AsyncSession = Depends(get_async_session),
+    session: AsyncSession = Depends(get_async_session, scope="function"),
 ):
     """Сервис для создания категории
 
@@ -27,12 +37,18 @@ async def create_category_service(
     try:
         category = Category(**data.model_dump(exclude_unset=True))
 
-        session.add(category)
+        async with _checking_parent(session):
+            session.add(category)
+        await index_category(session, category)
+        await mark_categories_changed(session)
         await session.commit()
         await session.refresh(category)
 
         return category
 
+    except HTTPException:
+        raise
+
     except Exception:
         await session.rollback()
         raise HTTPException(
@@ -44,7 +60,7 @@ async def create_category_service(
 async def update_category_service(
     category_id: Annotated[int, Path(title="ID категории", ge=1)],
     data: CategoryUpdate,
-    session: AsyncSession = Depends(get_async_session),
+    session: AsyncSession = Depends(get_async_session, scope="function"),
 ):
     """Сервис для обновление данных категории
 
@@ -64,8 +80,19 @@ async def update_category_service(
             session=session,
         )
 
-        for key, value in update_data.items():
-            setattr(category, key, value)
+        if "parent_id" in update_data:
+            # до изменения строки: проверка на цикл и перенос поддерева в таблице замыкания
+            await move_in_closure(category.id, update_data["parent_id"], session)
+
+        async with _checking_parent(session) if "parent_id" in update_data else nullcontext():
+            for key, value in update_data.items():
+                setattr(category, key, value)
+
+        await mark_categories_changed(session)
+        if "name" in update_data:
+            # название категории показывается в фасетах каталога и подсказках поиска
+            await mark_catalog_changed(session)
+            await index_category(session, category)
 
         await session.commit()
         await session.refresh(category)
@@ -86,7 +113,7 @@ async def update_category_service(
 
 async def delete_category_service(
     category_id: Annotated[int, Path(ge=1)],
-    session: AsyncSession = Depends(get_async_session),
+    session: AsyncSession = Depends(get_async_session, scope="function"),
 ):
     """Сервис для удаления категории
 
@@ -100,7 +127,13 @@ async def delete_category_service(
             session=session,
         )
 
-        await session.delete(category)
+        # на категорию ссылаются подкатегории (parent_id)
+        async with foreign_key_errors(
+            session, None, status.HTTP_409_CONFLICT, "Нельзя удалить категорию с подкатегориями"
+        ):
+            await session.delete(category)
+        await unindex_category(session, category.id)
+        await mark_categories_changed(session)
         await session.commit()
 
     except HTTPException:
@@ -0,0 +1,238 @@
+"""
+Адаптивное ограничение конкурентности (admission control).
+
+Запросы делятся на классы маршрутов (чтение каталога, изменение корзины,
+оформление заказа, авторизация). У каждого класса свой лимит одновременно
+выполняющихся запросов и ограниченная очередь ожидания. Если очередь полна или
+ожидание затянулось, запрос сразу получает 503 с Retry-After, а не висит в очереди
+к пулу соединений БД вместе со всеми остальными.
+
+Лимит подстраивается по алгоритму AIMD: пока задержка укладывается в целевую,
+лимит медленно растёт (+1 за «окно» из limit запросов), при превышении задержки
+или ошибке сервера - уменьшается в `backoff` раз. Уменьшение - не чаще одного раза
+за время ответа: запросы, начатые до последнего уменьшения, видели ещё старую
+нагрузку, и их медленные ответы лимит повторно не снижают.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+
+
+@dataclass(frozen=True, slots=True)
+class RouteClass:
+    name: str
+    match: Callable[[str, str], bool]
+
+
+ROUTE_CLASSES = (
+    RouteClass("auth", lambda method, path: path.startswith("/auth")),
+    RouteClass("checkout", lambda method, path: method == "POST" and path.startswith("/orders/create")),
+    RouteClass("cart_write", lambda method, path: method != "GET" and path.startswith("/cart")),
+    RouteClass(
+        "catalog_read",
+        lambda method, path: method == "GET" and path.startswith(("/products", "/category")),
+    ),
+)
+
+
+def classify(method: str, path: str) -> str | None:
+    """Класс маршрута для запроса или None, если запрос не ограничивается"""
+    for route_class in ROUTE_CLASSES:
+        if route_class.match(method, path):
+            return route_class.name
+
+    return None
+
+
+class Rejected(Exception):
+    """Запрос не допущен: очередь полна или ожидание превысило таймаут"""
+
+
+class AdaptiveLimiter:
+    """Лимит конкурентности с ограниченной очередью и AIMD-подстройкой
+
+    Attributes:
+        limit (float): Текущий лимит одновременно выполняющихся запросов
+        min_limit (int): Нижняя граница лимита
+        max_limit (int): Верхняя граница лимита
+        target_latency (float): Целевая задержка в секундах
+        queue_size (int): Максимальное количество ожидающих запросов
+        queue_timeout (float): Максимальное время ожидания в очереди в секундах
+        backoff (float): Множитель уменьшения лимита при перегрузке
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        target_latency: float,
+        queue_size: int = settings.ADMISSION_QUEUE_SIZE,
+        queue_timeout: float = settings.ADMISSION_QUEUE_TIMEOUT,
+        min_limit: int = 1,
+        max_limit: int | None = None,
+        backoff: float = 0.9,
+    ) -> None:
+        self.limit = float(limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit or limit * 4
+        self.target_latency = target_latency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.backoff = backoff
+
+        self.in_flight = 0
+        self.rejected = 0
+        self._last_decrease = -math.inf
+        self._waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> None:
+        """Занимает слот, при необходимости ожидая в очереди
+
+        Raises:
+            Rejected: Если очередь полна или время ожидания истекло
+        """
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+
+        if len(self._waiters) >= self.queue_size:
+            self.rejected += 1
+            raise Rejected
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Rejected
+        except BaseException:
+            # слот мог быть передан нам в момент отмены - возвращаем его
+            if waiter.done() and not waiter.cancelled():
+                self._release_slot()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self, latency: float, failed: bool = False) -> None:
+        """Освобождает слот и подстраивает лимит по задержке запроса"""
+        if failed or latency > self.target_latency:
+            now = time.perf_counter()
+            if now - latency >= self._last_decrease:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._last_decrease = now
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+        self._release_slot()
+
+    def retry_after(self) -> int:
+        """Оценка в секундах, через сколько стоит повторить запрос"""
+        return max(1, math.ceil(self.queue_timeout))
+
+    def _release_slot(self) -> None:
+        self.in_flight -= 1
+        # слот передаётся ожидающему напрямую, in_flight при этом не меняется
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+
+class AdmissionController:
+    """Набор лимитеров по классам маршрутов"""
+
+    def __init__(
+        self,
+        limits: dict[str, int] = settings.ADMISSION_LIMITS,
+        target_latency_ms: dict[str, float] = settings.ADMISSION_TARGET_LATENCY_MS,
+    ) -> None:
+        self.limiters = {
+            name: AdaptiveLimiter(limit=limit, target_latency=target_latency_ms.get(name, 500) / 1000)
+            for name, limit in limits.items()
+        }
+
+    def for_request(self, method: str, path: str) -> AdaptiveLimiter | None:
+        route_class = classify(method, path)
+        if route_class is None:
+            return None
+
+        return self.limiters.get(route_class)
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        return {
+            name: {
+                "limit": round(limiter.limit, 2),
+                "in_flight": limiter.in_flight,
+                "queued": limiter.queued,
+                "rejected": limiter.rejected,
+                "target_latency_ms": limiter.target_latency * 1000,
+            }
+            for name, limiter in self.limiters.items()
+        }
+
+
+admission_controller = AdmissionController()
+
+
+class AdmissionControlMiddleware:
+    """ASGI middleware: допускает запрос по лимиту его класса или сразу отвечает 503"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        controller: AdmissionController = admission_controller,
+        enabled: bool = settings.ADMISSION_CONTROL_ENABLED,
+    ) -> None:
+        self.app = app
+        self.controller = controller
+        self.enabled = enabled
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.controller.for_request(scope["method"], scope["path"])
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await limiter.acquire()
+        except Rejected:
+            response = JSONResponse(
+                {"detail": "Сервис перегружен, повторите запрос позже"},
+                status_code=503,
+                headers={"Retry-After": str(limiter.retry_after())},
+            )
+            await response(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            limiter.release(time.perf_counter() - started, failed=status_code >= 500)
@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Literal
 
 from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -15,11 +16,102 @@ class Settings(BaseSettings):
     DATABASE_URL: str = ""
     DATABASE_SYNC_URL: str = ""
     DATABASE_TEST_URL: str = ""
+    DATABASE_ECHO: bool = True
+    DATABASE_POOL_SIZE: int = 5
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_TIMEOUT: float = 30
+    # реплика для чтения (пусто - все запросы идут в основную БД)
+    DATABASE_REPLICA_URL: str = ""
+    DATABASE_REPLICA_MAX_LAG_SECONDS: float = 5
+    DATABASE_REPLICA_STICKY_SECONDS: float = 10
+    DATABASE_REPLICA_LAG_CHECK_INTERVAL: float = 1
     SECRET_KEY: str = ""
     ALGORITHM: str = ""
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
     REFRESH_TOKEN_EXPIRE_DAYS: int = 30
     AUTH_JWT_KEYS: AuthJWT = AuthJWT()
+    # профилировщик
+    PROFILER_INTERVAL_MS: float = 5
+    PROFILER_HEADER: str = "X-Profile"
+    # журнал медленных запросов
+    SLOW_QUERY_THRESHOLD_MS: float = 200
+    SLOW_QUERY_LOG_SIZE: int = 500
+    # трассировка
+    TRACING_ENABLED: bool = True
+    TRACING_BUFFER_SIZE: int = 5000
+    TRACING_FILE_PATH: str = ""
+    TRACING_OTLP_ENDPOINT: str = ""
+    TRACING_SERVICE_NAME: str = "shop-api"
+    # ограничение конкурентности по классам маршрутов
+    ADMISSION_CONTROL_ENABLED: bool = True
+    ADMISSION_QUEUE_SIZE: int = 100
+    ADMISSION_QUEUE_TIMEOUT: float = 1.0
+    ADMISSION_LIMITS: dict[str, int] = {"catalog_read": 64, "cart_write": 32, "checkout": 16, "auth": 8}
+    ADMISSION_TARGET_LATENCY_MS: dict[str, float] = {
+        "catalog_read": 200,
+        "cart_write": 300,
+        "checkout": 1000,
+        "auth": 500,
+    }
+    # ограничение частоты запросов (лимиты вида "10/minute" по имени лимита)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_MAX_KEYS: int = 100_000
+    RATE_LIMIT_TRUST_FORWARDED: bool = False
+    RATE_LIMITS: dict[str, str] = {"auth_login": "10/minute", "auth_register": "5/minute"}
+    # дедлайн запроса (0 - без дедлайна), для отдельных маршрутов - по имени
+    REQUEST_TIMEOUT_SECONDS: float = 30
+    REQUEST_TIMEOUTS: dict[str, float] = {"orders_by_status": 5}
+    # идемпотентность POST-запросов по заголовку Idempotency-Key
+    IDEMPOTENCY_PATHS: list[str] = ["/orders/create", "/cart/add"]
+    IDEMPOTENCY_TTL_SECONDS: int = 86400
+    IDEMPOTENCY_LOCK_SECONDS: int = 60
+    IDEMPOTENCY_CLEANUP_INTERVAL: float = 600
+    # outbox событий
+    OUTBOX_BATCH_SIZE: int = 100
+    OUTBOX_POLL_INTERVAL: float = 1.0
+    OUTBOX_MAX_ATTEMPTS: int = 10
+    OUTBOX_RETENTION_HOURS: int = 168
+    # SSE-поток событий заказов
+    SSE_HEARTBEAT_SECONDS: float = 15
+    SSE_QUEUE_SIZE: int = 100
+    SSE_REPLAY_LIMIT: int = 500
+    SSE_REPLAY_LOOKBACK_SECONDS: float = 30
+    SSE_SEEN_WINDOW: int = 1000
+    # WebSocket-рассылка остатков товаров
+    STOCK_PUSH_INTERVAL: float = 1.0
+    STOCK_WS_MAX_PRODUCTS: int = 100
+    # дневные итоги продаж
+    ANALYTICS_REFRESH_INTERVAL: float = 60
+    ANALYTICS_REFRESH_BATCH_DAYS: int = 31
+    ANALYTICS_MAX_RANGE_DAYS: int = 366
+    # отчёты на NumPy: строк в пачке серверного курсора (0 - весь период в памяти)
+    REPORTS_CHUNK_SIZE: int = 50_000
+    # рекомендации "покупают вместе": метрика cosine | lift, порог совместных заказов пары
+    RECOMMENDATIONS_REFRESH_INTERVAL: float = 3600
+    RECOMMENDATIONS_LOOKBACK_DAYS: int = 365
+    RECOMMENDATIONS_TOP_K: int = 10
+    RECOMMENDATIONS_MIN_ORDERS: int = 2
+    RECOMMENDATIONS_SCORE: Literal["cosine", "lift"] = "cosine"
+    # рейтинг популярности товаров (проданные штуки с затуханием)
+    POPULARITY_REFRESH_INTERVAL: float = 600
+    POPULARITY_LOOKBACK_DAYS: int = 90
+    POPULARITY_HALF_LIFE_DAYS: float = 14
+    # фасеты каталога: левые границы ценовых диапазонов, кэш посчитанных фасетов
+    FACETS_RELOAD_INTERVAL: float = 5.0
+    FACETS_PRICE_EDGES: list[float] = [0, 500, 1000, 2500, 5000, 10000, 50000]
+    FACETS_CACHE_SIZE: int = 1024
+    PRODUCT_FILTER_MAX_CATEGORIES: int = 50
+    # максимум id в одном запросе GET /products/batch
+    PRODUCT_BATCH_MAX_IDS: int = 100
+    # справочник категорий в памяти процесса: сколько страниц списка хранить готовым JSON
+    CATEGORY_PAGE_CACHE_SIZE: int = 256
+    # X-Total-Count: ниже порога оценки планировщика режим estimated считает точно
+    COUNT_EXACT_THRESHOLD: int = 10_000
+    COUNT_CACHE_TTL_SECONDS: float = 30
+    COUNT_CACHE_SIZE: int = 1024
+    # подсказки поиска
+    SUGGEST_LIMIT: int = 10
+    SUGGEST_MAX_LIMIT: int = 20
 
     model_config = SettingsConfigDict(env_file=".env")
 
@@ -0,0 +1,68 @@
+"""
+Контекст текущего запроса.
+
+Middleware кладёт в contextvars ASGI scope и ID запроса, чтобы код, у которого
+нет доступа к Request (события SQLAlchemy, логирование), мог связать свою
+работу с исходным маршрутом.
+"""
+
+import uuid
+from contextvars import ContextVar
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+request_id_var: ContextVar[str | None] = ContextVar("request_id", default=None)
+request_scope_var: ContextVar[Scope | None] = ContextVar("request_scope", default=None)
+
+
+def get_request_id() -> str | None:
+    return request_id_var.get()
+
+
+def get_route_path() -> str | None:
+    """Шаблон маршрута текущего запроса (например `/orders/{order_id}`) или сырой путь до роутинга"""
+    scope = request_scope_var.get()
+    if scope is None:
+        return None
+
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+
+    return scope.get("path")
+
+
+class RequestContextMiddleware:
+    """ASGI middleware, заполняющая контекст запроса и возвращающая X-Request-ID в ответе"""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self._header_key = REQUEST_ID_HEADER.lower().encode()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == self._header_key:
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        async def send_with_request_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append(REQUEST_ID_HEADER, request_id)
+            await send(message)
+
+        id_token = request_id_var.set(request_id)
+        scope_token = request_scope_var.set(scope)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_scope_var.reset(scope_token)
+            request_id_var.reset(id_token)
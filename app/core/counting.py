@@ -0,0 +1,150 @@
+"""
+Общее количество строк для постраничных списков.
+
+Клиент запрашивает количество параметром `count`, и оно возвращается в
+заголовке `X-Total-Count` (`X-Total-Count-Exact` - точное ли оно). Без
+параметра лишних запросов нет.
+
+- `exact` - `COUNT(*)` по запросу списка без сортировки и пагинации; результат
+  кэшируется в процессе на `COUNT_CACHE_TTL_SECONDS`, поэтому листание страниц
+  не пересчитывает его на каждый запрос (число может отставать на этот TTL);
+- `planned` - оценка планировщика: `pg_class.reltuples` для списка без фильтров
+  и `Plan Rows` из EXPLAIN для отфильтрованного;
+- `estimated` - оценка планировщика, а если она меньше `COUNT_EXACT_THRESHOLD` -
+  точное количество: маленькие выборки считаются быстро, большие - не считаются.
+"""
+
+import json
+import time
+from enum import Enum
+from typing import NamedTuple
+
+from fastapi import Response
+from sqlalchemy import Select, Table, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from .config import settings
+
+
+class CountMode(str, Enum):
+    exact = "exact"
+    planned = "planned"
+    estimated = "estimated"
+
+
+class TotalCount(NamedTuple):
+    value: int
+    exact: bool
+
+
+class Explain(Executable, ClauseElement):
+    """`EXPLAIN (FORMAT JSON)` для запроса SQLAlchemy с обычной передачей параметров"""
+
+    inherit_cache = False
+
+    def __init__(self, statement: Select) -> None:
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element: Explain, compiler, **kw) -> str:
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def _single_table(query: Select) -> Table | None:
+    """Таблица запроса без фильтров и соединений - для неё подойдёт reltuples"""
+    froms = query.get_final_froms()
+    if query.whereclause is None and len(froms) == 1 and isinstance(froms[0], Table):
+        return froms[0]
+    return None
+
+
+class RowCounter:
+    """Подсчёт строк запроса с кэшем точных значений
+
+    Attributes:
+        exact_threshold (int): Оценка, ниже которой режим estimated считает точно
+        ttl (float): Сколько секунд хранить точное количество
+        cache_size (int): Сколько запросов хранить в кэше
+    """
+
+    def __init__(
+        self,
+        exact_threshold: int = settings.COUNT_EXACT_THRESHOLD,
+        ttl: float = settings.COUNT_CACHE_TTL_SECONDS,
+        cache_size: int = settings.COUNT_CACHE_SIZE,
+    ) -> None:
+        self.exact_threshold = exact_threshold
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self._cache: dict[tuple[str, str], tuple[float, int]] = {}
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    async def count(self, session: AsyncSession, query: Select, mode: CountMode) -> TotalCount:
+        """Количество строк запроса списка (сортировка и пагинация отбрасываются)
+
+        Args:
+            session (AsyncSession): Асинхронная сессия БД
+            query (Select): Запрос списка
+            mode (CountMode): Способ подсчёта
+
+        Returns:
+            TotalCount: Количество и признак точности
+        """
+        query = query.order_by(None).limit(None).offset(None)
+
+        if mode == CountMode.exact:
+            return TotalCount(await self.exact(session, query), exact=True)
+
+        planned = await self.planned(session, query)
+        if mode == CountMode.estimated and planned < self.exact_threshold:
+            return TotalCount(await self.exact(session, query), exact=True)
+
+        return TotalCount(planned, exact=False)
+
+    async def exact(self, session: AsyncSession, query: Select) -> int:
+        compiled = query.compile(dialect=session.get_bind().dialect)
+        key = (str(compiled), repr(compiled.params))
+        now = time.monotonic()
+
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+        value = await session.scalar(select(func.count()).select_from(query.subquery()))
+
+        self._cache.pop(key, None)
+        if len(self._cache) >= self.cache_size:
+            # вытесняем самую старую запись
+            del self._cache[next(iter(self._cache))]
+        self._cache[key] = (now + self.ttl, value)
+
+        return value
+
+    async def planned(self, session: AsyncSession, query: Select) -> int:
+        table = _single_table(query)
+        if table is not None:
+            reltuples = await session.scalar(
+                text("SELECT reltuples FROM pg_class WHERE oid = to_regclass(:name)"),
+                {"name": table.fullname},
+            )
+            # -1 - таблицу ещё не анализировали
+            if reltuples is not None and reltuples >= 0:
+                return int(reltuples)
+
+        plan = await session.scalar(Explain(query))
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+
+row_counter = RowCounter()
+
+
+def set_total_count(response: Response, total: TotalCount) -> None:
+    response.headers["X-Total-Count"] = str(total.value)
+    response.headers["X-Total-Count-Exact"] = "true" if total.exact else "false"
@@ -1,9 +1,20 @@
-from collections.abc import AsyncGenerator
+import asyncio
+import time
+from collections.abc import AsyncGenerator, AsyncIterator
+from contextlib import asynccontextmanager
 
+from fastapi import Depends, HTTPException
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.orm import DeclarativeBase, Session
+
+from app.monitoring.slow_queries import normalize_sql, slow_query_log
+from app.monitoring.tracing import current_span, tracer
 
 from .config import settings
+from .deadline import get_deadline, is_query_canceled
 
 
 # Базовый класс моделей
@@ -12,18 +23,239 @@ class Base(DeclarativeBase):
 
 
 # Создаём движок SQLAlchemy
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
+engine = create_async_engine(
+    settings.DATABASE_URL,
+    echo=settings.DATABASE_ECHO,
+    pool_size=settings.DATABASE_POOL_SIZE,
+    max_overflow=settings.DATABASE_MAX_OVERFLOW,
+    pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+    pool_pre_ping=True,
+)
 
 # Фабрика сессий
 async_session_factory = async_sessionmaker(engine, expire_on_commit=False)
 
+# Движок и фабрика сессий реплики (если реплика не настроена - None, все чтения идут в основную БД)
+replica_engine = (
+    create_async_engine(
+        settings.DATABASE_REPLICA_URL,
+        echo=settings.DATABASE_ECHO,
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        pool_pre_ping=True,
+    )
+    if settings.DATABASE_REPLICA_URL
+    else None
+)
+replica_session_factory = (
+    async_sessionmaker(replica_engine, expire_on_commit=False) if replica_engine is not None else None
+)
+
+
+# Замер времени выполнения запросов для журнала медленных запросов и SQL-спаны трассировки.
+# Слушатели висят на классе Engine, поэтому работают для любого движка приложения.
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    span = None
+    if tracer.enabled and current_span.get() is not None:
+        span = tracer.start_span("db.query", kind="client", **{"db.statement": normalize_sql(statement)})
+    conn.info.setdefault("query_start", []).append((time.perf_counter(), span))
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started, span = conn.info["query_start"].pop()
+    rows = getattr(cursor, "rowcount", -1)
+    slow_query_log.record(
+        statement=statement,
+        parameters=parameters,
+        elapsed_ms=(time.perf_counter() - started) * 1000,
+        rows=rows,
+        executemany=executemany,
+    )
+    if span is not None:
+        span.attributes["db.rows"] = rows
+        tracer.end_span(span)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    # упавший запрос не дойдёт до after_cursor_execute - снимаем его отметку времени
+    if is_query_canceled(exception_context.original_exception):
+        deadline = get_deadline()
+        if deadline is not None:
+            deadline.timed_out = True
+
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start"):
+        _, span = conn.info["query_start"].pop()
+        if span is not None:
+            span.status = "error"
+            span.attributes["error"] = type(exception_context.original_exception).__name__
+            tracer.end_span(span)
+
+
+# Дедлайн запроса передаётся в Postgres: запрос, не успевший до дедлайна, прерывается самой БД,
+# а не продолжает занимать соединение после того, как клиент получил 504.
+@event.listens_for(Session, "after_begin")
+def _set_statement_timeout(session, transaction, connection):
+    deadline = get_deadline()
+    if deadline is None or deadline.at == float("inf") or connection.dialect.name != "postgresql":
+        return
 
-# Dependency для получения сессии
+    timeout_ms = max(1, int(deadline.remaining() * 1000))
+    connection.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout_ms}")
+
+
+# Dependency для получения сессии.
+#
+# Сессия ленивая: соединение из пула берётся только при первом запросе к БД,
+# поэтому пути без обращения к БД (ошибки валидации, ответы из кэша) пул не занимают.
+# Объявлять зависимость нужно как Depends(get_async_session, scope="function"):
+# тогда сессия закрывается и соединение возвращается в пул сразу после обработчика,
+# а не после отправки ответа клиенту. Все зависимости одного запроса должны
+# использовать одинаковый scope, иначе FastAPI создаст для них разные сессии.
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_factory() as session:
         yield session
 
 
+class ReplicaRouter:
+    """Маршрутизация чтений между репликой и основной БД
+
+    Чтение идёт в реплику, если она настроена и её отставание не больше `max_lag`.
+    После изменения данных пользователем его чтения `sticky_seconds` секунд
+    идут в основную БД (read-your-writes). Состояние хранится в памяти процесса,
+    поэтому окно «липкости» действует в пределах одного воркера.
+
+    Attributes:
+        session_factory (async_sessionmaker | None): Фабрика сессий реплики
+        max_lag (float): Допустимое отставание реплики в секундах
+        sticky_seconds (float): Сколько секунд после записи читать из основной БД
+        lag_check_interval (float): Как часто перепроверять отставание реплики
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker | None = replica_session_factory,
+        max_lag: float = settings.DATABASE_REPLICA_MAX_LAG_SECONDS,
+        sticky_seconds: float = settings.DATABASE_REPLICA_STICKY_SECONDS,
+        lag_check_interval: float = settings.DATABASE_REPLICA_LAG_CHECK_INTERVAL,
+    ) -> None:
+        self.session_factory = session_factory
+        self.max_lag = max_lag
+        self.sticky_seconds = sticky_seconds
+        self.lag_check_interval = lag_check_interval
+
+        self._sticky_until: dict[int, float] = {}
+        self._lag: float | None = None
+        self._lag_checked_at = float("-inf")
+        self._lock = asyncio.Lock()
+
+    def mark_write(self, user_id: int) -> None:
+        """Отмечает, что пользователь изменил данные - его чтения временно идут в основную БД"""
+        now = time.monotonic()
+        if len(self._sticky_until) > 10_000:
+            self._sticky_until = {uid: until for uid, until in self._sticky_until.items() if until > now}
+        self._sticky_until[user_id] = now + self.sticky_seconds
+
+    def is_sticky(self, user_id: int | None) -> bool:
+        if user_id is None:
+            return False
+
+        until = self._sticky_until.get(user_id)
+        return until is not None and until > time.monotonic()
+
+    def choose(self, user_id: int | None, session: AsyncSession, read_session: AsyncSession) -> AsyncSession:
+        """Сессия для чтения данных пользователя с учётом read-your-writes"""
+        return session if self.is_sticky(user_id) else read_session
+
+    async def replica_usable(self) -> bool:
+        """Настроена ли реплика и укладывается ли её отставание в порог (результат кэшируется)"""
+        if self.session_factory is None:
+            return False
+
+        if time.monotonic() - self._lag_checked_at > self.lag_check_interval:
+            async with self._lock:
+                if time.monotonic() - self._lag_checked_at > self.lag_check_interval:
+                    self._lag = await self._measure_lag()
+                    self._lag_checked_at = time.monotonic()
+
+        return self._lag is not None and self._lag <= self.max_lag
+
+    async def _measure_lag(self) -> float | None:
+        # если реплика проиграла весь полученный WAL, она не отстаёт, даже если записей давно не было
+        query = text(
+            "SELECT COALESCE(CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+            "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END, 0)"
+        )
+        try:
+            async with self.session_factory() as session:
+                result = await session.execute(query)
+                return float(result.scalar_one())
+        except Exception:
+            # реплика недоступна - читаем из основной БД до следующей проверки
+            return None
+
+
+replica_router = ReplicaRouter()
+
+
+# Dependency для сессии только на чтение: реплика, если она доступна, иначе основная сессия запроса.
+# Основная сессия ленивая, поэтому если чтение ушло в реплику, соединение с основной БД не берётся.
+async def get_async_read_session(
+    session: AsyncSession = Depends(get_async_session, scope="function"),
+) -> AsyncGenerator[AsyncSession, None]:
+    if not await replica_router.replica_usable():
+        yield session
+        return
+
+    async with replica_router.session_factory() as replica_session:
+        yield replica_session
+
+
+FOREIGN_KEY_VIOLATION_SQLSTATE = "23503"
+
+
+def is_foreign_key_violation(exc: BaseException, column: str | None = None) -> bool:
+    """Ошибка БД - нарушение внешнего ключа (при `column` - именно по этой колонке)"""
+    error = getattr(exc, "orig", None) or exc
+    if getattr(error, "sqlstate", None) != FOREIGN_KEY_VIOLATION_SQLSTATE:
+        return False
+    # исключение asyncpg с именем колонки в detail: Key (category_id)=(1) is not present ...
+    detail = getattr(error.__cause__, "detail", None) or ""
+    return column is None or f"({column})=" in detail
+
+
+@asynccontextmanager
+async def foreign_key_errors(
+    session: AsyncSession,
+    column: str | None,
+    status_code: int,
+    detail: str,
+) -> AsyncIterator[None]:
+    """Записывает изменения блока в savepoint; нарушение внешнего ключа - HTTPException
+
+    Ссылку проверяет внешний ключ при записи, а не отдельный запрос перед ней. При
+    ошибке откатывается только savepoint - транзакция сессии остаётся рабочей.
+
+    Args:
+        session (AsyncSession): Асинхронная сессия БД
+        column (str | None): Колонка внешнего ключа (None - любой внешний ключ)
+        status_code (int): HTTP-статус ответа при нарушении
+        detail (str): Текст ошибки
+    """
+    try:
+        async with session.begin_nested():
+            yield
+            await session.flush()
+    except IntegrityError as exc:
+        if is_foreign_key_violation(exc, column):
+            raise HTTPException(status_code=status_code, detail=detail) from exc
+        raise
+
+
 # Гарантируем, что все модели будут импортированы и промаппированы
 # до того, как кто-то запросит metadata или создаст миграции
 import app.models  # noqa: F401, E402
@@ -0,0 +1,179 @@
+"""
+Дедлайн запроса.
+
+Middleware задаёт каждому HTTP-запросу дедлайн (`REQUEST_TIMEOUT_SECONDS`),
+маршрут может ужесточить его зависимостью `RequestDeadline`. Дедлайн:
+
+- передаётся в БД как `SET LOCAL statement_timeout` в начале каждой транзакции
+  (см. `app.core.database`), поэтому Postgres сам прерывает запрос, который
+  не успеет выполниться;
+- отменяет обработку запроса, когда время вышло или клиент отключился -
+  отмена задачи прерывает и выполняющийся запрос asyncpg.
+
+Если ответ ещё не начат, клиент получает 504. Дедлайн ограничивает время до
+начала ответа: потоковые ответы (SSE) после отправки заголовков живут, пока
+клиент не отключится.
+"""
+
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# SQLSTATE query_canceled: сработал statement_timeout или запрос отменён
+QUERY_CANCELED_SQLSTATE = "57014"
+
+
+class Deadline:
+    """Дедлайн текущего запроса
+
+    Attributes:
+        at (float): Момент истечения по time.monotonic()
+        disconnected (bool): Клиент отключился, не дождавшись ответа
+        timed_out (bool): Время вышло (в приложении или в БД)
+    """
+
+    def __init__(self, timeout: float) -> None:
+        self.at = time.monotonic() + timeout
+        self.disconnected = False
+        self.timed_out = False
+        self._timeout: asyncio.Timeout | None = None
+
+    def remaining(self) -> float:
+        return max(0.0, self.at - time.monotonic())
+
+    def tighten(self, timeout: float) -> None:
+        """Сокращает дедлайн до `timeout` секунд от текущего момента (продлить нельзя)"""
+        self.at = min(self.at, time.monotonic() + timeout)
+        self._reschedule()
+
+    def release(self) -> None:
+        """Снимает дедлайн: ответ начат, дальше его длительность ограничивает только клиент"""
+        self.at = float("inf")
+        if self._timeout is not None and not self._timeout.expired():
+            self._timeout.reschedule(None)
+
+    def expire(self) -> None:
+        """Немедленно прерывает обработку запроса"""
+        self.at = time.monotonic()
+        self._reschedule()
+
+    def _reschedule(self) -> None:
+        if self._timeout is not None and not self._timeout.expired():
+            self._timeout.reschedule(asyncio.get_running_loop().time() + self.remaining())
+
+
+deadline_var: ContextVar[Deadline | None] = ContextVar("deadline", default=None)
+
+
+def get_deadline() -> Deadline | None:
+    return deadline_var.get()
+
+
+def is_query_canceled(exc: BaseException) -> bool:
+    """Ошибка БД (исключение драйвера или обёртка SQLAlchemy) вызвана statement_timeout / отменой запроса"""
+    error = getattr(exc, "orig", None) or exc
+    return getattr(error, "sqlstate", None) == QUERY_CANCELED_SQLSTATE
+
+
+class RequestDeadline:
+    """Dependency, ужесточающая дедлайн маршрута
+
+    Значение берётся из `settings.REQUEST_TIMEOUTS[name]`, если оно там задано.
+    """
+
+    def __init__(self, name: str, timeout: float) -> None:
+        self.name = name
+        self.timeout = settings.REQUEST_TIMEOUTS.get(name, timeout)
+
+    async def __call__(self) -> None:
+        deadline = deadline_var.get()
+        if deadline is not None:
+            deadline.tighten(self.timeout)
+
+
+class DeadlineMiddleware:
+    """ASGI middleware: дедлайн запроса, отмена по отключению клиента и ответ 504"""
+
+    def __init__(self, app: ASGIApp, timeout: float = settings.REQUEST_TIMEOUT_SECONDS) -> None:
+        self.app = app
+        self.timeout = timeout
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.timeout <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        deadline = Deadline(self.timeout)
+        response_started = False
+        response_complete = False
+        replaced = False
+
+        # сообщения клиента читаем в отдельной задаче, чтобы заметить отключение,
+        # даже если обработчик сейчас ждёт БД; приложению они отдаются через очередь
+        messages: asyncio.Queue[Message] = asyncio.Queue()
+
+        async def receive_from_queue() -> Message:
+            return await messages.get()
+
+        async def watch_disconnect() -> None:
+            while True:
+                message = await receive()
+                await messages.put(message)
+                if message["type"] == "http.disconnect":
+                    if not response_complete:
+                        deadline.disconnected = True
+                        deadline.expire()
+                    return
+
+        async def send_tracking(message: Message) -> None:
+            nonlocal response_started, response_complete, replaced
+            if replaced:
+                return
+
+            if message["type"] == "http.response.start":
+                if message["status"] == 500 and deadline.timed_out:
+                    # сервис превратил отмену запроса в БД в 500 - отдаём 504
+                    replaced = True
+                    await self._timeout_response()(scope, receive_from_queue, send)
+                    response_started = response_complete = True
+                    return
+                response_started = True
+                deadline.release()
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_complete = True
+
+            await send(message)
+
+        token = deadline_var.set(deadline)
+        watcher = asyncio.create_task(watch_disconnect())
+        try:
+            async with asyncio.timeout(deadline.remaining()) as timeout:
+                deadline._timeout = timeout
+                await self.app(scope, receive_from_queue, send_tracking)
+        except Exception as e:
+            if not isinstance(e, TimeoutError) and not is_query_canceled(e):
+                raise
+
+            deadline.timed_out = True
+            if deadline.disconnected:
+                logger.info("Клиент отключился, обработка %s %s прервана", scope["method"], scope["path"])
+                return
+            if response_started:
+                raise
+
+            await self._timeout_response()(scope, receive_from_queue, send)
+        finally:
+            watcher.cancel()
+            deadline_var.reset(token)
+
+    @staticmethod
+    def _timeout_response() -> JSONResponse:
+        return JSONResponse({"detail": "Превышено время обработки запроса"}, status_code=504)
@@ -0,0 +1,85 @@
+"""
+Частичные ответы списков (sparse fieldsets).
+
+Клиент перечисляет нужные поля параметром `fields=id,title,price`. Сервис
+загружает из БД только колонки этих полей (`load_only`) и не подгружает
+связанные объекты, которые не запрошены, а ответ сериализуется моделью, в
+которой оставлены только запрошенные поля. Без параметра ответ прежний.
+"""
+
+from collections.abc import Iterable
+from functools import lru_cache
+from typing import Annotated, Any
+
+from fastapi import HTTPException, Query, Response, status
+from pydantic import BaseModel, ConfigDict, TypeAdapter, create_model
+from sqlalchemy import inspect
+from sqlalchemy.orm import load_only
+from sqlalchemy.orm.interfaces import LoaderOption
+
+
+class FieldsParam:
+    """Dependency - набор полей модели ответа из параметра `fields`
+
+    `id` возвращается всегда; неизвестное поле - 400. Без параметра - None (все поля).
+    Экземпляр можно указывать в нескольких Depends одного запроса - значение считается один раз.
+    """
+
+    def __init__(self, model: type[BaseModel]) -> None:
+        self.model = model
+
+    def __call__(
+        self,
+        fields: Annotated[
+            str | None,
+            Query(max_length=500, description="Поля ответа через запятую, например id,title,price"),
+        ] = None,
+    ) -> frozenset[str] | None:
+        if fields is None:
+            return None
+
+        names = {name.strip() for name in fields.split(",") if name.strip()}
+        unknown = names - self.model.model_fields.keys()
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Неизвестные поля: {', '.join(sorted(unknown))}",
+            )
+
+        return frozenset(names | {"id"})
+
+
+def load_only_fields(entity: type, fields: Iterable[str], *extra) -> LoaderOption:
+    """`load_only` для колонок сущности, совпадающих с запрошенными полями (плюс `extra`)"""
+    columns = inspect(entity).column_attrs
+    return load_only(*(getattr(entity, name) for name in fields if name in columns), *extra)
+
+
+@lru_cache(maxsize=256)
+def _list_adapter(model: type[BaseModel], fields: frozenset[str]) -> TypeAdapter:
+    partial = create_model(
+        f"{model.__name__}Fields",
+        __config__=ConfigDict(from_attributes=True),
+        **{name: (info.annotation, info) for name, info in model.model_fields.items() if name in fields},
+    )
+    return TypeAdapter(list[partial])
+
+
+def fields_response(
+    items: Iterable[Any],
+    model: type[BaseModel],
+    fields: frozenset[str],
+    response: Response | None = None,
+) -> Response:
+    """JSON-ответ со списком объектов, в котором только запрошенные поля
+
+    Args:
+        items: ORM-объекты списка
+        model (type[BaseModel]): Полная модель ответа
+        fields (frozenset[str]): Запрошенные поля
+        response (Response | None): Ответ, в котором зависимости выставили заголовки (X-Total-Count)
+    """
+    adapter = _list_adapter(model, fields)
+    content = adapter.dump_json(adapter.validate_python(list(items), from_attributes=True))
+    headers = dict(response.headers) if response is not None else None
+    return Response(content=content, media_type="application/json", headers=headers)
@@ -0,0 +1,162 @@
+"""
+Ограничение частоты запросов (rate limiting) по алгоритму token bucket.
+
+Ключ ограничения - id пользователя из JWT (если в запросе есть валидный токен)
+или IP-адрес клиента. Состояние корзин хранится в памяти процесса
+(`MemoryRateLimitBackend`): на ключ приходится кортеж из двух float, а число
+ключей ограничено с вытеснением давно не использованных. Для нескольких воркеров
+можно подключить общее хранилище, реализовав протокол `RateLimitBackend`.
+
+Ответы содержат заголовки RateLimit-Limit / RateLimit-Remaining / RateLimit-Reset,
+при превышении лимита - 429 с Retry-After.
+"""
+
+import math
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Protocol
+
+from fastapi import HTTPException, Request, Response, status
+
+from .config import settings
+from .security import decode_jwt
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+_RATE_RE = re.compile(r"^\s*(\d+)\s*/\s*(\d+)?\s*(second|minute|hour|day)s?\s*$")
+
+
+def parse_rate(value: str) -> tuple[int, float]:
+    """Разбирает лимит вида `10/minute` или `100/5minutes` в (capacity, период в секундах)"""
+    match = _RATE_RE.match(value)
+    if match is None:
+        raise ValueError(f"Неверный формат лимита: {value!r}")
+
+    capacity, multiplier, period = match.groups()
+    return int(capacity), int(multiplier or 1) * _PERIODS[period]
+
+
+@dataclass(frozen=True, slots=True)
+class RateLimitState:
+    allowed: bool
+    remaining: int
+    reset_after: float
+    retry_after: float
+
+
+class RateLimitBackend(Protocol):
+    """Хранилище корзин токенов. Реализация должна атомарно списывать токены по ключу"""
+
+    async def consume(self, key: str, capacity: int, period: float, cost: float = 1) -> RateLimitState: ...
+
+    async def reset(self) -> None: ...
+
+
+class MemoryRateLimitBackend:
+    """Корзины токенов в памяти процесса
+
+    Attributes:
+        max_keys (int): Максимальное количество отслеживаемых ключей
+    """
+
+    def __init__(self, max_keys: int = settings.RATE_LIMIT_MAX_KEYS) -> None:
+        self.max_keys = max_keys
+        # ключ -> (количество токенов, время последнего пополнения)
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def consume(self, key: str, capacity: int, period: float, cost: float = 1) -> RateLimitState:
+        now = time.monotonic()
+        refill_rate = capacity / period
+
+        tokens, updated = self._buckets.pop(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * refill_rate)
+
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            # вытесняем ключ, к которому дольше всего не обращались
+            self._buckets.popitem(last=False)
+
+        return RateLimitState(
+            allowed=allowed,
+            remaining=int(tokens),
+            reset_after=(capacity - tokens) / refill_rate,
+            retry_after=0 if allowed else (cost - tokens) / refill_rate,
+        )
+
+    async def reset(self) -> None:
+        self._buckets.clear()
+
+
+rate_limit_backend: RateLimitBackend = MemoryRateLimitBackend()
+
+
+def get_client_ip(request: Request) -> str:
+    if settings.RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("X-Forwarded-For")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+
+    return request.client.host if request.client else "unknown"
+
+
+def get_client_key(request: Request) -> str:
+    """Ключ клиента: пользователь из JWT или IP-адрес"""
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            sub = decode_jwt(token).get("sub")
+        except Exception:
+            sub = None
+        if sub is not None:
+            return f"user:{sub}"
+
+    return f"ip:{get_client_ip(request)}"
+
+
+class RateLimiter:
+    """Dependency, ограничивающая частоту запросов к маршруту
+
+    Лимит берётся из `settings.RATE_LIMITS[name]`, если он там задан.
+
+    Attributes:
+        name (str): Имя лимита, входит в ключ корзины
+        capacity (int): Размер корзины - сколько запросов можно сделать подряд
+        period (float): За сколько секунд корзина пополняется полностью
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: str = "60/minute",
+        backend: RateLimitBackend | None = None,
+    ) -> None:
+        self.name = name
+        self.capacity, self.period = parse_rate(settings.RATE_LIMITS.get(name, rate))
+        self.backend = backend
+
+    async def __call__(self, request: Request, response: Response) -> None:
+        if not settings.RATE_LIMIT_ENABLED:
+            return
+
+        backend = self.backend or rate_limit_backend
+        key = f"{self.name}:{get_client_key(request)}"
+        state = await backend.consume(key, self.capacity, self.period)
+        headers = {
+            "RateLimit-Limit": str(self.capacity),
+            "RateLimit-Remaining": str(state.remaining),
+            "RateLimit-Reset": str(math.ceil(state.reset_after)),
+        }
+
+        if not state.allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Слишком много запросов, повторите позже",
+                headers={**headers, "Retry-After": str(max(1, math.ceil(state.retry_after)))},
+            )
+
+        response.headers.update(headers)
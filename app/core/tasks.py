@@ -0,0 +1,63 @@
+"""
+Фоновые задачи приложения.
+
+Модули регистрируют периодические задачи через `register_periodic_task` и
+долгоживущие циклы через `register_background_task`, а lifespan приложения
+запускает их при старте и отменяет при остановке. Ошибка одного запуска
+периодической задачи логируется и не останавливает её.
+"""
+
+import asyncio
+import logging
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+from fastapi import FastAPI
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class PeriodicTask:
+    name: str
+    interval: float
+    func: Callable[[], Awaitable[object]]
+
+
+periodic_tasks: list[PeriodicTask] = []
+background_tasks: dict[str, Callable[[], Awaitable[object]]] = {}
+
+
+def register_periodic_task(name: str, interval: float, func: Callable[[], Awaitable[object]]) -> None:
+    """Регистрирует корутинную функцию, которая будет вызываться раз в `interval` секунд"""
+    periodic_tasks.append(PeriodicTask(name=name, interval=interval, func=func))
+
+
+def register_background_task(name: str, func: Callable[[], Awaitable[object]]) -> None:
+    """Регистрирует корутинную функцию, работающую всё время жизни приложения"""
+    background_tasks[name] = func
+
+
+async def _run_periodically(task: PeriodicTask) -> None:
+    while True:
+        await asyncio.sleep(task.interval)
+        try:
+            await task.func()
+        except Exception:
+            # отмена посреди работы с БД может прийти в виде ошибки SQLAlchemy
+            if asyncio.current_task().cancelling():
+                raise
+            logger.exception("Ошибка фоновой задачи %s", task.name)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    running = [asyncio.create_task(_run_periodically(task), name=task.name) for task in periodic_tasks]
+    running += [asyncio.create_task(func(), name=name) for name, func in background_tasks.items()]
+    try:
+        yield
+    finally:
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
@@ -0,0 +1,209 @@
+"""
+Pub/sub событий для долгоживущих подключений (SSE, WebSocket).
+
+`EventBroker` раздаёт сообщения подписчикам внутри процесса. У каждой подписки
+ограниченная очередь: если клиент не успевает читать и очередь переполнилась,
+подписка закрывается - клиент переподключается и досылает пропущенное сам
+(например, по Last-Event-ID), а память процесса не растёт.
+
+Между воркерами сообщения передаются через Postgres NOTIFY: `notify` отправляет
+сообщение в канал в транзакции переданной сессии, а `PgListener` держит
+отдельное соединение с LISTEN и передаёт полученное в broker своего процесса.
+Сообщения, отправленные этим же процессом, слушатель пропускает - они уже
+доставлены локально. NOTIFY, отправленные, пока соединение LISTEN было
+разорвано, теряются, поэтому после каждого (пере)подключения слушатель вызывает
+функции `resync` каналов - кэши процесса помечают себя устаревшими.
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+from collections import defaultdict
+from collections.abc import Callable, Hashable
+from typing import Any
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from app.core.config import settings
+from app.core.database import engine
+from app.core.tasks import register_background_task
+
+logger = logging.getLogger(__name__)
+
+# идентификатор процесса: по нему слушатель отличает свои NOTIFY от чужих
+PROCESS_ID = uuid.uuid4().hex
+
+
+class Subscription:
+    """Подписка одного подключения
+
+    Attributes:
+        key (Hashable): Ключ, на который оформлена подписка (например, id пользователя)
+        closed (bool): Подписка закрыта из-за переполнения очереди или отписки
+    """
+
+    def __init__(self, key: Hashable, maxsize: int) -> None:
+        self.key = key
+        self.closed = False
+        self._queue: asyncio.Queue[Any] = asyncio.Queue(maxsize=maxsize)
+
+    def put(self, message: Any) -> bool:
+        """Кладёт сообщение в очередь; при переполнении закрывает подписку"""
+        if self.closed:
+            return False
+
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.close()
+            return False
+
+        return True
+
+    def close(self) -> None:
+        self.closed = True
+        # будим читателя, если он ждёт новое сообщение
+        if self._queue.empty():
+            self._queue.put_nowait(None)
+
+    async def get(self, timeout: float) -> Any | None:
+        """Следующее сообщение или None, если за `timeout` секунд ничего не пришло"""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout=timeout)
+        except TimeoutError:
+            return None
+
+
+class EventBroker:
+    """Раздача сообщений подписчикам по ключу внутри процесса
+
+    Attributes:
+        queue_size (int): Размер очереди одной подписки
+    """
+
+    def __init__(self, queue_size: int = settings.SSE_QUEUE_SIZE) -> None:
+        self.queue_size = queue_size
+        self._subscriptions: dict[Hashable, set[Subscription]] = defaultdict(set)
+
+    def subscribe(self, key: Hashable) -> Subscription:
+        subscription = Subscription(key, maxsize=self.queue_size)
+        self._subscriptions[key].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._subscriptions.get(subscription.key)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.key]
+
+    def publish(self, key: Hashable, message: Any) -> int:
+        """Отправляет сообщение всем подписчикам ключа
+
+        Returns:
+            int: Скольким подписчикам сообщение доставлено
+        """
+        delivered = 0
+        for subscription in list(self._subscriptions.get(key, ())):
+            if subscription.put(message):
+                delivered += 1
+            else:
+                self.unsubscribe(subscription)
+
+        return delivered
+
+    def subscriber_count(self) -> int:
+        return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+async def notify(session: AsyncSession, channel: str, payload: dict[str, Any]) -> None:
+    """Отправляет NOTIFY в транзакции сессии - другие воркеры получат его после коммита"""
+    message = json.dumps({"origin": PROCESS_ID, "payload": payload}, default=str)
+    await session.execute(
+        text("SELECT pg_notify(:channel, :message)"),
+        {"channel": channel, "message": message},
+    )
+
+
+class PgListener:
+    """Слушает каналы Postgres (LISTEN) на отдельном соединении и передаёт чужие сообщения обработчикам
+
+    Attributes:
+        engine (AsyncEngine): Движок, из пула которого берётся соединение для LISTEN
+        reconnect_delay (float): Пауза перед переподключением после ошибки
+    """
+
+    def __init__(self, engine: AsyncEngine = engine, reconnect_delay: float = 5.0) -> None:
+        self.engine = engine
+        self.reconnect_delay = reconnect_delay
+        self.handlers: dict[str, Callable[[dict[str, Any]], None]] = {}
+        self.resyncs: dict[str, Callable[[], None]] = {}
+
+    def listen(
+        self,
+        channel: str,
+        handler: Callable[[dict[str, Any]], None],
+        resync: Callable[[], None] | None = None,
+    ) -> None:
+        """Подписывает обработчик на канал
+
+        Args:
+            channel (str): Канал NOTIFY
+            handler (Callable): Обработчик payload чужого сообщения
+            resync (Callable | None): Вызывается после (пере)подключения - сообщения,
+                пришедшие без соединения, потеряны
+        """
+        self.handlers[channel] = handler
+        if resync is not None:
+            self.resyncs[channel] = resync
+
+    def _resync(self) -> None:
+        for channel, resync in self.resyncs.items():
+            try:
+                resync()
+            except Exception:
+                logger.exception("Ошибка синхронизации канала %s после подключения", channel)
+
+    def _on_notification(self, connection, pid, channel: str, message: str) -> None:
+        try:
+            data = json.loads(message)
+        except ValueError:
+            logger.warning("Некорректное сообщение в канале %s", channel)
+            return
+
+        if data.get("origin") == PROCESS_ID:
+            return
+
+        self.handlers[channel](data["payload"])
+
+    async def run(self) -> None:
+        while True:
+            try:
+                async with self.engine.connect() as conn:
+                    raw = await conn.get_raw_connection()
+                    driver_connection = raw.driver_connection
+                    for channel in self.handlers:
+                        await driver_connection.add_listener(channel, self._on_notification)
+                    self._resync()
+                    try:
+                        # соединение живёт, пока его не закроет сервер или не отменят задачу
+                        while not driver_connection.is_closed():
+                            await asyncio.sleep(self.reconnect_delay)
+                    finally:
+                        # соединение вернётся в пул - подписки на нём оставлять нельзя
+                        if not driver_connection.is_closed():
+                            for channel in self.handlers:
+                                await driver_connection.remove_listener(channel, self._on_notification)
+            except Exception:
+                if asyncio.current_task().cancelling():
+                    raise
+                logger.exception("Потеряно соединение LISTEN, переподключение")
+
+            await asyncio.sleep(self.reconnect_delay)
+
+
+pg_listener = PgListener()
+
+register_background_task("pg-listener", pg_listener.run)
@@ -0,0 +1,152 @@
+"""
+Диспетчер outbox-событий.
+
+Фоновая задача забирает необработанные события пачками
+(`SELECT ... FOR UPDATE SKIP LOCKED`, поэтому несколько воркеров не мешают друг
+другу), вызывает зарегистрированные обработчики и отмечает событие обработанным
+в той же транзакции. Доставка - at-least-once: если процесс упадёт между вызовом
+обработчика и коммитом, событие будет обработано повторно, поэтому обработчики
+должны быть идемпотентными. Обработчик получает сессию диспетчера: всё, что он
+сделает в ней (например, NOTIFY), закоммитится вместе с отметкой об обработке.
+
+Ошибка обработчика откладывает событие с экспоненциальной задержкой; после
+`OUTBOX_MAX_ATTEMPTS` попыток событие больше не выбирается и остаётся в таблице
+с текстом последней ошибки.
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+from collections.abc import Awaitable, Callable
+from datetime import timedelta
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.core.database import async_session_factory
+from app.core.tasks import register_background_task, register_periodic_task
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+EventHandler = Callable[[OutboxEvent, AsyncSession], Awaitable[None]]
+ALL_EVENTS = "*"
+
+
+class OutboxDispatcher:
+    """Доставка событий из outbox локальным обработчикам
+
+    Attributes:
+        session_factory (async_sessionmaker): Фабрика сессий для выборки событий
+        batch_size (int): Сколько событий забирать за одну транзакцию
+        poll_interval (float): Интервал опроса, если новых событий не было
+        max_attempts (int): Максимальное количество попыток обработки события
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker = async_session_factory,
+        batch_size: int = settings.OUTBOX_BATCH_SIZE,
+        poll_interval: float = settings.OUTBOX_POLL_INTERVAL,
+        max_attempts: int = settings.OUTBOX_MAX_ATTEMPTS,
+    ) -> None:
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.handlers: dict[str, list[EventHandler]] = defaultdict(list)
+        self._wakeup = asyncio.Event()
+
+    def register(self, event_type: str = ALL_EVENTS) -> Callable[[EventHandler], EventHandler]:
+        """Декоратор: подписывает корутину на события типа `event_type` (`*` - на все)"""
+
+        def decorator(handler: EventHandler) -> EventHandler:
+            self.handlers[event_type].append(handler)
+            return handler
+
+        return decorator
+
+    def wake(self) -> None:
+        """Будит диспетчер после коммита новых событий"""
+        self._wakeup.set()
+
+    async def dispatch_batch(self, session: AsyncSession) -> int:
+        """Обрабатывает одну пачку событий
+
+        Returns:
+            int: Количество выбранных событий
+        """
+        result = await session.execute(
+            select(OutboxEvent)
+            .where(
+                OutboxEvent.processed_at.is_(None),
+                OutboxEvent.available_at <= func.now(),
+                OutboxEvent.attempts < self.max_attempts,
+            )
+            .order_by(OutboxEvent.id)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        events = result.scalars().all()
+
+        for outbox_event in events:
+            try:
+                for handler in (*self.handlers[outbox_event.event_type], *self.handlers[ALL_EVENTS]):
+                    await handler(outbox_event, session)
+            except Exception as e:
+                outbox_event.attempts += 1
+                outbox_event.last_error = f"{type(e).__name__}: {e}"
+                outbox_event.available_at = func.now() + timedelta(seconds=2**outbox_event.attempts)
+                logger.warning(
+                    "Ошибка обработки события %s (%s), попытка %s",
+                    outbox_event.id,
+                    outbox_event.event_type,
+                    outbox_event.attempts,
+                    exc_info=True,
+                )
+            else:
+                outbox_event.processed_at = func.now()
+
+        await session.commit()
+
+        return len(events)
+
+    async def run(self) -> None:
+        """Фоновый цикл: разбирает очередь, пока пачки полные, затем ждёт пробуждения или опроса"""
+        while True:
+            self._wakeup.clear()
+            try:
+                async with self.session_factory() as session:
+                    dispatched = await self.dispatch_batch(session)
+            except Exception:
+                # отмена посреди работы с БД может прийти в виде ошибки SQLAlchemy
+                if asyncio.current_task().cancelling():
+                    raise
+                logger.exception("Ошибка диспетчера outbox")
+                dispatched = 0
+
+            if dispatched >= self.batch_size:
+                continue
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except TimeoutError:
+                pass
+
+    async def delete_processed(self) -> None:
+        """Удаляет обработанные события старше OUTBOX_RETENTION_HOURS"""
+        async with self.session_factory() as session:
+            await session.execute(
+                delete(OutboxEvent).where(
+                    OutboxEvent.processed_at < func.now() - timedelta(hours=settings.OUTBOX_RETENTION_HOURS)
+                )
+            )
+            await session.commit()
+
+
+outbox_dispatcher = OutboxDispatcher()
+
+register_background_task("outbox-dispatcher", outbox_dispatcher.run)
+register_periodic_task("outbox-cleanup", interval=3600, func=outbox_dispatcher.delete_processed)
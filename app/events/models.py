@@ -0,0 +1,38 @@
+from datetime import datetime
+
+from sqlalchemy import JSON, BigInteger, DateTime, Index, Integer, SmallInteger, String, Text, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.database import Base
+
+
+class OutboxEvent(Base):
+    """Событие домена, записанное в той же транзакции, что и изменение данных
+
+    Диспетчер забирает необработанные события пачками и передаёт их обработчикам.
+    """
+
+    __tablename__ = "outbox_events"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    event_type: Mapped[str] = mapped_column(String(64), nullable=False)
+    aggregate_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    payload: Mapped[dict] = mapped_column(JSON, nullable=False)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    available_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    processed_at: Mapped[datetime | None] = mapped_column(DateTime)
+    attempts: Mapped[int] = mapped_column(SmallInteger, nullable=False, default=0)
+    last_error: Mapped[str | None] = mapped_column(Text)
+
+    __table_args__ = (
+        # частичный индекс только по необработанным событиям - остаётся маленьким
+        Index(
+            "ix_outbox_events_pending",
+            "available_at",
+            postgresql_where=processed_at.is_(None),
+        ),
+    )
+
+    def __repr__(self) -> str:
+        return f"<OutboxEvent(id={self.id}, event_type={self.event_type}, aggregate_id={self.aggregate_id})>"
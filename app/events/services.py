@@ -0,0 +1,44 @@
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .dispatcher import outbox_dispatcher
+from .models import OutboxEvent
+
+_PENDING_KEY = "outbox_pending"
+
+
+def add_event(
+    session: AsyncSession,
+    event_type: str,
+    aggregate_id: int,
+    payload: dict[str, Any],
+) -> OutboxEvent:
+    """Добавляет событие в outbox текущей транзакции (без коммита)
+
+    Событие попадёт в БД только вместе с изменениями, ради которых оно создано,
+    и будет доставлено обработчикам после коммита.
+
+    Args:
+        session (AsyncSession): Сессия, в транзакции которой меняются данные
+        event_type (str): Тип события, например `order.created`
+        aggregate_id (int): ID сущности, к которой относится событие
+        payload (dict[str, Any]): Данные события (JSON)
+
+    Returns:
+        OutboxEvent: Добавленное в сессию событие
+    """
+    outbox_event = OutboxEvent(event_type=event_type, aggregate_id=aggregate_id, payload=payload)
+    session.add(outbox_event)
+    session.info[_PENDING_KEY] = True
+
+    return outbox_event
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_dispatcher(session):
+    # после коммита с новыми событиями будим диспетчер, не дожидаясь следующего опроса
+    if session.info.pop(_PENDING_KEY, False):
+        outbox_dispatcher.wake()
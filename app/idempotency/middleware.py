@@ -0,0 +1,207 @@
+"""
+Поддержка заголовка Idempotency-Key.
+
+Для маршрутов из `settings.IDEMPOTENCY_PATHS` первый завершённый ответ на запрос
+с ключом сохраняется в БД, а повторы с тем же ключом получают его без повторного
+выполнения (с заголовком `Idempotent-Replayed: true`). Повтор, пришедший в этот же
+процесс, пока первый запрос ещё выполняется, ждёт его результата; если первый
+выполняется в другом процессе - получает 409. Ответы 5xx не сохраняются: ключ
+освобождается, и повтор выполнится заново.
+"""
+
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.database import get_async_session
+from app.core.rate_limit import get_client_key
+
+from .services import (
+    KeyInProgress,
+    KeyMismatch,
+    StoredResponse,
+    claim_key_service,
+    complete_key_service,
+    release_key_service,
+)
+
+IDEMPOTENCY_HEADER = b"idempotency-key"
+# заголовки, которые пересчитываются при воспроизведении ответа
+_SKIP_HEADERS = {"content-length"}
+
+
+def _open_session(scope: Scope):
+    # тот же источник сессий, что и у обработчиков, с учётом dependency_overrides
+    overrides = getattr(scope.get("app"), "dependency_overrides", {})
+    return asynccontextmanager(overrides.get(get_async_session, get_async_session))()
+
+
+async def _read_body(receive: Receive) -> tuple[bytes, Receive]:
+    """Читает тело запроса целиком и возвращает receive, отдающий его приложению повторно"""
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+
+    body = b"".join(chunks)
+    replayed = False
+
+    async def replay_receive() -> Message:
+        nonlocal replayed
+        if not replayed:
+            replayed = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return body, replay_receive
+
+
+def _replay(stored: StoredResponse) -> Response:
+    headers = dict(stored.headers)
+    headers["Idempotent-Replayed"] = "true"
+    return Response(content=stored.body, status_code=stored.status_code, headers=headers)
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware: сохранение и воспроизведение ответов по Idempotency-Key"""
+
+    def __init__(self, app: ASGIApp, paths: list[str] = settings.IDEMPOTENCY_PATHS) -> None:
+        self.app = app
+        self.paths = {path.rstrip("/") for path in paths}
+        # ответы запросов, выполняющихся в этом процессе: (владелец, ключ) -> future
+        self._in_flight: dict[tuple[str, str], asyncio.Future[StoredResponse | None]] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        key = None
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"].rstrip("/") in self.paths:
+            for name, value in scope["headers"]:
+                if name == IDEMPOTENCY_HEADER:
+                    key = value.decode("latin-1")
+                    break
+
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not key or len(key) > 255:
+            response = JSONResponse({"detail": "Некорректный заголовок Idempotency-Key"}, status_code=400)
+            await response(scope, receive, send)
+            return
+
+        owner = get_client_key(Request(scope))
+        body, receive = await _read_body(receive)
+        request_hash = hashlib.sha256(f"{scope['method']} {scope['path']}\n".encode() + body).hexdigest()
+        ident = (owner, key)
+
+        # повтор, пока первый запрос ещё выполняется в этом процессе - ждём его ответ
+        while (in_flight := self._in_flight.get(ident)) is not None:
+            stored = await asyncio.shield(in_flight)
+            if stored is not None:
+                await self._respond(stored, request_hash, scope, receive, send)
+                return
+
+        future: asyncio.Future[StoredResponse | None] = asyncio.get_running_loop().create_future()
+        self._in_flight[ident] = future
+        stored = None
+        try:
+            try:
+                async with _open_session(scope) as session:
+                    stored = await claim_key_service(session, owner, key, request_hash)
+            except KeyMismatch:
+                await self._mismatch()(scope, receive, send)
+                return
+            except KeyInProgress:
+                response = JSONResponse(
+                    {"detail": "Запрос с этим Idempotency-Key ещё выполняется"},
+                    status_code=409,
+                    headers={"Retry-After": "1"},
+                )
+                await response(scope, receive, send)
+                return
+
+            if stored is not None:
+                await self._respond(stored, request_hash, scope, receive, send)
+                return
+
+            stored = await self._execute(scope, receive, send, owner, key, request_hash)
+        finally:
+            self._in_flight.pop(ident, None)
+            future.set_result(stored)
+
+    async def _execute(
+        self,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+        owner: str,
+        key: str,
+        request_hash: str,
+    ) -> StoredResponse | None:
+        status_code = 500
+        headers: list[tuple[str, str]] = []
+        chunks: list[bytes] = []
+        complete = False
+
+        async def send_capturing(message: Message) -> None:
+            nonlocal status_code, complete
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                for name, value in message.get("headers", []):
+                    if name.decode("latin-1").lower() not in _SKIP_HEADERS:
+                        headers.append((name.decode("latin-1"), value.decode("latin-1")))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                complete = not message.get("more_body", False)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_capturing)
+        except BaseException:
+            async with _open_session(scope) as session:
+                await release_key_service(session, owner, key)
+            raise
+
+        async with _open_session(scope) as session:
+            if not complete or status_code >= 500:
+                await release_key_service(session, owner, key)
+                return None
+
+            stored = StoredResponse(
+                request_hash=request_hash,
+                status_code=status_code,
+                headers=headers,
+                body=b"".join(chunks),
+            )
+            await complete_key_service(session, owner, key, stored)
+
+        return stored
+
+    async def _respond(
+        self,
+        stored: StoredResponse,
+        request_hash: str,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+    ) -> None:
+        if stored.request_hash != request_hash:
+            await self._mismatch()(scope, receive, send)
+            return
+
+        await _replay(stored)(scope, receive, send)
+
+    @staticmethod
+    def _mismatch() -> JSONResponse:
+        return JSONResponse(
+            {"detail": "Idempotency-Key уже использован для другого запроса"},
+            status_code=422,
+        )
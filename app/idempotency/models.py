@@ -0,0 +1,29 @@
+from datetime import datetime
+
+from sqlalchemy import JSON, DateTime, LargeBinary, SmallInteger, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.database import Base
+
+
+class IdempotencyKey(Base):
+    """Результат запроса с заголовком Idempotency-Key
+
+    Пока запрос выполняется, status_code пуст, а expires_at короткий - если процесс
+    упадёт, ключ освободится сам. После завершения сохраняется ответ и TTL продлевается.
+    """
+
+    __tablename__ = "idempotency_keys"
+
+    owner: Mapped[str] = mapped_column(String(64), primary_key=True)
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    request_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    status_code: Mapped[int | None] = mapped_column(SmallInteger)
+    response_headers: Mapped[list | None] = mapped_column(JSON)
+    response_body: Mapped[bytes | None] = mapped_column(LargeBinary)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+
+    def __repr__(self) -> str:
+        return f"<IdempotencyKey(owner={self.owner}, key={self.key}, status_code={self.status_code})>"
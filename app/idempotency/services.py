@@ -0,0 +1,149 @@
+from dataclasses import dataclass
+from datetime import timedelta
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import async_session_factory
+from app.core.tasks import register_periodic_task
+
+from .models import IdempotencyKey
+
+
+@dataclass(frozen=True, slots=True)
+class StoredResponse:
+    request_hash: str
+    status_code: int
+    headers: list[tuple[str, str]]
+    body: bytes
+
+
+class KeyInProgress(Exception):
+    """Запрос с этим ключом ещё выполняется (в другом процессе)"""
+
+
+class KeyMismatch(Exception):
+    """Ключ уже использован для запроса с другим телом"""
+
+
+async def claim_key_service(
+    session: AsyncSession,
+    owner: str,
+    key: str,
+    request_hash: str,
+) -> StoredResponse | None:
+    """Сервис - занять ключ идемпотентности
+
+    Args:
+        session (AsyncSession): Асинхронная сессия БД
+        owner (str): Владелец ключа (пользователь или IP)
+        key (str): Значение заголовка Idempotency-Key
+        request_hash (str): Хэш метода, пути и тела запроса
+
+    Raises:
+        KeyInProgress: Запрос с этим ключом ещё выполняется
+        KeyMismatch: Ключ использован для другого запроса
+
+    Returns:
+        StoredResponse | None: Сохранённый ответ или None, если ключ занят этим вызовом
+    """
+    # просроченная запись не мешает занять ключ заново
+    await session.execute(
+        delete(IdempotencyKey).where(
+            IdempotencyKey.owner == owner,
+            IdempotencyKey.key == key,
+            IdempotencyKey.expires_at <= func.now(),
+        )
+    )
+    claimed = await session.execute(
+        insert(IdempotencyKey)
+        .values(
+            owner=owner,
+            key=key,
+            request_hash=request_hash,
+            expires_at=func.now() + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS),
+        )
+        .on_conflict_do_nothing()
+        .returning(IdempotencyKey.owner)
+    )
+    if claimed.scalar_one_or_none() is not None:
+        await session.commit()
+        return None
+
+    result = await session.execute(
+        select(IdempotencyKey)
+        .where(IdempotencyKey.owner == owner, IdempotencyKey.key == key)
+        .execution_options(populate_existing=True)
+    )
+    record = result.scalar_one()
+    await session.commit()
+
+    if record.request_hash != request_hash:
+        raise KeyMismatch
+    if record.status_code is None:
+        raise KeyInProgress
+
+    return StoredResponse(
+        request_hash=record.request_hash,
+        status_code=record.status_code,
+        headers=[tuple(header) for header in record.response_headers or []],
+        body=record.response_body or b"",
+    )
+
+
+async def complete_key_service(
+    session: AsyncSession,
+    owner: str,
+    key: str,
+    response: StoredResponse,
+) -> None:
+    """Сервис - сохранить ответ для ключа и продлить его до TTL"""
+    await session.execute(
+        update(IdempotencyKey)
+        .where(IdempotencyKey.owner == owner, IdempotencyKey.key == key)
+        .values(
+            status_code=response.status_code,
+            response_headers=[list(header) for header in response.headers],
+            response_body=response.body,
+            expires_at=func.now() + timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS),
+        )
+    )
+    await session.commit()
+
+
+async def release_key_service(session: AsyncSession, owner: str, key: str) -> None:
+    """Сервис - освободить ключ, если запрос завершился ошибкой и ответ не сохранён"""
+    await session.execute(
+        delete(IdempotencyKey).where(
+            IdempotencyKey.owner == owner,
+            IdempotencyKey.key == key,
+            IdempotencyKey.status_code.is_(None),
+        )
+    )
+    await session.commit()
+
+
+async def delete_expired_keys_service(session: AsyncSession) -> int:
+    """Сервис - удалить просроченные ключи
+
+    Returns:
+        int: Количество удалённых ключей
+    """
+    result = await session.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= func.now()))
+    await session.commit()
+
+    return result.rowcount
+
+
+async def _cleanup_expired_keys() -> None:
+    async with async_session_factory() as session:
+        await delete_expired_keys_service(session)
+
+
+register_periodic_task(
+    "idempotency-cleanup",
+    interval=settings.IDEMPOTENCY_CLEANUP_INTERVAL,
+    func=_cleanup_expired_keys,
+)
@@ -2,21 +2,38 @@ from fastapi import Depends, FastAPI
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from .analytics import routers as analytics_router
 from .auth import routers as auth_router
 from .auth.services import get_current_auth_user
 from .cart import routers as cart_router
 from .categories import routers as categories_router
+from .core.admission import AdmissionControlMiddleware
+from .core.context import RequestContextMiddleware
 from .core.database import get_async_session
+from .core.deadline import DeadlineMiddleware
+from .core.tasks import lifespan
+from .idempotency.middleware import IdempotencyMiddleware
+from .monitoring import routers as monitoring_router
+from .monitoring.profiler import ProfilerMiddleware
+from .monitoring.tracing import TracingMiddleware
 from .orders import routers as order_router
 from .products import routers as products_router
 from .users.schemas import UserRead
 
-app = FastAPI(title="Shop API")
+app = FastAPI(title="Shop API", lifespan=lifespan)
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(ProfilerMiddleware)
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(AdmissionControlMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(RequestContextMiddleware)
 app.include_router(products_router.router)
 app.include_router(categories_router.router)
 app.include_router(auth_router.router)
 app.include_router(cart_router.router)
 app.include_router(order_router.router)
+app.include_router(monitoring_router.router)
+app.include_router(analytics_router.router)
 
 
 @app.get("/")
@@ -25,7 +42,7 @@ async def root():
 
 
 @app.get("/db-test")
-async def db_test(session: AsyncSession = Depends(get_async_session)):
+async def db_test(session: AsyncSession = Depends(get_async_session, scope="function")):
     result = await session.execute(text("SELECT 1"))
     return {"db_status": result.scalar()}
 
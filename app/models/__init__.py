@@ -16,6 +16,9 @@ apps = [
     "cart",
     "categories",
     "orders",
+    "idempotency",
+    "events",
+    "analytics",
 ]
 
 for a in apps:
@@ -0,0 +1,202 @@
+"""
+Статистический (сэмплирующий) профилировщик живых запросов.
+
+Отдельный поток с заданным интервалом смотрит, какая asyncio-задача сейчас
+выполняется в потоке event loop, и если это профилируемый запрос — снимает
+его стек. Стеки агрегируются и отдаются в формате collapsed stacks
+(`frame;frame;frame count`), который понимают flamegraph.pl, speedscope и т.п.
+
+Сэмплируется только время на CPU: пока задача ждёт БД или сеть, она не является
+текущей задачей loop'а и в выборку не попадает.
+"""
+
+import asyncio
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from re import Pattern
+
+from starlette.routing import compile_path
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import settings
+
+# Ключ агрегации для запросов, попавших в профиль по заголовку
+HEADER_PROFILE_KEY = "header"
+
+
+class SamplingProfiler:
+    """Сэмплирующий профилировщик asyncio-задач
+
+    Attributes:
+        enabled (bool): Включён ли профилировщик
+        route (str | None): Шаблон пути, запросы к которому сэмплируются (например `/orders/{order_id}`)
+        sample_rate (float): Доля запросов к `route`, которые попадают в профиль
+        header (str): Заголовок, наличие которого включает профилирование запроса
+        interval (float): Интервал между сэмплами в секундах
+        max_depth (int): Максимальная глубина сохраняемого стека
+    """
+
+    def __init__(
+        self,
+        interval: float = settings.PROFILER_INTERVAL_MS / 1000,
+        header: str = settings.PROFILER_HEADER,
+        max_depth: int = 128,
+    ) -> None:
+        self.enabled = False
+        self.route: str | None = None
+        self.sample_rate = 0.0
+        self.header = header
+        self.interval = interval
+        self.max_depth = max_depth
+
+        self._route_regex: Pattern[str] | None = None
+        self._header_key = header.lower().encode()
+        self._active: dict[asyncio.Task, str] = {}
+        self._stacks: defaultdict[str, Counter[str]] = defaultdict(Counter)
+        self._samples: Counter[str] = Counter()
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread_id: int | None = None
+        self._thread: threading.Thread | None = None
+
+    def configure(
+        self,
+        enabled: bool,
+        route: str | None = None,
+        sample_rate: float = 0.0,
+        header: str | None = None,
+        interval: float | None = None,
+    ) -> None:
+        """Применяет новую конфигурацию профилировщика"""
+        self.route = route
+        self._route_regex = compile_path(route)[0] if route else None
+        self.sample_rate = sample_rate
+        if header:
+            self.header = header
+            self._header_key = header.lower().encode()
+        if interval:
+            self.interval = interval
+        self.enabled = enabled
+
+    def reset(self) -> None:
+        """Сбрасывает накопленные стеки"""
+        with self._lock:
+            self._stacks.clear()
+            self._samples.clear()
+
+    def select(self, scope: Scope) -> str | None:
+        """Решает, профилировать ли запрос, и возвращает ключ агрегации или None"""
+        for name, value in scope["headers"]:
+            if name == self._header_key and value:
+                return HEADER_PROFILE_KEY
+
+        if self._route_regex is not None and self._route_regex.match(scope["path"]):
+            if random.random() < self.sample_rate:
+                return self.route
+
+        return None
+
+    def register(self, task: asyncio.Task, key: str) -> None:
+        """Добавляет задачу в множество профилируемых и при необходимости запускает поток сэмплера"""
+        with self._lock:
+            self._loop = task.get_loop()
+            self._loop_thread_id = threading.get_ident()
+            self._active[task] = key
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                self._thread.start()
+
+    def unregister(self, task: asyncio.Task) -> None:
+        with self._lock:
+            self._active.pop(task, None)
+
+    def collapsed(self, key: str | None = None) -> str:
+        """Возвращает агрегированные стеки в формате collapsed stacks
+
+        Args:
+            key (str | None, optional): Ключ агрегации (шаблон пути или "header"). Defaults to None - все.
+        """
+        with self._lock:
+            if key is not None:
+                counters = [self._stacks.get(key, Counter())]
+            else:
+                counters = list(self._stacks.values())
+
+            merged: Counter[str] = Counter()
+            for counter in counters:
+                merged.update(counter)
+
+        return "\n".join(f"{stack} {count}" for stack, count in merged.most_common())
+
+    def stats(self) -> dict[str, int]:
+        """Количество снятых сэмплов по ключам агрегации"""
+        with self._lock:
+            return dict(self._samples)
+
+    def _run(self) -> None:
+        # поток живёт, пока есть профилируемые запросы
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+            self._sample()
+
+    def _sample(self) -> None:
+        if self._loop is None or self._loop_thread_id is None:
+            return
+
+        task = asyncio.current_task(self._loop)
+        key = self._active.get(task) if task is not None else None
+        if key is None:
+            return
+
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+            frame = frame.f_back
+
+        collapsed = ";".join(reversed(stack))
+        with self._lock:
+            self._stacks[key][collapsed] += 1
+            self._samples[key] += 1
+
+
+profiler = SamplingProfiler()
+
+
+class ProfilerMiddleware:
+    """ASGI middleware, регистрирующая выбранные запросы в профилировщике.
+
+    Когда профилировщик выключен, стоимость middleware - одна проверка атрибута.
+    """
+
+    def __init__(self, app: ASGIApp, profiler: SamplingProfiler = profiler) -> None:
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.profiler.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        key = self.profiler.select(scope)
+        task = asyncio.current_task()
+        if key is None or task is None:
+            await self.app(scope, receive, send)
+            return
+
+        self.profiler.register(task, key)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.profiler.unregister(task)
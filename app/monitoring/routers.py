@@ -0,0 +1,165 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Response, status
+from fastapi.responses import PlainTextResponse
+
+from app.auth.services import validate_user_admin_service
+from app.core.admission import admission_controller
+
+from .profiler import profiler
+from .schemas import (
+    AdmissionStats,
+    ProfilerConfig,
+    ProfilerStatus,
+    SlowQueryRead,
+    SlowQueryStatsRead,
+    SpanRead,
+    TraceSummary,
+)
+from .slow_queries import slow_query_log
+from .tracing import tracer
+
+router = APIRouter(prefix="/monitoring", tags=["Мониторинг"])
+
+admin_deps = [Depends(validate_user_admin_service)]
+
+
+def _profiler_status() -> ProfilerStatus:
+    return ProfilerStatus(
+        enabled=profiler.enabled,
+        route=profiler.route,
+        sample_rate=profiler.sample_rate,
+        header=profiler.header,
+        interval_ms=profiler.interval * 1000,
+        samples=profiler.stats(),
+    )
+
+
+@router.get(
+    "/profiler",
+    response_model=ProfilerStatus,
+    dependencies=admin_deps,
+    summary="Состояние профилировщика (только для админов)",
+)
+async def get_profiler_status():
+    return _profiler_status()
+
+
+@router.put(
+    "/profiler",
+    response_model=ProfilerStatus,
+    dependencies=admin_deps,
+    summary="Настроить профилировщик (только для админов)",
+)
+async def configure_profiler(data: ProfilerConfig):
+    profiler.configure(
+        enabled=data.enabled,
+        route=data.route,
+        sample_rate=data.sample_rate,
+        header=data.header,
+        interval=data.interval_ms / 1000 if data.interval_ms else None,
+    )
+
+    return _profiler_status()
+
+
+@router.get(
+    "/profiler/stacks",
+    response_class=PlainTextResponse,
+    dependencies=admin_deps,
+    summary="Стеки в формате collapsed stacks для flamegraph (только для админов)",
+)
+async def get_profiler_stacks(
+    key: Annotated[str | None, Query(description="Шаблон пути или header")] = None,
+):
+    return PlainTextResponse(profiler.collapsed(key=key))
+
+
+@router.delete(
+    "/profiler/stacks",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=admin_deps,
+    summary="Сбросить накопленные стеки (только для админов)",
+)
+async def reset_profiler_stacks():
+    profiler.reset()
+
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.get(
+    "/slow-queries",
+    response_model=list[SlowQueryStatsRead],
+    dependencies=admin_deps,
+    summary="Top-N медленных запросов по суммарному времени (только для админов)",
+)
+async def get_slow_queries_top(
+    limit: Annotated[int, Query(gt=0, le=100)] = 10,
+):
+    return slow_query_log.top(limit=limit)
+
+
+@router.get(
+    "/slow-queries/recent",
+    response_model=list[SlowQueryRead],
+    dependencies=admin_deps,
+    summary="Последние медленные запросы (только для админов)",
+)
+async def get_slow_queries_recent(
+    limit: Annotated[int, Query(gt=0, le=500)] = 100,
+):
+    return slow_query_log.recent(limit=limit)
+
+
+@router.delete(
+    "/slow-queries",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=admin_deps,
+    summary="Очистить журнал медленных запросов (только для админов)",
+)
+async def reset_slow_queries():
+    slow_query_log.reset()
+
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.get(
+    "/traces",
+    response_model=list[TraceSummary],
+    dependencies=admin_deps,
+    summary="Последние трассы запросов (только для админов)",
+)
+async def get_traces(
+    limit: Annotated[int, Query(gt=0, le=500)] = 20,
+    min_duration_ms: Annotated[float, Query(ge=0)] = 0,
+):
+    return tracer.buffer.traces(limit=limit, min_duration_ms=min_duration_ms)
+
+
+@router.get(
+    "/traces/{trace_id}",
+    response_model=list[SpanRead],
+    dependencies=admin_deps,
+    summary="Спаны трассы (только для админов)",
+)
+async def get_trace(
+    trace_id: Annotated[str, Path(pattern="^[0-9a-f]{32}$")],
+):
+    spans = tracer.buffer.trace(trace_id)
+    if not spans:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Трасса не найдена",
+        )
+
+    return spans
+
+
+@router.get(
+    "/admission",
+    response_model=dict[str, AdmissionStats],
+    dependencies=admin_deps,
+    summary="Лимиты конкурентности по классам маршрутов (только для админов)",
+)
+async def get_admission_stats():
+    return admission_controller.stats()
@@ -0,0 +1,77 @@
+from datetime import datetime
+from typing import Annotated, Any
+
+from pydantic import BaseModel, Field
+
+
+class ProfilerConfig(BaseModel):
+    enabled: bool
+    route: Annotated[
+        str | None,
+        Field(max_length=200, description="Шаблон пути, например /orders/{order_id}"),
+    ] = None
+    sample_rate: Annotated[float, Field(ge=0, le=1, description="Доля профилируемых запросов к route")] = 0.0
+    header: Annotated[
+        str | None,
+        Field(min_length=1, max_length=100, description="Заголовок, включающий профилирование запроса"),
+    ] = None
+    interval_ms: Annotated[float | None, Field(ge=1, le=1000, description="Интервал сэмплирования")] = None
+
+
+class ProfilerStatus(BaseModel):
+    enabled: bool
+    route: str | None
+    sample_rate: float
+    header: str
+    interval_ms: float
+    samples: dict[str, int]
+
+
+class SlowQueryRead(BaseModel):
+    statement: str
+    parameters: str
+    rows: int
+    elapsed_ms: float
+    route: str | None
+    request_id: str | None
+    executed_at: datetime
+
+
+class SlowQueryStatsRead(BaseModel):
+    statement: str
+    count: int
+    total_ms: float
+    avg_ms: float
+    max_ms: float
+    rows: int
+    last_route: str | None
+    last_request_id: str | None
+
+
+class TraceSummary(BaseModel):
+    trace_id: str
+    name: str
+    start_time: float
+    duration_ms: float | None
+    status: str
+    span_count: int
+
+
+class SpanRead(BaseModel):
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    name: str
+    kind: str
+    start_time: float
+    duration_ms: float | None
+    status: str
+    attributes: dict[str, Any]
+
+
+class AdmissionStats(BaseModel):
+    limit: float
+    in_flight: int
+    queued: int
+    rejected: int
+    target_latency_ms: float
@@ -0,0 +1,182 @@
+"""
+Журнал медленных SQL-запросов.
+
+Записывает только запросы дольше порога: нормализованный SQL, форму параметров
+(типы и длины, без значений), число строк, время выполнения, маршрут и ID запроса.
+Данные хранятся в памяти процесса: кольцевой буфер последних медленных запросов
+и агрегаты по нормализованному SQL для отчёта top-N.
+"""
+
+import logging
+import re
+import threading
+from collections import deque
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Any
+
+from app.core.config import settings
+from app.core.context import get_request_id, get_route_path
+
+logger = logging.getLogger(__name__)
+
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"(?:\$\d+|%\([^)]+\)s|(?<!:):\w+)(?:::[A-Z]+(?:\[\])?)?")
+_IN_LIST_RE = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    """Приводит SQL к виду без литералов и плейсхолдеров, чтобы одинаковые запросы агрегировались вместе"""
+    statement = _STRING_LITERAL_RE.sub("?", statement)
+    statement = _PLACEHOLDER_RE.sub("?", statement)
+    statement = _NUMBER_RE.sub("?", statement)
+    statement = _IN_LIST_RE.sub("IN (...)", statement)
+
+    return _WHITESPACE_RE.sub(" ", statement).strip()
+
+
+def _value_shape(value: Any) -> str:
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return f"{type(value).__name__}[{len(value)}]"
+
+    return type(value).__name__
+
+
+def parameter_shape(parameters: Any, executemany: bool = False) -> str:
+    """Описывает параметры запроса без их значений: `(int, str)`, `{id: int}`, `3x(int, int)`"""
+    if executemany and isinstance(parameters, (list, tuple)):
+        if not parameters:
+            return "0x()"
+        return f"{len(parameters)}x{parameter_shape(parameters[0])}"
+
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {_value_shape(value)}" for key, value in parameters.items()) + "}"
+
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(_value_shape(value) for value in parameters) + ")"
+
+    return "()" if parameters is None else _value_shape(parameters)
+
+
+@dataclass(slots=True)
+class SlowQuery:
+    statement: str
+    parameters: str
+    rows: int
+    elapsed_ms: float
+    route: str | None
+    request_id: str | None
+    executed_at: datetime
+
+
+@dataclass(slots=True)
+class SlowQueryStats:
+    statement: str
+    count: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    rows: int = 0
+    last_route: str | None = None
+    last_request_id: str | None = None
+
+
+class SlowQueryLog:
+    """Журнал медленных запросов
+
+    Attributes:
+        threshold_ms (float): Порог в миллисекундах, начиная с которого запрос считается медленным
+        size (int): Размер кольцевого буфера последних медленных запросов
+        max_statements (int): Максимальное количество различных нормализованных запросов в агрегатах
+    """
+
+    def __init__(
+        self,
+        threshold_ms: float = settings.SLOW_QUERY_THRESHOLD_MS,
+        size: int = settings.SLOW_QUERY_LOG_SIZE,
+        max_statements: int = 1000,
+    ) -> None:
+        self.threshold_ms = threshold_ms
+        self.max_statements = max_statements
+        self._recent: deque[SlowQuery] = deque(maxlen=size)
+        self._stats: dict[str, SlowQueryStats] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        statement: str,
+        parameters: Any,
+        elapsed_ms: float,
+        rows: int,
+        executemany: bool = False,
+    ) -> None:
+        """Записывает запрос, если он дольше порога"""
+        if elapsed_ms < self.threshold_ms:
+            return
+
+        entry = SlowQuery(
+            statement=normalize_sql(statement),
+            parameters=parameter_shape(parameters, executemany=executemany),
+            rows=rows,
+            elapsed_ms=round(elapsed_ms, 3),
+            route=get_route_path(),
+            request_id=get_request_id(),
+            executed_at=datetime.now(timezone.utc),
+        )
+
+        with self._lock:
+            self._recent.append(entry)
+
+            stats = self._stats.get(entry.statement)
+            if stats is None:
+                if len(self._stats) >= self.max_statements:
+                    # вытесняем запрос с наименьшим суммарным временем
+                    del self._stats[min(self._stats.values(), key=lambda s: s.total_ms).statement]
+                stats = self._stats[entry.statement] = SlowQueryStats(statement=entry.statement)
+
+            stats.count += 1
+            stats.total_ms += entry.elapsed_ms
+            stats.max_ms = max(stats.max_ms, entry.elapsed_ms)
+            stats.rows += max(rows, 0)
+            stats.last_route = entry.route
+            stats.last_request_id = entry.request_id
+
+        logger.warning(
+            "Slow query %.1f ms route=%s request_id=%s rows=%s params=%s: %s",
+            entry.elapsed_ms,
+            entry.route,
+            entry.request_id,
+            entry.rows,
+            entry.parameters,
+            entry.statement,
+        )
+
+    def recent(self, limit: int = 100) -> list[dict[str, Any]]:
+        """Последние медленные запросы, от новых к старым"""
+        with self._lock:
+            entries = list(self._recent)[-limit:]
+
+        return [asdict(entry) for entry in reversed(entries)]
+
+    def top(self, limit: int = 10) -> list[dict[str, Any]]:
+        """Нормализованные запросы с наибольшим суммарным временем"""
+        with self._lock:
+            stats = sorted(self._stats.values(), key=lambda s: s.total_ms, reverse=True)[:limit]
+
+            return [
+                {
+                    **asdict(item),
+                    "total_ms": round(item.total_ms, 3),
+                    "avg_ms": round(item.total_ms / item.count, 3),
+                }
+                for item in stats
+            ]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._recent.clear()
+            self._stats.clear()
+
+
+slow_query_log = SlowQueryLog()
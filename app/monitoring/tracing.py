@@ -0,0 +1,377 @@
+"""
+Лёгкая трассировка запросов.
+
+Спаны создаются вокруг HTTP-запросов (middleware), зависимостей и сервисов
+(декоратор `traced`) и SQL-запросов (события движка в `app.core.database`).
+Контекст передаётся между сервисами через заголовок W3C `traceparent`.
+
+Завершённые спаны отдаются экспортёрам: кольцевому буферу в памяти (по умолчанию),
+файлу в формате JSON Lines и, если задан `TRACING_OTLP_ENDPOINT`, коллектору OTLP/HTTP.
+"""
+
+import functools
+import inspect
+import json
+import logging
+import queue
+import re
+import secrets
+import threading
+import time
+import urllib.request
+from collections import deque
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_HEADER = "traceparent"
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+@dataclass(slots=True)
+class Span:
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    name: str
+    kind: str = "internal"
+    start_time: float = field(default_factory=time.time)
+    duration_ms: float | None = None
+    status: str = "ok"
+    attributes: dict[str, Any] = field(default_factory=dict)
+    _started: float = field(default_factory=time.perf_counter, repr=False)
+
+    def finish(self) -> None:
+        self.duration_ms = round((time.perf_counter() - self._started) * 1000, 3)
+
+    def to_dict(self) -> dict[str, Any]:
+        data = asdict(self)
+        data.pop("_started")
+        return data
+
+
+def parse_traceparent(value: str | None) -> tuple[str, str, bool] | None:
+    """Разбирает заголовок traceparent в (trace_id, parent_span_id, sampled)"""
+    if not value:
+        return None
+
+    match = _TRACEPARENT_RE.match(value.strip().lower())
+    if match is None:
+        return None
+
+    trace_id, span_id, flags = match.groups()
+    if trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+
+    return trace_id, span_id, bool(int(flags, 16) & 1)
+
+
+def format_traceparent(span: Span) -> str:
+    return f"00-{span.trace_id}-{span.span_id}-01"
+
+
+class RingBufferExporter:
+    """Хранит последние завершённые спаны в памяти процесса"""
+
+    def __init__(self, size: int = settings.TRACING_BUFFER_SIZE) -> None:
+        self._spans: deque[Span] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self._spans.append(span)
+
+    def traces(self, limit: int = 20, min_duration_ms: float = 0) -> list[dict[str, Any]]:
+        """Сводка по последним трассам, у которых в буфере есть корневой спан"""
+        with self._lock:
+            spans = list(self._spans)
+
+        counts: dict[str, int] = {}
+        for span in spans:
+            counts[span.trace_id] = counts.get(span.trace_id, 0) + 1
+
+        summaries = []
+        for span in reversed(spans):
+            if span.kind != "server" or (span.duration_ms or 0) < min_duration_ms:
+                continue
+            summaries.append(
+                {
+                    "trace_id": span.trace_id,
+                    "name": span.name,
+                    "start_time": span.start_time,
+                    "duration_ms": span.duration_ms,
+                    "status": span.status,
+                    "span_count": counts[span.trace_id],
+                }
+            )
+            if len(summaries) >= limit:
+                break
+
+        return summaries
+
+    def trace(self, trace_id: str) -> list[dict[str, Any]]:
+        """Все спаны трассы в порядке начала"""
+        with self._lock:
+            spans = [span for span in self._spans if span.trace_id == trace_id]
+
+        return [span.to_dict() for span in sorted(spans, key=lambda s: s.start_time)]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+
+class FileExporter:
+    """Дописывает спаны в файл в формате JSON Lines"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock, self.path.open("a", encoding="utf-8") as file:
+            file.write(line + "\n")
+
+
+class OTLPExporter:
+    """Отправляет спаны пачками в коллектор по OTLP/HTTP (JSON) из фонового потока"""
+
+    def __init__(self, endpoint: str, batch_size: int = 256, flush_interval: float = 2.0) -> None:
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue[Span] = queue.Queue(maxsize=batch_size * 16)
+        self._thread = threading.Thread(target=self._run, name="otlp-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            pass  # коллектор не успевает - теряем спаны, но не тормозим запросы
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            try:
+                self._send(batch)
+            except Exception:
+                logger.warning("Не удалось отправить %s спанов в %s", len(batch), self.url, exc_info=True)
+
+    def _send(self, batch: list[Span]) -> None:
+        def attribute(key: str, value: Any) -> dict[str, Any]:
+            if isinstance(value, bool):
+                return {"key": key, "value": {"boolValue": value}}
+            if isinstance(value, int):
+                return {"key": key, "value": {"intValue": str(value)}}
+            if isinstance(value, float):
+                return {"key": key, "value": {"doubleValue": value}}
+            return {"key": key, "value": {"stringValue": str(value)}}
+
+        kinds = {"internal": 1, "server": 2, "client": 3}
+        spans = []
+        for span in batch:
+            start_ns = int(span.start_time * 1e9)
+            spans.append(
+                {
+                    "traceId": span.trace_id,
+                    "spanId": span.span_id,
+                    "parentSpanId": span.parent_id or "",
+                    "name": span.name,
+                    "kind": kinds.get(span.kind, 1),
+                    "startTimeUnixNano": str(start_ns),
+                    "endTimeUnixNano": str(start_ns + int((span.duration_ms or 0) * 1e6)),
+                    "attributes": [attribute(key, value) for key, value in span.attributes.items()],
+                    "status": {"code": 2 if span.status == "error" else 1},
+                }
+            )
+
+        body = {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [attribute("service.name", settings.TRACING_SERVICE_NAME)]},
+                    "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+                }
+            ]
+        }
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(body).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=5):
+            pass
+
+
+current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """Создаёт спаны и передаёт завершённые спаны экспортёрам
+
+    Attributes:
+        enabled (bool): Включена ли трассировка
+        buffer (RingBufferExporter): Буфер последних спанов, из которого читают эндпоинты мониторинга
+        exporters (list): Все экспортёры, включая buffer
+    """
+
+    def __init__(self, enabled: bool = settings.TRACING_ENABLED) -> None:
+        self.enabled = enabled
+        self.buffer = RingBufferExporter()
+        self.exporters: list[Any] = [self.buffer]
+        if settings.TRACING_FILE_PATH:
+            self.exporters.append(FileExporter(Path(settings.TRACING_FILE_PATH)))
+        if settings.TRACING_OTLP_ENDPOINT:
+            self.exporters.append(OTLPExporter(settings.TRACING_OTLP_ENDPOINT))
+
+    def start_span(
+        self,
+        name: str,
+        kind: str = "internal",
+        parent: Span | None = None,
+        trace_id: str | None = None,
+        parent_id: str | None = None,
+        **attributes: Any,
+    ) -> Span:
+        """Создаёт спан, не делая его текущим. Родитель по умолчанию - текущий спан"""
+        parent = parent or current_span.get()
+        if parent is not None:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+
+        return Span(
+            trace_id=trace_id or secrets.token_hex(16),
+            span_id=secrets.token_hex(8),
+            parent_id=parent_id,
+            name=name,
+            kind=kind,
+            attributes=attributes,
+        )
+
+    def end_span(self, span: Span) -> None:
+        span.finish()
+        for exporter in self.exporters:
+            exporter.export(span)
+
+    @contextmanager
+    def span(self, name: str, kind: str = "internal", **attributes: Any) -> Iterator[Span | None]:
+        """Контекстный менеджер: спан становится текущим на время блока"""
+        if not self.enabled:
+            yield None
+            return
+
+        span = self.start_span(name, kind=kind, **attributes)
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.attributes["error"] = type(e).__name__
+            raise
+        finally:
+            current_span.reset(token)
+            self.end_span(span)
+
+
+tracer = Tracer()
+
+
+def traced(name: str | None = None) -> Callable[[Callable], Callable]:
+    """Декоратор: оборачивает вызов функции (sync или async) в спан.
+
+    Сигнатура сохраняется через functools.wraps, поэтому декоратор можно
+    вешать на зависимости FastAPI.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(span_name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class TracingMiddleware:
+    """ASGI middleware: корневой спан запроса, приём и возврат заголовка traceparent"""
+
+    def __init__(self, app: ASGIApp, tracer: Tracer = tracer) -> None:
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        incoming = None
+        for key, value in scope["headers"]:
+            if key == b"traceparent":
+                incoming = parse_traceparent(value.decode("latin-1"))
+                break
+
+        if incoming is not None and not incoming[2]:
+            # вызывающая сторона не сэмплирует эту трассу
+            await self.app(scope, receive, send)
+            return
+
+        span = self.tracer.start_span(
+            f"{scope['method']} {scope['path']}",
+            kind="server",
+            trace_id=incoming[0] if incoming else None,
+            parent_id=incoming[1] if incoming else None,
+            **{"http.method": scope["method"], "http.target": scope["path"]},
+        )
+
+        async def send_with_traceparent(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                span.attributes["http.status_code"] = message["status"]
+                if message["status"] >= 500:
+                    span.status = "error"
+                MutableHeaders(scope=message).append(TRACEPARENT_HEADER, format_traceparent(span))
+            await send(message)
+
+        token = current_span.set(span)
+        try:
+            await self.app(scope, receive, send_with_traceparent)
+        except BaseException as e:
+            span.status = "error"
+            span.attributes["error"] = type(e).__name__
+            raise
+        finally:
+            current_span.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                span.name = f"{scope['method']} {route.path}"
+                span.attributes["http.route"] = route.path
+            self.tracer.end_span(span)
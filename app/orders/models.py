@@ -40,7 +40,7 @@ class Order(Base):
     payment_method: Mapped[PaymentMethods] = mapped_column(Enum(PaymentMethods), nullable=False)
     payment_id: Mapped[str | None] = mapped_column(String(50), unique=True, index=True)
     # timestamps
-    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), index=True)
     updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
     paid_at: Mapped[datetime | None] = mapped_column(DateTime)
     shipped_at: Mapped[datetime | None] = mapped_column(DateTime)
@@ -1,110 +1,87 @@
+from collections.abc import AsyncIterator
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, Path, status
+from fastapi import APIRouter, Depends, Path, Query, Response, status
+from fastapi.responses import StreamingResponse
 
 from app.auth.services import validate_user_admin_service
+from app.core.counting import CountMode, set_total_count
+from app.core.deadline import RequestDeadline
+from app.core.fields import FieldsParam, fields_response
 
-from .schemas import OrderCreate, OrderRead, OrderStatus
-from .services import OrderService, get_order_service
+from .schemas import OrderCreate, OrderRead, OrderStatus, OrderStatusRead, OrderStatusUpdate
+from .services import OrderService, get_order_events_stream_service, get_order_service
 
 router = APIRouter(prefix="/orders", tags=["Заказ"])
 
 admin_deps = [Depends(validate_user_admin_service)]
+by_status_deadline = RequestDeadline("orders_by_status", timeout=5)
+order_fields = FieldsParam(OrderRead)
 
 
 @router.get(
     "/",
     status_code=status.HTTP_200_OK,
     response_model=list[OrderRead],
-    summary="Получить все заказы пользователя",
+    summary="Получить заказы (админам с фильтром по статусу - заказы всех пользователей)",
 )
 async def get_orders(
+    response: Response,
+    order_status: Annotated[OrderStatus | None, Query(alias="status")] = None,
     offset: int = 0,
     limit: int = 100,
+    count: Annotated[CountMode | None, Query(description="Вернуть общее количество в X-Total-Count")] = None,
+    fields: frozenset[str] | None = Depends(order_fields),
     order_service: OrderService = Depends(get_order_service),
 ):
-    return await order_service.get_orders_auth_user(offset=offset, limit=limit)
+    all_users = order_status is not None and order_service.user.is_admin
+    if all_users:
+        # выборка по статусу сканирует заказы всех пользователей - ограничиваем её время жёстче
+        await by_status_deadline()
+        orders = await order_service.get_orders_by_status(
+            order_status=order_status, offset=offset, limit=limit, fields=fields
+        )
+    else:
+        orders = await order_service.get_orders_auth_user(
+            order_status=order_status, offset=offset, limit=limit, fields=fields
+        )
+
+    if count is not None:
+        total = await order_service.count_orders(count, order_status=order_status, all_users=all_users)
+        set_total_count(response, total)
+
+    if fields is not None:
+        # только запрошенные поля: остальные колонки и связи не загружались
+        return fields_response(orders, OrderRead, fields, response)
+    return orders
 
 
 @router.get(
-    "/{order_id}",
-    status_code=status.HTTP_200_OK,
-    response_model=OrderRead,
-    summary="Получить заказ по его ID",
-)
-async def get_order(
-    order_id: Annotated[int, Path(ge=1)],
-    order_service: OrderService = Depends(get_order_service),
-):
-    return await order_service.get_order_auth_user_by_id(order_id=order_id)
-
-
-@router.get(
-    "/pending/",
-    status_code=status.HTTP_200_OK,
-    response_model=list[OrderRead],
-    dependencies=admin_deps,
-    summary="Получить заказы ожидающие подтверждения (только для админов)",
+    "/events",
+    summary="Поток изменений заказов пользователя (Server-Sent Events)",
+    response_class=StreamingResponse,
 )
-async def get_orders_pending(
-    offset: int = 0,
-    limit: int = 100,
-    order_service: OrderService = Depends(get_order_service),
-):
-    return await order_service.get_orders_by_status(
-        order_status=OrderStatus.PENDING, offset=offset, limit=limit
-    )
-
-
-@router.get(
-    "/confirmed/",
-    status_code=status.HTTP_200_OK,
-    response_model=list[OrderRead],
-    dependencies=admin_deps,
-    summary="Получить подтвержденные заказы (только для админов)",
-)
-async def get_orders_confirmed(
-    offset: int = 0,
-    limit: int = 100,
-    order_service: OrderService = Depends(get_order_service),
-):
-    return await order_service.get_orders_by_status(
-        order_status=OrderStatus.CONFIRMED, offset=offset, limit=limit
-    )
-
-
-@router.get(
-    "/processing/",
-    status_code=status.HTTP_200_OK,
-    response_model=list[OrderRead],
-    dependencies=admin_deps,
-    summary="Получить заказы в обработке (только для админов)",
-)
-async def get_orders_processing(
-    offset: int = 0,
-    limit: int = 100,
-    order_service: OrderService = Depends(get_order_service),
+async def get_order_events(
+    events: AsyncIterator[str] = Depends(get_order_events_stream_service),
 ):
-    return await order_service.get_orders_by_status(
-        order_status=OrderStatus.PROCESSING, offset=offset, limit=limit
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
 @router.get(
-    "/shipped/",
+    "/{order_id}",
     status_code=status.HTTP_200_OK,
-    response_model=list[OrderRead],
-    dependencies=admin_deps,
-    summary="Получить заказы в доставке (только для админов)",
+    response_model=OrderRead,
+    summary="Получить заказ по его ID",
 )
-async def get_orders_shipped(
-    offset: int = 0,
-    limit: int = 100,
+async def get_order(
+    order_id: Annotated[int, Path(ge=1)],
     order_service: OrderService = Depends(get_order_service),
 ):
-    return await order_service.get_orders_by_status(
-        order_status=OrderStatus.SHIPPED, offset=offset, limit=limit
-    )
+    return await order_service.get_order_auth_user_by_id(order_id=order_id)
 
 
 @router.post(
@@ -121,73 +98,28 @@ async def create_order(
 
 
 @router.patch(
-    "/{order_id}/confirm/",
-    response_model=OrderRead,
+    "/{order_id}/status",
+    response_model=OrderStatusRead,
     dependencies=admin_deps,
-    summary="Подтвердить заказ (только для админов)",
+    summary="Изменить статус заказа (только для админов)",
 )
-async def confirm_order(
+async def change_order_status(
     order_id: Annotated[int, Path(ge=1)],
+    data: OrderStatusUpdate,
     order_service: OrderService = Depends(get_order_service),
 ):
-    return await order_service.update_order_status(
-        order_id=order_id,
-        new_status=OrderStatus.CONFIRMED,
-        expected_current_status=OrderStatus.PENDING,
-    )
-
-
-@router.patch(
-    "/{order_id}/processing/",
-    response_model=OrderRead,
-    dependencies=admin_deps,
-    summary="Начать сборку товара (только для админов)",
-)
-async def start_processing_order(
-    order_id: Annotated[int, Path(ge=1)],
-    order_service: OrderService = Depends(get_order_service),
-):
-    return await order_service.update_order_status(
-        order_id=order_id,
-        new_status=OrderStatus.PROCESSING,
-        expected_current_status=OrderStatus.CONFIRMED,
-    )
-
-
-@router.patch(
-    "/{order_id}/shipped/",
-    response_model=OrderRead,
-    dependencies=admin_deps,
-    summary="Начать доставку товара (только для админов)",
-)
-async def start_shipped_order(
-    order_id: Annotated[int, Path(ge=1)],
-    order_service: OrderService = Depends(get_order_service),
-):
-    return await order_service.update_order_status(
-        order_id=order_id,
-        new_status=OrderStatus.SHIPPED,
-        expected_current_status=OrderStatus.PROCESSING,
-    )
-
-
-@router.patch(
-    "/{order_id}/delivered/",
-    response_model=OrderRead,
-    dependencies=admin_deps,
-    summary="Заказ доставлен (только для админов)",
-)
-async def delivered_order(
-    order_id: Annotated[int, Path(ge=1)],
-    order_service: OrderService = Depends(get_order_service),
-):
-    return await order_service.delivered_order(order_id=order_id)
+    """
+    Переход выполняется, только если он разрешён из текущего статуса:
+    pending -> confirmed -> processing -> shipped -> delivered,
+    отмена - из pending, confirmed и processing.
+    """
+    return await order_service.change_order_status(order_id=order_id, new_status=data.status)
 
 
 @router.patch(
     "/{order_id}/cancel/",
-    response_model=OrderRead,
-    summary="Отменить заказ",
+    response_model=OrderStatusRead,
+    summary="Отменить свой заказ",
 )
 async def cancel_order(
     order_id: Annotated[int, Path(ge=1)],
@@ -17,6 +17,10 @@ class OrderStatus(str, Enum):
     REFUNDED = "refunded"  # Возвращен
 
 
+# заказы в этих статусах не считаются продажами (отчёты, популярность, рекомендации)
+EXCLUDED_STATUSES = (OrderStatus.CANCELLED, OrderStatus.REFUNDED)
+
+
 class PaymentStatus(str, Enum):
     PENDING = "pending"  # Ожидает оплаты
     PROCESSING = "processing"  # Платеж в обработке
@@ -110,3 +114,21 @@ class OrderRead(OrderBase):
 
 class OrderCreate(OrderBase):
     delivery_address: DeliveryAddressAdd
+
+
+class OrderStatusUpdate(BaseModel):
+    status: Annotated[OrderStatus, Field(..., description="Новый статус заказа")]
+
+
+class OrderStatusRead(BaseModel):
+    id: int
+    order_status: OrderStatus
+    payment_status: PaymentStatus
+
+    updated_at: datetime
+    paid_at: datetime | None = None
+    shipped_at: datetime | None = None
+    delivered_at: datetime | None = None
+    cancelled_at: datetime | None = None
+
+    model_config = {"from_attributes": True}
@@ -1,7 +1,8 @@
-from typing import Sequence
+from collections.abc import AsyncIterator
+from typing import NoReturn, Sequence
 
-from fastapi import Depends, HTTPException, status
-from sqlalchemy import select, update
+from fastapi import Depends, Header, HTTPException, status
+from sqlalchemy import Row, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
@@ -9,8 +10,14 @@ from app.auth.services import get_current_auth_user
 from app.cart.models import CartItem
 from app.cart.services import delete_cart_service
 from app.cart.validations import validate_non_empty_cart
-from app.core.database import get_async_session
+from app.core.counting import CountMode, TotalCount, row_counter
+from app.core.database import get_async_read_session, get_async_session, replica_router
+from app.core.fields import load_only_fields
+from app.events.broker import Subscription
+from app.events.services import add_event
+from app.monitoring.tracing import traced
 from app.products.models import Product
+from app.products.stock import mark_stock_changed
 from app.users.schemas import UserRead
 
 from .models import DeliveryAddress, Order, OrderItem
@@ -22,6 +29,22 @@ from .schemas import (
     PaymentMethods,
     PaymentStatus,
 )
+from .state_machine import ORDER_TRANSITIONS, build_transition_statement
+from .streaming import get_missed_order_events, order_event_broker, stream_order_events
+
+
+def order_load_options(fields: frozenset[str] | None = None) -> list:
+    """Опции загрузки заказов: при `fields` - только эти колонки и запрошенные связи"""
+    items = selectinload(Order.order_items).selectinload(OrderItem.product).selectinload(Product.category)
+    if fields is None:
+        return [items, selectinload(Order.delivery_address)]
+
+    options = [load_only_fields(Order, fields)]
+    if "order_items" in fields:
+        options.append(items)
+    if "delivery_address" in fields:
+        options.append(selectinload(Order.delivery_address))
+    return options
 
 
 class OrderService:
@@ -33,12 +56,20 @@ class OrderService:
     Attributes:
         user (UserRead): Авторизованный пользователь
         session (AsyncSession): Асинхронная сессия БД
+        read_session (AsyncSession): Сессия для чтения (реплика, если доступна)
     """
 
-    def __init__(self, user: UserRead, session: AsyncSession):
+    def __init__(self, user: UserRead, session: AsyncSession, read_session: AsyncSession | None = None):
         self.user = user
         self.session = session
+        self._read_session = read_session or session
 
+    @property
+    def read_session(self) -> AsyncSession:
+        """Сессия для чтения: сразу после изменений пользователя - основная БД (read-your-writes)"""
+        return replica_router.choose(self.user.id, session=self.session, read_session=self._read_session)
+
+    @traced()
     async def create_order(self, data: OrderCreate):
         """Сервис - создать заказ
 
@@ -67,6 +98,19 @@ class OrderService:
                 await self._create_order_item_from_cart(order=order, cart_item=cart_item)
                 # создаем адресс доставки
                 await self._create_delivery_address(order_id=order.id, data=data.delivery_address)
+                # событие пишется в той же транзакции, что и заказ
+                add_event(
+                    self.session,
+                    "order.created",
+                    aggregate_id=order.id,
+                    payload={
+                        "order_id": order.id,
+                        "user_id": order.user_id,
+                        "total": str(order.total),
+                        "payment_method": order.payment_method,
+                        "order_status": order.order_status,
+                    },
+                )
                 # очищаем корзину(без коммита)
                 await delete_cart_service(
                     user=self.user,
@@ -93,6 +137,7 @@ class OrderService:
             # коммит внешней транзакции
             if outer:
                 await self.session.commit()
+            replica_router.mark_write(self.user.id)
 
             return await self.get_order_auth_user_by_id(
                 order_id=order.id,
@@ -108,16 +153,21 @@ class OrderService:
                 detail=f"Произошла непредвиденная ошибка при создании заказа: {e}",
             )
 
+    @traced()
     async def get_orders_auth_user(
         self,
+        order_status: OrderStatus | None = None,
         offset: int = 0,
         limit: int = 100,
+        fields: frozenset[str] | None = None,
     ) -> Sequence[Order]:
         """Сервис - получить все заказы пользователя
 
         Args:
+            order_status (OrderStatus | None, optional): Фильтр по статусу заказа. Defaults to None.
             offset (int, optional): Количество пропускаемых записей. Defaults to 0.
             limit (int, optional): Максимальное количество возвращаемых записей. Defaults to 100.
+            fields (frozenset[str] | None, optional): Поля ответа (None - все). Defaults to None.
 
         Raises:
             HTTPException: 404 - У пользователя нет заказов
@@ -127,19 +177,16 @@ class OrderService:
         """
         query = (
             select(Order)
-            .options(
-                selectinload(Order.order_items)
-                .selectinload(OrderItem.product)
-                .selectinload(Product.category),
-                selectinload(Order.delivery_address),
-            )
+            .options(*order_load_options(fields))
             .where(Order.user_id == self.user.id)
             .order_by(Order.created_at.desc())
             .offset(offset)
             .limit(limit)
         )
+        if order_status is not None:
+            query = query.where(Order.order_status == order_status)
 
-        result = await self.session.execute(query)
+        result = await self.read_session.execute(query)
         orders = result.scalars().all()
 
         if not orders:
@@ -150,6 +197,32 @@ class OrderService:
 
         return orders
 
+    @traced()
+    async def count_orders(
+        self,
+        mode: CountMode,
+        order_status: OrderStatus | None = None,
+        all_users: bool = False,
+    ) -> TotalCount:
+        """Сервис - общее количество заказов для списка (см. app/core/counting.py)
+
+        Args:
+            mode (CountMode): Способ подсчёта
+            order_status (OrderStatus | None, optional): Фильтр по статусу заказа. Defaults to None.
+            all_users (bool, optional): Заказы всех пользователей (admin). Defaults to False.
+
+        Returns:
+            TotalCount: Количество и признак точности
+        """
+        query = select(Order)
+        if not all_users:
+            query = query.where(Order.user_id == self.user.id)
+        if order_status is not None:
+            query = query.where(Order.order_status == order_status)
+
+        return await row_counter.count(self.read_session, query, mode)
+
+    @traced()
     async def get_order_auth_user_by_id(
         self,
         order_id: int,
@@ -169,15 +242,10 @@ class OrderService:
         """
         query = (
             select(Order)
-            .options(
-                selectinload(Order.order_items)
-                .selectinload(OrderItem.product)
-                .selectinload(Product.category),
-                selectinload(Order.delivery_address),
-            )
+            .options(*order_load_options())
             .where(Order.id == order_id, Order.user_id == self.user.id)
         )
-        result = await self.session.execute(query)
+        result = await self.read_session.execute(query)
         order = result.scalars().first()
 
         if not order:
@@ -188,17 +256,21 @@ class OrderService:
 
         return order
 
+    @traced()
     async def get_orders_by_status(
         self,
         order_status: OrderStatus,
         offset: int = 0,
         limit: int = 100,
+        fields: frozenset[str] | None = None,
     ) -> Sequence[Order]:
-        """Сервис - получить заказ по статусу (admin)
+        """Сервис - получить заказы всех пользователей по статусу (admin)
 
         Args:
+            order_status (OrderStatus): Статус заказа
             offset (int, optional): Количество пропускаемых записей. Defaults to 0.
             limit (int, optional): Максимальное количество возвращаемых записей. Defaults to 100.
+            fields (frozenset[str] | None, optional): Поля ответа (None - все). Defaults to None.
 
         Raises:
             HTTPException: 404 - Нет заказов
@@ -208,19 +280,14 @@ class OrderService:
         """
         query = (
             select(Order)
-            .options(
-                selectinload(Order.order_items)
-                .selectinload(OrderItem.product)
-                .selectinload(Product.category),
-                selectinload(Order.delivery_address),
-            )
+            .options(*order_load_options(fields))
             .where(Order.order_status == order_status)
             .order_by(Order.created_at.asc())
             .offset(offset)
             .limit(limit)
         )
 
-        result = await self.session.execute(query)
+        result = await self.read_session.execute(query)
         orders = result.scalars().all()
 
         if not orders:
@@ -231,98 +298,125 @@ class OrderService:
 
         return orders
 
-    async def update_order_status(
+    @traced()
+    async def change_order_status(
         self,
         order_id: int,
         new_status: OrderStatus,
-        expected_current_status: OrderStatus,
+        own_only: bool = False,
         error_detail: str = "Заказ не найден",
-    ) -> Order:
-        """Сервис - обновить статус заказа с проверкой текущего статуса
+    ) -> Row:
+        """Сервис - перевести заказ в новый статус по `ORDER_TRANSITIONS`
+
+        Проверка текущего статуса, метки времени и смена статуса оплаты выполняются
+        одним условным UPDATE; заказ со связями не загружается.
 
         Args:
             order_id (int): ID заказа
             new_status (OrderStatus): Новый статус заказа
-            expected_current_status (OrderStatus): Ожидаемый текущий статус для валидации
+            own_only (bool, optional): Разрешить переход только для заказа текущего пользователя.
+                Defaults to False.
             error_detail (str, optional): Описание ошибки. Defaults to "Заказ не найден".
 
         Raises:
             HTTPException: 404 заказ не найден
-            HTTPException: 400 неверный текущий статус
+            HTTPException: 400 переход из текущего статуса невозможен
 
         Returns:
-            Order: Обновленный заказ
+            Row: Строка заказа после перехода (статусы до и после, метки времени)
         """
-        order = await self._get_order_by_order_id(order_id)
-
-        if not order:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=error_detail)
-
-        if order.order_status != expected_current_status:
+        transition = ORDER_TRANSITIONS.get(new_status)
+        if transition is None:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=(
-                    f"Невозможно изменить статус на {new_status}. "
-                    f"Текущий статус {order.order_status}, ожидался {expected_current_status}"
-                ),
+                detail=f"Невозможно перевести заказ в статус {new_status.value}",
             )
 
-        order.order_status = new_status
+        stmt = build_transition_statement(
+            order_id=order_id,
+            new_status=new_status,
+            transition=transition,
+            user_id=self.user.id if own_only else None,
+        )
+        row = (await self.session.execute(stmt)).one_or_none()
+
+        if row is None:
+            # переход не выполнен - выясняем причину только в этом (редком) случае
+            await self._raise_transition_error(order_id, new_status, own_only, error_detail)
+
+        self._add_status_events(row)
 
         await self.session.commit()
-        await self.session.refresh(order)
+        replica_router.mark_write(row.user_id)
 
-        return order
+        return row
 
-    async def delivered_order(
+    @traced()
+    async def cancel_order(
         self,
         order_id: int,
         error_detail: str = "Заказ не найден",
-    ) -> Order:
-        """Сервис - доставить заказ (courier)"""
-        order = await self.update_order_status(
+    ) -> Row:
+        """Сервис - отменить заказ пользователя"""
+        # TODO: Разрезервировать товары
+        return await self.change_order_status(
             order_id=order_id,
-            new_status=OrderStatus.DELIVERED,
-            expected_current_status=OrderStatus.SHIPPED,
+            new_status=OrderStatus.CANCELLED,
+            own_only=True,
             error_detail=error_detail,
         )
 
-        # Обновляем статус оплаты если был pending (наличные)
-        if order.payment_status == PaymentStatus.PENDING:
-            order.payment_status = PaymentStatus.COMPLETED
-
-        await self.session.commit()
-        await self.session.refresh(order)
-
-        return order
-
-    async def cancel_order(
+    async def _raise_transition_error(
         self,
         order_id: int,
-        error_detail: str = "Заказ не найден",
-    ) -> Order:
-        """Сервис - отменить заказ"""
-        order = await self._get_order_by_order_id(order_id)
-
-        if not order:
-            raise HTTPException(status_code=404, detail=error_detail)
-
-        # Разлогика отмены в зависимости от статуса оплаты
-        if order.payment_status == PaymentStatus.COMPLETED:
-            order.payment_status = PaymentStatus.REFUNDED
-        else:
-            order.payment_status = PaymentStatus.FAILED
-
-        order.order_status = OrderStatus.CANCELLED
+        new_status: OrderStatus,
+        own_only: bool,
+        error_detail: str,
+    ) -> NoReturn:
+        """Вспомогательная функция - 404 или 400 для невыполненного перехода"""
+        query = select(Order.order_status).where(Order.id == order_id)
+        if own_only:
+            query = query.where(Order.user_id == self.user.id)
+        current_status = (await self.session.execute(query)).scalar_one_or_none()
+
+        if current_status is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=error_detail)
 
-        # TODO: Разрезервировать товары
-        # await self._release_reserved_products(order)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=(
+                f"Невозможно изменить статус на {new_status.value}. Текущий статус {current_status.value}"
+            ),
+        )
 
-        await self.session.commit()
-        await self.session.refresh(order)
+    def _add_status_events(self, row: Row) -> None:
+        """Вспомогательная функция - записать в outbox события смены статусов заказа и оплаты"""
+        add_event(
+            self.session,
+            "order.status_changed",
+            aggregate_id=row.id,
+            payload={
+                "order_id": row.id,
+                "user_id": row.user_id,
+                "old_status": row.old_status,
+                "new_status": row.order_status,
+                "payment_status": row.payment_status,
+            },
+        )
 
-        return order
+        if row.payment_status != row.old_payment_status:
+            add_event(
+                self.session,
+                "order.payment_status_changed",
+                aggregate_id=row.id,
+                payload={
+                    "order_id": row.id,
+                    "user_id": row.user_id,
+                    "payment_status": row.payment_status,
+                },
+            )
 
+    @traced()
     async def _create_order(
         self,
         data: OrderCreate,
@@ -353,6 +447,7 @@ class OrderService:
 
         return order
 
+    @traced()
     async def _create_order_item_from_cart(
         self,
         order: Order,
@@ -365,6 +460,7 @@ class OrderService:
             cart_item (Sequence[CartItem]): Товары из корзины
         """
         subtotal: float = 0  # сумма всех товаров
+        reserved_ids: list[int] = []
         for item in cart_item:
             # атомарно зарезервировать количество в БД
             stmt = (
@@ -399,6 +495,10 @@ class OrderService:
                 )
             )
             subtotal += item.quantity * item.product.price
+            reserved_ids.append(product_id)
+
+        # подписчики остатков получат новые значения после коммита заказа
+        await mark_stock_changed(self.session, reserved_ids)
 
         order.subtotal = subtotal
         order.total = float(order.total) + subtotal
@@ -406,6 +506,7 @@ class OrderService:
         await self.session.flush()
         await self.session.refresh(order)
 
+    @traced()
     async def _create_order_item(self, data: OrderItemCreate):
         """Вспомогательная функция - создать объект OrderItem на основе CartItem
 
@@ -418,6 +519,7 @@ class OrderService:
         await self.session.flush()
         await self.session.refresh(order_item)
 
+    @traced()
     async def _create_delivery_address(self, order_id: int, data: DeliveryAddressAdd):
         """Вспомогательная функция - создать объект адреса доставки определенного заказа
 
@@ -431,34 +533,62 @@ class OrderService:
         await self.session.flush()
         await self.session.refresh(delivery_address)
 
-    async def _get_order_by_order_id(self, order_id: int) -> Order | None:
-        """Вспомогательная функция для загрузки заказа со связями"""
-        query = (
-            select(Order)
-            .options(
-                selectinload(Order.order_items)
-                .selectinload(OrderItem.product)
-                .selectinload(Product.category),
-                selectinload(Order.delivery_address),
-            )
-            .where(Order.id == order_id)
-        )
-        result = await self.session.execute(query)
-
-        return result.scalars().first()
-
 
 async def get_order_service(
     user: UserRead = Depends(get_current_auth_user),
-    session: AsyncSession = Depends(get_async_session),
+    session: AsyncSession = Depends(get_async_session, scope="function"),
+    read_session: AsyncSession = Depends(get_async_read_session, scope="function"),
 ) -> OrderService:
     """Фабрика для создания экземпляра OrderService с внедренными зависимостями
 
     Args:
         user (UserRead): Аутентифицированный пользователь
         session (AsyncSession): Асинхронная сессия БД
+        read_session (AsyncSession): Сессия для чтения (реплика, если доступна)
 
     Returns:
         OrderService: Экземпляр сервиса заказов
     """
-    return OrderService(user=user, session=session)
+    return OrderService(user=user, session=session, read_session=read_session)
+
+
+async def get_order_events_subscription(
+    user: UserRead = Depends(get_current_auth_user),
+) -> AsyncIterator[Subscription]:
+    """Подписка на события заказов пользователя на время запроса
+
+    Снимается после завершения ответа, даже если поток так и не начал читаться.
+    """
+    subscription = order_event_broker.subscribe(user.id)
+    try:
+        yield subscription
+    finally:
+        order_event_broker.unsubscribe(subscription)
+
+
+async def get_order_events_stream_service(
+    user: UserRead = Depends(get_current_auth_user),
+    subscription: Subscription = Depends(get_order_events_subscription),
+    session: AsyncSession = Depends(get_async_session, scope="function"),
+    last_event_id: int | None = Header(default=None, alias="Last-Event-ID"),
+) -> AsyncIterator[str]:
+    """Сервис - поток событий заказов пользователя (SSE)
+
+    Подписка оформляется до выборки пропущенных событий, чтобы между ними не было окна,
+    в которое событие могло бы потеряться. Сессия нужна только для выборки пропущенных
+    событий и закрывается до начала потока.
+
+    Args:
+        user (UserRead): Аутентифицированный пользователь
+        subscription (Subscription): Подписка на события заказов пользователя
+        session (AsyncSession): Асинхронная сессия БД
+        last_event_id (int | None): ID последнего полученного события (заголовок Last-Event-ID)
+
+    Returns:
+        AsyncIterator[str]: Сообщения в формате text/event-stream
+    """
+    missed = []
+    if last_event_id is not None:
+        missed = await get_missed_order_events(session, user_id=user.id, last_event_id=last_event_id)
+
+    return stream_order_events(subscription, missed, last_event_id=last_event_id)
@@ -0,0 +1,126 @@
+"""
+Переходы статусов заказа.
+
+`ORDER_TRANSITIONS` описывает для каждого целевого статуса, из каких статусов в
+него можно перейти, какую метку времени проставить и как меняется статус оплаты.
+`build_transition_statement` превращает переход в один условный
+`UPDATE ... RETURNING`: проверка текущего статуса и все побочные изменения
+выполняются в БД за один запрос, без загрузки заказа со связями.
+"""
+
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+
+from sqlalchemy import Update, case, func, literal, update
+from sqlalchemy.orm import aliased
+
+from .models import Order
+from .schemas import OrderStatus, PaymentStatus
+
+
+@dataclass(frozen=True, slots=True)
+class Transition:
+    """Переход в статус заказа
+
+    Attributes:
+        sources (frozenset[OrderStatus]): Статусы, из которых разрешён переход
+        timestamp (str | None): Колонка заказа, в которую записывается время перехода
+        payment (Mapping[PaymentStatus, PaymentStatus]): Смена статуса оплаты (было -> стало)
+        payment_default (PaymentStatus | None): Статус оплаты для остальных случаев (None - не менять)
+    """
+
+    sources: frozenset[OrderStatus]
+    timestamp: str | None = None
+    payment: Mapping[PaymentStatus, PaymentStatus] = field(default_factory=dict)
+    payment_default: PaymentStatus | None = None
+
+
+ORDER_TRANSITIONS: dict[OrderStatus, Transition] = {
+    OrderStatus.CONFIRMED: Transition(sources=frozenset({OrderStatus.PENDING})),
+    OrderStatus.PROCESSING: Transition(sources=frozenset({OrderStatus.CONFIRMED})),
+    OrderStatus.SHIPPED: Transition(sources=frozenset({OrderStatus.PROCESSING}), timestamp="shipped_at"),
+    # наличные оплачиваются при получении
+    OrderStatus.DELIVERED: Transition(
+        sources=frozenset({OrderStatus.SHIPPED}),
+        timestamp="delivered_at",
+        payment={PaymentStatus.PENDING: PaymentStatus.COMPLETED},
+    ),
+    # оплаченный заказ возвращается, неоплаченный - помечается неуспешной оплатой
+    OrderStatus.CANCELLED: Transition(
+        sources=frozenset({OrderStatus.PENDING, OrderStatus.CONFIRMED, OrderStatus.PROCESSING}),
+        timestamp="cancelled_at",
+        payment={PaymentStatus.COMPLETED: PaymentStatus.REFUNDED},
+        payment_default=PaymentStatus.FAILED,
+    ),
+}
+
+
+def build_transition_statement(
+    order_id: int,
+    new_status: OrderStatus,
+    transition: Transition,
+    user_id: int | None = None,
+) -> Update:
+    """Условный UPDATE перехода заказа в `new_status`
+
+    Строка обновляется, только если текущий статус входит в `transition.sources`
+    (и заказ принадлежит `user_id`, если он передан). RETURNING отдаёт прежние
+    статусы заказа и оплаты из самосоединения - их видно в снимке строки до изменения.
+
+    Args:
+        order_id (int): ID заказа
+        new_status (OrderStatus): Целевой статус
+        transition (Transition): Описание перехода
+        user_id (int | None, optional): Ограничить заказами пользователя. Defaults to None.
+
+    Returns:
+        Update: Запрос, возвращающий строку заказа после перехода или ничего
+    """
+    old = aliased(Order)
+
+    values = {Order.order_status: new_status, Order.updated_at: func.now()}
+    if transition.timestamp is not None:
+        values[getattr(Order, transition.timestamp)] = func.now()
+    if transition.payment or transition.payment_default is not None:
+        payment_type = Order.payment_status.type
+        values[Order.payment_status] = case(
+            *(
+                (Order.payment_status == before, literal(after, payment_type))
+                for before, after in transition.payment.items()
+            ),
+            else_=(
+                Order.payment_status
+                if transition.payment_default is None
+                else literal(transition.payment_default, payment_type)
+            ),
+        )
+        paid = [before for before, after in transition.payment.items() if after == PaymentStatus.COMPLETED]
+        if paid:
+            values[Order.paid_at] = case((Order.payment_status.in_(paid), func.now()), else_=Order.paid_at)
+
+    stmt = (
+        update(Order)
+        .where(
+            Order.id == order_id,
+            old.id == Order.id,
+            Order.order_status.in_(transition.sources),
+        )
+        .values(values)
+        .returning(
+            Order.id,
+            Order.user_id,
+            old.order_status.label("old_status"),
+            old.payment_status.label("old_payment_status"),
+            Order.order_status,
+            Order.payment_status,
+            Order.updated_at,
+            Order.paid_at,
+            Order.shipped_at,
+            Order.delivered_at,
+            Order.cancelled_at,
+        )
+    )
+    if user_id is not None:
+        stmt = stmt.where(Order.user_id == user_id)
+
+    return stmt
@@ -0,0 +1,150 @@
+"""
+Поток изменений заказов пользователя (Server-Sent Events).
+
+События заказов приходят из outbox: обработчик диспетчера публикует их в broker
+своего процесса и через NOTIFY - в остальные воркеры. Идентификатор SSE-события -
+id записи outbox, поэтому клиент, переподключившись с заголовком Last-Event-ID,
+получает пропущенные события из таблицы.
+
+Порядок id не совпадает с порядком публикации: пачки outbox разбирают несколько
+воркеров параллельно, и событие с меньшим id может прийти позже. Поэтому поток
+отбрасывает повторы по окну недавно отправленных id, а не по последнему id, а
+досылка, кроме событий с большим id, повторяет события, обработанные незадолго до
+последнего полученного. Доставка - «хотя бы один раз»: после переподключения
+клиент может получить уже виденное событие.
+"""
+
+import json
+from collections import deque
+from collections.abc import AsyncIterator, Sequence
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any
+
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.events.broker import EventBroker, Subscription, notify, pg_listener
+from app.events.dispatcher import outbox_dispatcher
+from app.events.models import OutboxEvent
+
+from .models import Order
+
+ORDER_EVENTS_CHANNEL = "order_events"
+ORDER_EVENT_TYPES = ("order.created", "order.status_changed", "order.payment_status_changed")
+
+
+@dataclass(frozen=True, slots=True)
+class OrderEventMessage:
+    id: int
+    event: str
+    data: dict[str, Any]
+
+    def encode(self) -> str:
+        return f"id: {self.id}\nevent: {self.event}\ndata: {json.dumps(self.data, default=str)}\n\n"
+
+
+order_event_broker = EventBroker()
+
+
+def _publish_local(payload: dict[str, Any]) -> None:
+    message = OrderEventMessage(id=payload["id"], event=payload["event"], data=payload["data"])
+    order_event_broker.publish(payload["data"]["user_id"], message)
+
+
+async def _publish_order_event(event: OutboxEvent, session: AsyncSession) -> None:
+    payload = {"id": event.id, "event": event.event_type, "data": event.payload}
+    _publish_local(payload)
+    # остальные воркеры получат событие после коммита пачки диспетчером
+    await notify(session, ORDER_EVENTS_CHANNEL, payload)
+
+
+for _event_type in ORDER_EVENT_TYPES:
+    outbox_dispatcher.register(_event_type)(_publish_order_event)
+
+pg_listener.listen(ORDER_EVENTS_CHANNEL, _publish_local)
+
+
+async def get_missed_order_events(
+    session: AsyncSession,
+    user_id: int,
+    last_event_id: int,
+    limit: int = settings.SSE_REPLAY_LIMIT,
+) -> Sequence[OrderEventMessage]:
+    """События заказов пользователя, которые клиент мог пропустить после `last_event_id`
+
+    Кроме событий с большим id - события, обработанные не раньше чем за
+    `SSE_REPLAY_LOOKBACK_SECONDS` до события `last_event_id`: их могли опубликовать позже него.
+    """
+    last_processed_at = (
+        select(OutboxEvent.processed_at).where(OutboxEvent.id == last_event_id).scalar_subquery()
+    )
+    result = await session.execute(
+        select(OutboxEvent)
+        .join(Order, Order.id == OutboxEvent.aggregate_id)
+        .where(
+            or_(
+                OutboxEvent.id > last_event_id,
+                OutboxEvent.processed_at
+                >= last_processed_at - timedelta(seconds=settings.SSE_REPLAY_LOOKBACK_SECONDS),
+            ),
+            OutboxEvent.id != last_event_id,
+            OutboxEvent.event_type.in_(ORDER_EVENT_TYPES),
+            Order.user_id == user_id,
+        )
+        .order_by(OutboxEvent.id)
+        .limit(limit)
+    )
+
+    return [
+        OrderEventMessage(id=event.id, event=event.event_type, data=event.payload)
+        for event in result.scalars().all()
+    ]
+
+
+async def stream_order_events(
+    subscription: Subscription,
+    missed: Sequence[OrderEventMessage] = (),
+    last_event_id: int | None = None,
+    heartbeat: float = settings.SSE_HEARTBEAT_SECONDS,
+    seen_window: int = settings.SSE_SEEN_WINDOW,
+) -> AsyncIterator[str]:
+    """Генератор SSE: пропущенные события, затем новые и heartbeat-комментарии
+
+    Подпиской владеет вызывающий код - генератор её не закрывает.
+    """
+    # подсказка клиенту, через сколько переподключаться после обрыва
+    yield f"retry: {int(heartbeat * 1000)}\n\n"
+
+    # событие могло попасть и в выборку пропущенных, и в подписку
+    seen: set[int] = set()
+    recent: deque[int] = deque()
+    if last_event_id is not None:
+        seen.add(last_event_id)
+        recent.append(last_event_id)
+
+    def is_new(message: OrderEventMessage) -> bool:
+        if message.id in seen:
+            return False
+        seen.add(message.id)
+        recent.append(message.id)
+        if len(recent) > seen_window:
+            seen.discard(recent.popleft())
+        return True
+
+    for message in missed:
+        if is_new(message):
+            yield message.encode()
+
+    while True:
+        message = await subscription.get(timeout=heartbeat)
+        if message is None:
+            if subscription.closed:
+                # клиент не успевал читать - закрываем поток, он переподключится с Last-Event-ID
+                return
+            yield ": ping\n\n"
+            continue
+
+        if is_new(message):
+            yield message.encode()
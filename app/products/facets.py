@@ -0,0 +1,188 @@
+"""
+Фасеты каталога: количество товаров по категориям и ценовым диапазонам.
+
+`FacetIndex` держит в памяти процесса компактный снимок атрибутов товаров,
+по которым фильтрует витрина (категория, цена, наличие, название), и считает
+фасеты по нему, а не отдельным GROUP BY на каждый показ страницы. Посчитанные
+фасеты кэшируются по набору фильтров.
+
+Снимок перечитывается лениво: код, меняющий товары или остаток, вызывает
+`mark_catalog_changed` в своей транзакции - после коммита индекс этого
+процесса помечается устаревшим, а остальные воркеры узнают об изменении через
+NOTIFY. Перечитывание не чаще раза в `FACETS_RELOAD_INTERVAL` секунд, поэтому
+при частых заказах счётчики могут отставать на этот интервал.
+
+Фасеты дизъюнктивные: счётчики категорий учитывают все фильтры, кроме фильтра
+по категориям, а ценовые диапазоны - все, кроме фильтра по цене. Так в
+боковой панели видно, сколько товаров добавится при выборе ещё одного значения.
+"""
+
+import asyncio
+import time
+from bisect import bisect_right
+from collections import Counter
+from typing import Any, NamedTuple
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from app.categories.models import Category
+from app.core.config import settings
+from app.core.database import async_session_factory
+from app.events.broker import notify, pg_listener
+
+from .models import Product
+from .schemas import ProductFilters
+
+CATALOG_CHANNEL = "catalog_changes"
+_PENDING_KEY = "catalog_changed"
+
+
+class FacetRow(NamedTuple):
+    category_id: int
+    price: float
+    in_stock: bool
+    title: str
+
+
+class FacetIndex:
+    """Снимок атрибутов товаров для подсчёта фасетов
+
+    Attributes:
+        session_factory (async_sessionmaker): Фабрика сессий для чтения снимка
+        reload_interval (float): Минимальный интервал между перечитываниями снимка
+        price_edges (tuple[float, ...]): Левые границы ценовых диапазонов
+        cache_size (int): Сколько наборов фильтров хранить в кэше фасетов
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker = async_session_factory,
+        reload_interval: float = settings.FACETS_RELOAD_INTERVAL,
+        price_edges: tuple[float, ...] = tuple(settings.FACETS_PRICE_EDGES),
+        cache_size: int = settings.FACETS_CACHE_SIZE,
+    ) -> None:
+        self.session_factory = session_factory
+        self.reload_interval = reload_interval
+        self.price_edges = price_edges
+        self.cache_size = cache_size
+        self._rows: list[FacetRow] = []
+        self._category_names: dict[int, str] = {}
+        self._cache: dict[ProductFilters, dict[str, Any]] = {}
+        self._stale = True
+        self._loaded_at = float("-inf")
+        self._lock = asyncio.Lock()
+
+    def mark_stale(self) -> None:
+        self._stale = True
+
+    async def _reload(self) -> None:
+        # изменения, закоммиченные во время чтения, снова пометят индекс устаревшим
+        self._stale = False
+        async with self.session_factory() as session:
+            products = await session.execute(
+                select(
+                    Product.category_id,
+                    Product.price,
+                    Product.stock_quantity - Product.reserved > 0,
+                    Product.title,
+                )
+            )
+            rows = [
+                FacetRow(category_id, price, in_stock, title.lower())
+                for category_id, price, in_stock, title in products
+            ]
+            categories = await session.execute(select(Category.id, Category.name))
+            category_names = dict(categories.all())
+
+        self._rows, self._category_names = rows, category_names
+        self._cache = {}
+        self._loaded_at = time.monotonic()
+
+    async def get(self, filters: ProductFilters) -> dict[str, Any]:
+        """Фасеты для набора фильтров; при необходимости перечитывает снимок"""
+        if self._stale and time.monotonic() - self._loaded_at >= self.reload_interval:
+            async with self._lock:
+                if self._stale:
+                    try:
+                        await self._reload()
+                    except BaseException:
+                        self._stale = True
+                        raise
+
+        facets = self._cache.get(filters)
+        if facets is None:
+            facets = self._count(filters)
+            if len(self._cache) >= self.cache_size:
+                # вытесняем самый старый набор фильтров
+                del self._cache[next(iter(self._cache))]
+            self._cache[filters] = facets
+
+        return facets
+
+    def _count(self, filters: ProductFilters) -> dict[str, Any]:
+        title = filters.title.lower() if filters.title else None
+        categories: Counter[int] = Counter()
+        prices = [0] * len(self.price_edges)
+        total = 0
+
+        for row in self._rows:
+            if filters.in_stock and not row.in_stock:
+                continue
+            if title is not None and title not in row.title:
+                continue
+
+            price_matches = (filters.min_price is None or row.price >= filters.min_price) and (
+                filters.max_price is None or row.price <= filters.max_price
+            )
+            category_matches = not filters.category_ids or row.category_id in filters.category_ids
+
+            if price_matches:
+                categories[row.category_id] += 1
+            bucket = bisect_right(self.price_edges, row.price) - 1
+            # товары дешевле первой границы не попадают ни в один диапазон
+            if category_matches and bucket >= 0:
+                prices[bucket] += 1
+            if price_matches and category_matches:
+                total += 1
+
+        bounds = [*self.price_edges[1:], None]
+        return {
+            "total": total,
+            "categories": [
+                {"id": category_id, "name": self._category_names.get(category_id), "count": count}
+                for category_id, count in categories.most_common()
+            ],
+            "prices": [
+                {"min": low, "max": high, "count": count}
+                for low, high, count in zip(self.price_edges, bounds, prices)
+            ],
+        }
+
+
+facet_index = FacetIndex()
+
+pg_listener.listen(CATALOG_CHANNEL, lambda payload: facet_index.mark_stale(), resync=facet_index.mark_stale)
+
+
+async def mark_catalog_changed(session: AsyncSession) -> None:
+    """Отмечает изменение товаров или категорий в транзакции сессии (без коммита)
+
+    Индекс этого процесса устареет после коммита, остальных воркеров - по NOTIFY.
+    Повторные вызовы в одной транзакции отправляют одно уведомление.
+    """
+    if not session.info.get(_PENDING_KEY):
+        session.info[_PENDING_KEY] = True
+        await notify(session, CATALOG_CHANNEL, {})
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_catalog_changes(session):
+    if session.info.pop(_PENDING_KEY, False):
+        facet_index.mark_stale()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_catalog_changes(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -1,10 +1,14 @@
 from fastapi import HTTPException, status
-from sqlalchemy import select
+from sqlalchemy import Integer, any_, bindparam, select
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import joinedload, selectinload
+
+from app.categories.helpers import descendant_ids_query
+from app.core.fields import load_only_fields
 
 from .models import Product
-from .schemas import PriceSort
+from .schemas import PriceSort, ProductFilters, ProductSort
 
 
 def build_product_base_query(with_category: bool = True, product_id: int | None = None):
@@ -21,33 +25,55 @@ def build_product_base_query(with_category: bool = True, product_id: int | None
 
 
 def build_product_query_with_filters(
-    category_id: int | None = None,
-    title: str | None = None,
+    filters: ProductFilters = ProductFilters(),
     sort_price: PriceSort | None = None,
+    sort: ProductSort | None = None,
     offset: int = 0,
     limit: int = 100,
+    fields: frozenset[str] | None = None,
 ):
     """
     Строит SQL-запрос для получения товаров с учетом фильтров, сортировки и пагинации.
+    При `fields` загружаются только колонки этих полей, категория - только если запрошена.
     """
     # формируем основной запрос
-    query = build_product_base_query(with_category=True)
+    with_category = fields is None or "category" in fields
+    query = build_product_base_query(with_category=with_category)
+    if fields is not None:
+        # category_id нужен selectinload, чтобы подгрузить категорию
+        query = query.options(
+            load_only_fields(Product, fields, *([Product.category_id] if with_category else []))
+        )
 
-    # добавляем к запросу сортировку по цене, если клиент запросил. Иначе сортировка по id
-    if sort_price == PriceSort.asc:
+    # добавляем к запросу сортировку по популярности или цене, если клиент запросил. Иначе сортировка по id
+    if sort == ProductSort.popular:
+        # совпадает с индексом ix_products_popularity
+        query = query.order_by(Product.popularity_score.desc(), Product.id)
+    elif sort_price == PriceSort.asc:
         query = query.order_by(Product.price.asc())
     elif sort_price == PriceSort.desc:
         query = query.order_by(Product.price.desc())
     else:
         query = query.order_by(Product.id)
 
-    # добавляем к запросу фильтрацию по категории, если клиент передал id категории
-    if category_id:
-        query = query.where(Product.category_id == category_id)
+    # добавляем к запросу фильтрацию по категориям, если клиент передал id категорий
+    if filters.category_ids and filters.include_descendants:
+        # вместе с подкатегориями - полусоединение с таблицей замыкания по её первичному ключу
+        query = query.where(Product.category_id.in_(descendant_ids_query(filters.category_ids)))
+    elif filters.category_ids:
+        query = query.where(Product.category_id.in_(sorted(filters.category_ids)))
 
     # добавляем к запросу поиск по названию товара
-    if title:
-        query = query.filter(Product.title.ilike(f"%{title}%"))
+    if filters.title:
+        query = query.filter(Product.title.ilike(f"%{filters.title}%"))
+
+    # добавляем к запросу диапазон цен и фильтр наличия
+    if filters.min_price is not None:
+        query = query.where(Product.price >= filters.min_price)
+    if filters.max_price is not None:
+        query = query.where(Product.price <= filters.max_price)
+    if filters.in_stock:
+        query = query.where(Product.stock_quantity - Product.reserved > 0)
 
     # добавляем к запросу пагинацию
     query = query.offset(offset).limit(limit)
@@ -55,6 +81,17 @@ def build_product_query_with_filters(
     return query
 
 
+def build_products_by_ids_query(product_ids: list[int]):
+    """
+    Строит SQL-запрос товаров по списку ID вместе с категориями.
+
+    `id = ANY(:ids)` с одним параметром-массивом: текст запроса не зависит от числа id,
+    поэтому подготовленный запрос переиспользуется, а категории приходят в том же запросе.
+    """
+    ids = bindparam("ids", product_ids, type_=ARRAY(Integer))
+    return select(Product).options(joinedload(Product.category)).where(Product.id == any_(ids))
+
+
 async def get_product_by_id(
     product_id: int,
     session: AsyncSession,
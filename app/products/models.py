@@ -5,7 +5,9 @@ from sqlalchemy import (
     DateTime,
     Float,
     ForeignKey,
+    Index,
     Integer,
+    SmallInteger,
     String,
     Text,
     func,
@@ -26,6 +28,8 @@ class Product(Base):
     category_id: Mapped[int] = mapped_column(Integer, ForeignKey("categories.id"), nullable=False)
     stock_quantity: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
     reserved: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    # пересчитывается периодически, см. app/products/popularity.py
+    popularity_score: Mapped[float] = mapped_column(Float, nullable=False, default=0, server_default="0")
 
     category = relationship("Category", back_populates="products")
     cart_items = relationship("CartItem", back_populates="product")
@@ -38,3 +42,31 @@ class Product(Base):
 
     def __repr__(self) -> str:
         return f"<Product(id={self.id}, name='{self.title}', price={self.price})>"
+
+
+# sort=popular: чтение индекса по порядку, id - для стабильной пагинации
+Index("ix_products_popularity", Product.popularity_score.desc(), Product.id)
+
+
+class ProductRecommendation(Base):
+    """Товар, который часто покупают вместе с `product_id`; rank - место в топе (с нуля)"""
+
+    __tablename__ = "product_recommendations"
+
+    product_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True
+    )
+    rank: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    related_product_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    score: Mapped[float] = mapped_column(Float, nullable=False)
+    orders: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    related_product = relationship("Product", foreign_keys=[related_product_id])
+
+    def __repr__(self) -> str:
+        return (
+            f"<ProductRecommendation(product_id={self.product_id}, rank={self.rank}, "
+            f"related_product_id={self.related_product_id})>"
+        )
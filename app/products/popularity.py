@@ -0,0 +1,118 @@
+"""
+Рейтинг популярности товаров.
+
+Периодическая задача пересчитывает `products.popularity_score` - сумму
+проданных штук за последние `POPULARITY_LOOKBACK_DAYS` дней с экспоненциальным
+затуханием (вес продажи уменьшается вдвое каждые `POPULARITY_HALF_LIFE_DAYS` дней).
+Колонка проиндексирована вместе с id, поэтому `GET /products/?sort=popular`
+читает индекс по порядку, а не агрегирует историю заказов на каждый запрос.
+
+Задача зарегистрирована в каждом воркере, но пересчёт обновляет строки всех
+проданных товаров - те же, что блокирует оформление заказа, - поэтому он идёт
+в одном воркере под advisory-блокировкой. Остальные пропускают запуск и узнают
+об изменении рейтинга через NOTIFY (от него зависит ранжирование подсказок).
+"""
+
+import logging
+from datetime import timedelta
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.core.database import async_session_factory
+from app.core.tasks import register_periodic_task
+from app.events.broker import notify, pg_listener
+from app.orders.models import Order, OrderItem
+from app.orders.schemas import EXCLUDED_STATUSES
+
+from .models import Product
+from .suggest import suggest_index
+
+logger = logging.getLogger(__name__)
+
+POPULARITY_CHANNEL = "popularity_changes"
+
+# ключ advisory-блокировки пересчёта рейтинга популярности
+POPULARITY_LOCK = 6_391_507
+
+
+def popularity_scores_query(lookback_days: int, half_life_days: float):
+    """Оценка популярности товаров, у которых были продажи за период"""
+    age_days = func.extract("epoch", func.now() - Order.created_at) / 86400
+    return (
+        select(
+            OrderItem.product_id,
+            func.sum(OrderItem.quantity * func.power(0.5, age_days / half_life_days)).label("score"),
+        )
+        .join(Order, Order.id == OrderItem.order_id)
+        .where(
+            Order.created_at >= func.now() - timedelta(days=lookback_days),
+            Order.order_status.not_in(EXCLUDED_STATUSES),
+        )
+        .group_by(OrderItem.product_id)
+        .subquery()
+    )
+
+
+async def refresh_popularity_scores(
+    session: AsyncSession,
+    lookback_days: int = settings.POPULARITY_LOOKBACK_DAYS,
+    half_life_days: float = settings.POPULARITY_HALF_LIFE_DAYS,
+) -> int | None:
+    """Пересчитывает рейтинг в транзакции сессии (без коммита)
+
+    Строки товаров, оценка которых не изменилась, не перезаписываются. Если
+    пересчёт уже идёт в другой транзакции, этот запуск пропускается.
+
+    Returns:
+        int | None: Количество обновлённых товаров или None, если пересчёт уже выполняется
+    """
+    if not await session.scalar(select(func.pg_try_advisory_xact_lock(POPULARITY_LOCK))):
+        return None
+
+    scores = popularity_scores_query(lookback_days, half_life_days)
+
+    result = await session.execute(
+        update(Product)
+        .where(Product.id == scores.c.product_id, Product.popularity_score != scores.c.score)
+        .values(popularity_score=scores.c.score)
+    )
+    updated = result.rowcount
+
+    # товары без продаж за период опускаются в конец
+    result = await session.execute(
+        update(Product)
+        .where(Product.popularity_score != 0, Product.id.not_in(select(scores.c.product_id)))
+        .values(popularity_score=0)
+    )
+
+    return updated + result.rowcount
+
+
+async def refresh_popularity(session_factory: async_sessionmaker = async_session_factory) -> None:
+    """Периодическая задача: пересчитывает рейтинг популярности"""
+    async with session_factory() as session:
+        updated = await refresh_popularity_scores(session)
+        if updated:
+            await notify(session, POPULARITY_CHANNEL, {})
+        await session.commit()
+
+    if updated is None:
+        logger.info("Рейтинг популярности уже пересчитывается в другом воркере - запуск пропущен")
+        return
+
+    if updated:
+        # ранжирование подсказок зависит от популярности
+        suggest_index.mark_stale()
+
+    logger.info("Рейтинг популярности пересчитан, обновлено товаров: %s", updated)
+
+
+pg_listener.listen(POPULARITY_CHANNEL, lambda payload: suggest_index.mark_stale())
+
+register_periodic_task(
+    "product-popularity",
+    interval=settings.POPULARITY_REFRESH_INTERVAL,
+    func=refresh_popularity,
+)
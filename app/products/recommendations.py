@@ -0,0 +1,200 @@
+"""
+Рекомендации "покупают вместе" по совместным покупкам.
+
+Периодическая задача строит разреженную матрицу совместной встречаемости
+товаров: Postgres группирует пары позиций одного заказа и отдаёт её в виде
+троек (товар, товар, число общих заказов), а оценка пар (cosine или lift) и
+выбор топ-K соседей каждого товара считаются векторно на NumPy. Результат
+целиком заменяет таблицу `product_recommendations` в одной транзакции, поэтому
+читатели видят либо старый, либо новый набор.
+
+`GET /products/{id}/related` читает только эту таблицу по первичному ключу
+(product_id, rank) и не обращается к истории заказов. Товарам без рекомендаций
+эндпоинт отдаёт популярные товары их категории.
+"""
+
+import logging
+from datetime import timedelta
+from typing import Literal
+
+import numpy as np
+from sqlalchemy import Select, delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import aliased
+
+from app.core.config import settings
+from app.core.database import async_session_factory
+from app.core.tasks import register_periodic_task
+from app.orders.models import Order, OrderItem
+from app.orders.schemas import EXCLUDED_STATUSES
+
+from .models import ProductRecommendation
+
+logger = logging.getLogger(__name__)
+
+
+# ключ advisory-блокировки пересчёта рекомендаций
+RECOMMENDATIONS_LOCK = 5_273_914
+
+
+def _orders_filter(lookback_days: int) -> tuple:
+    return (
+        Order.created_at >= func.now() - timedelta(days=lookback_days),
+        Order.order_status.not_in(EXCLUDED_STATUSES),
+    )
+
+
+def co_occurrence_query(lookback_days: int, min_orders: int) -> Select:
+    """Ненулевые элементы верхнего треугольника матрицы: (товар, товар, общих заказов)"""
+    left, right = aliased(OrderItem), aliased(OrderItem)
+    return (
+        select(left.product_id, right.product_id, func.count())
+        .join(right, (right.order_id == left.order_id) & (right.product_id > left.product_id))
+        .join(Order, Order.id == left.order_id)
+        .where(*_orders_filter(lookback_days))
+        .group_by(left.product_id, right.product_id)
+        .having(func.count() >= min_orders)
+    )
+
+
+def product_orders_query(lookback_days: int) -> Select:
+    """Количество заказов с каждым товаром (диагональ матрицы)"""
+    return (
+        select(OrderItem.product_id, func.count())
+        .join(Order, Order.id == OrderItem.order_id)
+        .where(*_orders_filter(lookback_days))
+        .group_by(OrderItem.product_id)
+        .order_by(OrderItem.product_id)
+    )
+
+
+def score_pairs(
+    pairs: "np.ndarray",
+    product_ids: "np.ndarray",
+    product_orders: "np.ndarray",
+    total_orders: int,
+    metric: Literal["cosine", "lift"],
+) -> tuple["np.ndarray", "np.ndarray", "np.ndarray", "np.ndarray"]:
+    """Оценивает пары в обе стороны
+
+    Args:
+        pairs (np.ndarray): Тройки (товар, товар, общих заказов), shape (n, 3)
+        product_ids (np.ndarray): Отсортированные ID товаров
+        product_orders (np.ndarray): Количество заказов с товаром, в порядке `product_ids`
+        total_orders (int): Всего заказов за период
+        metric (str): cosine - c / sqrt(n_a * n_b), lift - c * N / (n_a * n_b)
+
+    Returns:
+        tuple: Товар, рекомендуемый товар, оценка, общих заказов - по элементу на направление пары
+    """
+    left, right, together = pairs[:, 0], pairs[:, 1], pairs[:, 2].astype(np.float64)
+    left_orders = product_orders[np.searchsorted(product_ids, left)].astype(np.float64)
+    right_orders = product_orders[np.searchsorted(product_ids, right)].astype(np.float64)
+
+    if metric == "lift":
+        scores = together * total_orders / (left_orders * right_orders)
+    else:
+        scores = together / np.sqrt(left_orders * right_orders)
+
+    # матрица симметрична: пара (a, b) даёт рекомендацию и для a, и для b
+    return (
+        np.concatenate([left, right]),
+        np.concatenate([right, left]),
+        np.concatenate([scores, scores]),
+        np.concatenate([pairs[:, 2], pairs[:, 2]]),
+    )
+
+
+def top_neighbours(
+    products: "np.ndarray",
+    related: "np.ndarray",
+    scores: "np.ndarray",
+    together: "np.ndarray",
+    top_k: int,
+) -> tuple["np.ndarray", ...]:
+    """Оставляет для каждого товара `top_k` соседей с наибольшей оценкой
+
+    Returns:
+        tuple: Товар, место в топе, рекомендуемый товар, оценка, общих заказов
+    """
+    # сортировка по товару, внутри - по убыванию оценки и числа общих заказов
+    order = np.lexsort((related, -together, -scores, products))
+    products, related, scores, together = products[order], related[order], scores[order], together[order]
+
+    ranks = np.arange(len(products)) - np.searchsorted(products, products)
+    keep = ranks < top_k
+
+    return products[keep], ranks[keep], related[keep], scores[keep], together[keep]
+
+
+async def rebuild_recommendations(
+    session: AsyncSession,
+    lookback_days: int = settings.RECOMMENDATIONS_LOOKBACK_DAYS,
+    top_k: int = settings.RECOMMENDATIONS_TOP_K,
+    min_orders: int = settings.RECOMMENDATIONS_MIN_ORDERS,
+    metric: Literal["cosine", "lift"] = settings.RECOMMENDATIONS_SCORE,
+) -> int | None:
+    """Пересчитывает рекомендации в транзакции сессии (без коммита)
+
+    Задача запускается в каждом воркере, а таблица заменяется целиком, поэтому
+    пересчёты идут по одному под advisory-блокировкой транзакции. Если блокировку
+    держит другой пересчёт, этот запуск пропускается.
+
+    Returns:
+        int | None: Количество сохранённых рекомендаций или None, если пересчёт уже выполняется
+    """
+    if not await session.scalar(select(func.pg_try_advisory_xact_lock(RECOMMENDATIONS_LOCK))):
+        return None
+
+    result = await session.execute(co_occurrence_query(lookback_days, min_orders))
+    pairs = np.array(result.all(), dtype=np.int64).reshape(-1, 3)
+
+    result = await session.execute(product_orders_query(lookback_days))
+    counts = np.array(result.all(), dtype=np.int64).reshape(-1, 2)
+    total_orders = await session.scalar(
+        select(func.count()).select_from(Order).where(*_orders_filter(lookback_days))
+    )
+
+    products, ranks, related, scores, together = top_neighbours(
+        *score_pairs(pairs, counts[:, 0], counts[:, 1], total_orders, metric),
+        top_k=top_k,
+    )
+
+    await session.execute(delete(ProductRecommendation))
+    if len(products):
+        await session.execute(
+            insert(ProductRecommendation),
+            [
+                {
+                    "product_id": product_id,
+                    "rank": rank,
+                    "related_product_id": related_id,
+                    "score": score,
+                    "orders": orders,
+                }
+                for product_id, rank, related_id, score, orders in zip(
+                    products.tolist(), ranks.tolist(), related.tolist(), scores.tolist(), together.tolist()
+                )
+            ],
+        )
+
+    return len(products)
+
+
+async def refresh_recommendations(session_factory: async_sessionmaker = async_session_factory) -> None:
+    """Периодическая задача: перестраивает рекомендации"""
+    async with session_factory() as session:
+        count = await rebuild_recommendations(session)
+        await session.commit()
+
+    if count is None:
+        logger.info("Рекомендации уже пересчитываются в другом воркере - запуск пропущен")
+    else:
+        logger.info("Рекомендации пересчитаны: %s", count)
+
+
+register_periodic_task(
+    "product-recommendations",
+    interval=settings.RECOMMENDATIONS_REFRESH_INTERVAL,
+    func=refresh_recommendations,
+)
@@ -1,19 +1,27 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, Path, Response, status
+from fastapi import APIRouter, Depends, Path, Response, WebSocket, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.auth.services import validate_user_admin_service
-from app.core.database import get_async_session
+from app.core.database import get_async_read_session, get_async_session
+from app.core.fields import fields_response
 
+from . import popularity, recommendations  # noqa: F401 - регистрируют периодические пересчёты
 from .helpers import get_product_by_id
-from .schemas import ProductRead
+from .schemas import ProductBatchRead, ProductFacetsRead, ProductRead, SuggestionsRead
 from .services import (
     create_product_service,
     delete_product_service,
+    get_product_facets_service,
+    get_product_suggestions_service,
+    get_products_batch_service,
     get_products_with_filters_service,
+    get_related_products_service,
+    product_fields,
     update_product_service,
 )
+from .stock import serve_stock_updates
 
 router = APIRouter(prefix="/products", tags=["Товары"])
 
@@ -28,14 +36,66 @@ admin_deps = [Depends(validate_user_admin_service)]
     summary="Получить список всех товаров",
 )
 async def get_products(
+    response: Response,
     products: list[ProductRead] = Depends(get_products_with_filters_service),
+    fields: frozenset[str] | None = Depends(product_fields),
 ):
     """
     Получить список товаров с возможностью фильтрации, сортировки и пагинации.
+    `fields=id,title,price` - вернуть только эти поля.
     """
+    if fields is not None:
+        return fields_response(products, ProductRead, fields, response)
     return products
 
 
+@router.get(
+    "/facets",
+    status_code=status.HTTP_200_OK,
+    response_model=ProductFacetsRead,
+    summary="Фасеты каталога: количество товаров по категориям и диапазонам цен",
+)
+async def get_product_facets(facets: ProductFacetsRead = Depends(get_product_facets_service)):
+    """
+    Принимает те же фильтры, что и список товаров. Счётчики категорий не учитывают
+    фильтр по категориям, ценовые диапазоны - фильтр по цене.
+    """
+    return facets
+
+
+@router.get(
+    "/batch",
+    status_code=status.HTTP_200_OK,
+    response_model=ProductBatchRead,
+    summary="Получить несколько товаров по списку ID",
+)
+async def get_products_batch(batch: ProductBatchRead = Depends(get_products_batch_service)):
+    return batch
+
+
+@router.get(
+    "/suggest",
+    status_code=status.HTTP_200_OK,
+    response_model=SuggestionsRead,
+    summary="Подсказки поиска по началу слова в названиях товаров и категорий",
+)
+async def get_product_suggestions(suggestions: SuggestionsRead = Depends(get_product_suggestions_service)):
+    return suggestions
+
+
+@router.websocket("/stock/ws")
+async def stock_updates(
+    websocket: WebSocket,
+    session: AsyncSession = Depends(get_async_session, scope="function"),
+):
+    """
+    Подписка на доступный остаток товаров: клиент присылает
+    `{"action": "subscribe" | "unsubscribe", "product_ids": [...]}`,
+    сервер отвечает сообщениями `{"stock": {"<id>": <доступно>}}`.
+    """
+    await serve_stock_updates(websocket, session)
+
+
 @router.get(
     "/{product_id}",
     status_code=status.HTTP_200_OK,
@@ -44,7 +104,7 @@ async def get_products(
 )
 async def get_product(
     product_id: Annotated[int, Path(title="ID товара", ge=1)],
-    session: AsyncSession = Depends(get_async_session),
+    session: AsyncSession = Depends(get_async_read_session, scope="function"),
 ):
     product = await get_product_by_id(
         product_id=product_id,
@@ -54,6 +114,18 @@ async def get_product(
     return product
 
 
+@router.get(
+    "/{product_id}/related",
+    status_code=status.HTTP_200_OK,
+    response_model=list[ProductRead],
+    summary="Товары, которые часто покупают вместе с этим",
+)
+async def get_related_products(
+    products: list[ProductRead] = Depends(get_related_products_service),
+):
+    return products
+
+
 @router.post(
     "/",
     status_code=status.HTTP_201_CREATED,
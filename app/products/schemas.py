@@ -1,15 +1,32 @@
 from datetime import datetime
 from enum import Enum
-from typing import Annotated
+from typing import Annotated, Literal, NamedTuple
 
 from pydantic import BaseModel, Field
 
+from app.core.config import settings
+
 
 class PriceSort(str, Enum):
     asc = "asc"
     desc = "desc"
 
 
+class ProductSort(str, Enum):
+    popular = "popular"
+
+
+class ProductFilters(NamedTuple):
+    """Фильтры каталога; хешируемые - служат ключом кэша фасетов"""
+
+    category_ids: frozenset[int] = frozenset()
+    title: str | None = None
+    min_price: float | None = None
+    max_price: float | None = None
+    in_stock: bool = False
+    include_descendants: bool = False
+
+
 class ProductBase(BaseModel):
     title: Annotated[str, Field(..., min_length=3, max_length=100, description="Название товара")]
     description: Annotated[str | None, Field(max_length=500, description="Описание товара")] = None
@@ -49,3 +66,50 @@ class ProductUpdate(BaseModel):
     )
 
     model_config = {"str_strip_whitespace": True}
+
+
+class StockSubscriptionMessage(BaseModel):
+    """Сообщение клиента WebSocket-канала остатков"""
+
+    action: Literal["subscribe", "unsubscribe"]
+    product_ids: Annotated[
+        list[Annotated[int, Field(ge=1)]], Field(min_length=1, max_length=settings.STOCK_WS_MAX_PRODUCTS)
+    ]
+
+
+class CategoryFacet(BaseModel):
+    id: int
+    name: str | None
+    count: int
+
+
+class PriceFacet(BaseModel):
+    min: float
+    max: float | None
+    count: int
+
+
+class ProductFacetsRead(BaseModel):
+    total: int
+    categories: list[CategoryFacet]
+    prices: list[PriceFacet]
+
+
+class ProductSuggestion(BaseModel):
+    id: int
+    title: str
+
+
+class CategorySuggestion(BaseModel):
+    id: int
+    name: str
+
+
+class SuggestionsRead(BaseModel):
+    products: list[ProductSuggestion]
+    categories: list[CategorySuggestion]
+
+
+class ProductBatchRead(BaseModel):
+    products: list[ProductRead]
+    missing: list[int]
@@ -1,66 +1,249 @@
+from contextlib import nullcontext
 from typing import Annotated
 
-from fastapi import Depends, HTTPException, Path, Query, status
+from fastapi import Depends, HTTPException, Path, Query, Response, status
+from pydantic import PositiveInt
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.categories.helpers import get_category_by_id
-from app.core.database import get_async_session
+from app.categories.catalog import category_catalog
+from app.categories.helpers import validate_categories_exist
+from app.core.config import settings
+from app.core.counting import CountMode, row_counter, set_total_count
+from app.core.database import foreign_key_errors, get_async_read_session, get_async_session
+from app.core.fields import FieldsParam
+from app.monitoring.tracing import traced
 from app.validations.request import validate_non_empty_body
 
+from .facets import facet_index, mark_catalog_changed
 from .helpers import (
+    build_product_base_query,
     build_product_query_with_filters,
+    build_products_by_ids_query,
     get_product_by_id,
 )
-from .models import Product
-from .schemas import PriceSort, ProductCreate, ProductUpdate
+from .models import Product, ProductRecommendation
+from .schemas import PriceSort, ProductCreate, ProductFilters, ProductRead, ProductSort, ProductUpdate
+from .stock import mark_stock_changed
+from .suggest import index_product, suggest_index, unindex_product
 
+product_fields = FieldsParam(ProductRead)
 
-async def get_products_with_filters_service(
-    session: AsyncSession = Depends(get_async_session),
+
+async def get_product_filters(
     category_id: Annotated[int | None, Query(gt=0)] = None,
+    category_ids: Annotated[
+        list[PositiveInt] | None,
+        Query(max_length=settings.PRODUCT_FILTER_MAX_CATEGORIES, description="Несколько категорий"),
+    ] = None,
     title: Annotated[str | None, Query(min_length=3, max_length=100)] = None,
+    min_price: Annotated[float | None, Query(ge=0)] = None,
+    max_price: Annotated[float | None, Query(ge=0)] = None,
+    in_stock: Annotated[bool, Query(description="Только товары в наличии")] = False,
+    include_descendants: Annotated[bool, Query(description="Вместе с подкатегориями")] = False,
+) -> ProductFilters:
+    """Dependency - фильтры каталога с проверкой диапазона цен"""
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Минимальная цена больше максимальной",
+        )
+
+    ids = set(category_ids or ())
+    if category_id:
+        ids.add(category_id)
+
+    return ProductFilters(
+        category_ids=frozenset(ids),
+        title=title,
+        min_price=min_price,
+        max_price=max_price,
+        in_stock=in_stock,
+        include_descendants=include_descendants,
+    )
+
+
+@traced()
+async def get_products_with_filters_service(
+    response: Response,
+    session: AsyncSession = Depends(get_async_read_session, scope="function"),
+    filters: ProductFilters = Depends(get_product_filters),
     sort_price: Annotated[
         PriceSort | None, Query(description="asc - по возрастанию, desc - по убыванию")
     ] = None,
+    sort: Annotated[ProductSort | None, Query(description="popular - по популярности")] = None,
     offset: Annotated[int, Query(ge=0)] = 0,
     limit: Annotated[int, Query(gt=0)] = 100,
+    count: Annotated[CountMode | None, Query(description="Вернуть общее количество в X-Total-Count")] = None,
+    fields: frozenset[str] | None = Depends(product_fields),
 ):
     """Сервис для получения товаров с фильтрацией, сортировкой и пагинацией.
 
     Args:
-        session: Асинхронная сессия БД
-        category_id: ID категории для фильтрации
-        title: Поиск по названию товара
+        response: Ответ - для заголовка X-Total-Count
+        session: Асинхронная сессия БД (реплика, если доступна)
+        filters: Категории, поиск по названию, диапазон цен, наличие
         sort_price: Сортировка по цене (asc/desc)
+        sort: Сортировка по популярности (popular)
         offset: Смещение для пагинации
         limit: Лимит для пагинации
+        count: Способ подсчёта общего количества (exact/planned/estimated)
+        fields: Поля ответа (None - все); остальные колонки не загружаются
 
     Returns:
         Список товаров с загруженными категориями
     """
-    if category_id:
-        # проверяем есть ли такая категория
-        await get_category_by_id(
-            category_id=category_id,
-            session=session,
+    if sort is not None and sort_price is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Укажите только один параметр сортировки: sort или sort_price",
         )
 
     query = build_product_query_with_filters(
-        category_id=category_id,
-        title=title,
+        filters=filters,
         sort_price=sort_price,
+        sort=sort,
         offset=offset,
         limit=limit,
+        fields=fields,
     )
 
     result = await session.execute(query)
+    products = result.scalars().all()
 
-    return result.scalars().all()
+    if not products and filters.category_ids:
+        # пустая страница: 404, если какой-то из категорий нет
+        await validate_categories_exist(category_ids=filters.category_ids)
 
+    if count is not None:
+        set_total_count(response, await row_counter.count(session, query, count))
+
+    return products
+
+
+@traced()
+async def get_products_batch_service(
+    ids: Annotated[
+        list[PositiveInt],
+        Query(min_length=1, max_length=settings.PRODUCT_BATCH_MAX_IDS, description="ID товаров"),
+    ],
+    session: AsyncSession = Depends(get_async_read_session, scope="function"),
+):
+    """Сервис - несколько товаров по ID одним запросом (корзина, избранное)
+
+    Args:
+        ids (list[int]): ID товаров; повторы отбрасываются
+        session (AsyncSession): Асинхронная сессия БД (реплика, если доступна)
+
+    Returns:
+        Товары в порядке запроса и ID, которых нет
+    """
+    product_ids = list(dict.fromkeys(ids))
+
+    result = await session.execute(build_products_by_ids_query(product_ids))
+    found = {product.id: product for product in result.scalars()}
+
+    return {
+        "products": [found[product_id] for product_id in product_ids if product_id in found],
+        "missing": [product_id for product_id in product_ids if product_id not in found],
+    }
+
+
+@traced()
+async def get_product_facets_service(
+    filters: ProductFilters = Depends(get_product_filters),
+):
+    """Сервис - фасеты каталога для текущих фильтров
+
+    Считаются по индексу в памяти процесса (см. app/products/facets.py), без запроса к БД,
+    пока товары не менялись.
+
+    Args:
+        filters (ProductFilters): Фильтры каталога
 
+    Returns:
+        Всего товаров, количество по категориям и ценовым диапазонам
+    """
+    if filters.category_ids and filters.include_descendants:
+        # подкатегории раскрываются по дереву из справочника категорий в памяти
+        snapshot = await category_catalog.get()
+        filters = filters._replace(
+            category_ids=snapshot.descendants(filters.category_ids),
+            include_descendants=False,
+        )
+
+    return await facet_index.get(filters)
+
+
+@traced()
+async def get_product_suggestions_service(
+    q: Annotated[str, Query(min_length=2, max_length=100, description="Начало слова названия")],
+    limit: Annotated[int, Query(gt=0, le=settings.SUGGEST_MAX_LIMIT)] = settings.SUGGEST_LIMIT,
+):
+    """Сервис - подсказки поиска по префиксу из индекса в памяти процесса
+
+    Args:
+        q (str): Введённый текст
+        limit (int): Максимум товаров и категорий в ответе
+
+    Returns:
+        Товары и категории по убыванию популярности
+    """
+    await suggest_index.ensure_loaded()
+    return suggest_index.search(q, limit)
+
+
+@traced()
+async def get_related_products_service(
+    product_id: Annotated[int, Path(title="ID товара", ge=1)],
+    limit: Annotated[int, Query(gt=0, le=settings.RECOMMENDATIONS_TOP_K)] = settings.RECOMMENDATIONS_TOP_K,
+    session: AsyncSession = Depends(get_async_read_session, scope="function"),
+):
+    """Сервис - товары, которые часто покупают вместе с товаром
+
+    Читает готовые рекомендации по первичному ключу (product_id, rank), история
+    заказов при запросе не используется. Если рекомендаций для товара нет (мало
+    совместных заказов или пересчёт ещё не выполнялся), отдаются самые популярные
+    товары его категории.
+
+    Args:
+        product_id (int): ID товара
+        limit (int): Количество рекомендаций
+        session (AsyncSession): Асинхронная сессия БД (реплика, если доступна)
+
+    Returns:
+        Список товаров по убыванию оценки (или популярности)
+    """
+    query = (
+        build_product_base_query(with_category=True)
+        .join(ProductRecommendation, ProductRecommendation.related_product_id == Product.id)
+        .where(ProductRecommendation.product_id == product_id)
+        .order_by(ProductRecommendation.rank)
+        .limit(limit)
+    )
+    result = await session.execute(query)
+    products = result.scalars().all()
+
+    if not products:
+        product = await get_product_by_id(product_id=product_id, session=session)
+        result = await session.execute(
+            build_product_base_query(with_category=True)
+            .where(Product.category_id == product.category_id, Product.id != product_id)
+            .order_by(Product.popularity_score.desc(), Product.id)
+            .limit(limit)
+        )
+        products = result.scalars().all()
+
+    return products
+
+
+def _checking_category(session: AsyncSession):
+    return foreign_key_errors(session, "category_id", status.HTTP_404_NOT_FOUND, "Категория не найдена")
+
+
+@traced()
 async def create_product_service(
     data: ProductCreate,
-    session: AsyncSession = Depends(get_async_session),
+    session: AsyncSession = Depends(get_async_session, scope="function"),
 ):
     """Сервис для создания товаров
 
@@ -72,15 +255,12 @@ async def create_product_service(
         Созданный товар
     """
     try:
-        # проверяем есть ли такая категория
-        await get_category_by_id(
-            category_id=data.category_id,
-            session=session,
-        )
-
         product = Product(**data.model_dump(exclude_unset=True))
 
-        session.add(product)
+        async with _checking_category(session):
+            session.add(product)
+        await mark_catalog_changed(session)
+        await index_product(session, product)
         await session.commit()
         await session.refresh(product)
 
@@ -102,10 +282,11 @@ async def create_product_service(
         )
 
 
+@traced()
 async def update_product_service(
     product_id: Annotated[int, Path(title="ID товара", ge=1)],
     data: ProductUpdate,
-    session: AsyncSession = Depends(get_async_session),
+    session: AsyncSession = Depends(get_async_session, scope="function"),
 ):
     """Сервис для обновление данных товара
 
@@ -125,14 +306,16 @@ async def update_product_service(
             session=session,
         )
 
-        if "category_id" in update_data:
-            await get_category_by_id(
-                category_id=update_data["category_id"],
-                session=session,
-            )
+        # внешний ключ проверяется только при смене категории
+        async with _checking_category(session) if "category_id" in update_data else nullcontext():
+            for key, value in update_data.items():
+                setattr(product, key, value)
 
-        for key, value in update_data.items():
-            setattr(product, key, value)
+        if "stock_quantity" in update_data:
+            await mark_stock_changed(session, [product.id])
+        await mark_catalog_changed(session)
+        if update_data.keys() & {"title", "category_id"}:
+            await index_product(session, product)
 
         await session.commit()
         await session.refresh(product)
@@ -151,9 +334,10 @@ async def update_product_service(
         )
 
 
+@traced()
 async def delete_product_service(
     product_id: Annotated[int, Path(ge=1)],
-    session: AsyncSession = Depends(get_async_session),
+    session: AsyncSession = Depends(get_async_session, scope="function"),
 ):
     """Сервис для удаления товара
 
@@ -168,6 +352,8 @@ async def delete_product_service(
         )
 
         await session.delete(product)
+        await mark_catalog_changed(session)
+        await unindex_product(session, product.id)
         await session.commit()
 
     except HTTPException:
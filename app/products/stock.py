@@ -0,0 +1,245 @@
+"""
+Рассылка доступного остатка товаров (`stock_quantity - reserved`) по WebSocket.
+
+Код, меняющий остаток (резерв при оформлении заказа, правка товара админом),
+вызывает `mark_stock_changed` в своей транзакции: после коммита id товаров
+попадают в `StockFeed` этого процесса, а остальные воркеры узнают о них через
+NOTIFY. Сами значения в сообщении не передаются - `StockFeed` раз в
+`STOCK_PUSH_INTERVAL` секунд одним запросом перечитывает остаток изменившихся
+товаров, на которые кто-то подписан. Так частые изменения одного товара
+схлопываются в одно сообщение за интервал, а порядок коммитов конкурентных
+транзакций не важен - клиент всегда получает актуальное значение.
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+from collections.abc import Iterable
+
+from fastapi import WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import async_session_factory
+from app.core.tasks import register_background_task
+from app.events.broker import notify, pg_listener
+
+from .facets import mark_catalog_changed
+from .models import Product
+from .schemas import StockSubscriptionMessage
+
+logger = logging.getLogger(__name__)
+
+STOCK_CHANNEL = "stock_changes"
+_PENDING_KEY = "stock_changed"
+
+
+class StockSubscriber:
+    """Подписка одного WebSocket-подключения на остатки товаров
+
+    Обновления копятся в словаре (товар -> остаток), поэтому медленный клиент
+    получает только последние значения, а память не растёт.
+
+    Attributes:
+        product_ids (set[int]): Товары, на которые подписано подключение
+    """
+
+    def __init__(self) -> None:
+        self.product_ids: set[int] = set()
+        self._pending: dict[int, int] = {}
+        self._ready = asyncio.Event()
+
+    def push(self, product_id: int, available: int) -> None:
+        if product_id in self.product_ids:
+            self._pending[product_id] = available
+            self._ready.set()
+
+    async def get(self) -> dict[int, int]:
+        """Ждёт и забирает накопленные обновления"""
+        await self._ready.wait()
+        self._ready.clear()
+        pending, self._pending = self._pending, {}
+        return pending
+
+
+async def get_available_stock(session: AsyncSession, product_ids: Iterable[int]) -> dict[int, int]:
+    """Доступный остаток товаров; удалённых товаров в результате нет"""
+    result = await session.execute(
+        select(Product.id, Product.stock_quantity - Product.reserved).where(Product.id.in_(list(product_ids)))
+    )
+    return {product_id: available for product_id, available in result.all()}
+
+
+class StockFeed:
+    """Раздача остатков подписчикам процесса с ограничением частоты
+
+    Attributes:
+        session_factory (async_sessionmaker): Фабрика сессий для чтения остатков
+        interval (float): Минимальный интервал между рассылками
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker = async_session_factory,
+        interval: float = settings.STOCK_PUSH_INTERVAL,
+    ) -> None:
+        self.session_factory = session_factory
+        self.interval = interval
+        self._subscribers: dict[int, set[StockSubscriber]] = defaultdict(set)
+        self._changed: set[int] = set()
+        self._wakeup = asyncio.Event()
+
+    def subscribe(self, subscriber: StockSubscriber, product_ids: Iterable[int]) -> None:
+        for product_id in product_ids:
+            subscriber.product_ids.add(product_id)
+            self._subscribers[product_id].add(subscriber)
+
+    def unsubscribe(self, subscriber: StockSubscriber, product_ids: Iterable[int] | None = None) -> None:
+        """Отписывает от переданных товаров (`None` - от всех)"""
+        for product_id in list(subscriber.product_ids if product_ids is None else product_ids):
+            subscriber.product_ids.discard(product_id)
+            subscribers = self._subscribers.get(product_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[product_id]
+
+    def mark_changed(self, product_ids: Iterable[int]) -> None:
+        """Отмечает товары изменившимися; товары без подписчиков пропускаются"""
+        changed = {product_id for product_id in product_ids if product_id in self._subscribers}
+        if changed:
+            self._changed |= changed
+            self._wakeup.set()
+
+    def mark_all_changed(self) -> None:
+        """Отмечает изменившимися все товары с подписчиками"""
+        self.mark_changed(list(self._subscribers))
+
+    async def flush(self, session: AsyncSession) -> int:
+        """Рассылает текущий остаток изменившихся товаров
+
+        Returns:
+            int: Количество разосланных товаров
+        """
+        changed, self._changed = self._changed, set()
+        if not changed:
+            return 0
+
+        available = await get_available_stock(session, changed)
+        for product_id in changed:
+            for subscriber in self._subscribers.get(product_id, ()):
+                subscriber.push(product_id, available.get(product_id, 0))
+
+        return len(changed)
+
+    async def run(self) -> None:
+        """Фоновый цикл: рассылка сразу после первого изменения, затем не чаще раза в `interval`"""
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                async with self.session_factory() as session:
+                    await self.flush(session)
+            except Exception:
+                # отмена посреди работы с БД может прийти в виде ошибки SQLAlchemy
+                if asyncio.current_task().cancelling():
+                    raise
+                logger.exception("Ошибка рассылки остатков")
+
+            await asyncio.sleep(self.interval)
+
+
+stock_feed = StockFeed()
+
+register_background_task("stock-feed", stock_feed.run)
+pg_listener.listen(
+    STOCK_CHANNEL,
+    lambda payload: stock_feed.mark_changed(payload["product_ids"]),
+    resync=stock_feed.mark_all_changed,
+)
+
+
+async def mark_stock_changed(session: AsyncSession, product_ids: Iterable[int]) -> None:
+    """Отмечает изменение остатка товаров в транзакции сессии (без коммита)
+
+    Подписчики этого процесса получат обновление после коммита, остальные
+    воркеры - через NOTIFY, который Postgres доставит тоже только после коммита.
+    """
+    product_ids = sorted(set(product_ids))
+    session.info.setdefault(_PENDING_KEY, set()).update(product_ids)
+    await notify(session, STOCK_CHANNEL, {"product_ids": product_ids})
+    # наличие участвует в фасетах каталога
+    await mark_catalog_changed(session)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_stock_changes(session):
+    changed = session.info.pop(_PENDING_KEY, None)
+    if changed:
+        stock_feed.mark_changed(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_stock_changes(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+async def serve_stock_updates(websocket: WebSocket, session: AsyncSession) -> None:
+    """Обслуживает WebSocket-подключение канала остатков
+
+    Клиент отправляет `{"action": "subscribe" | "unsubscribe", "product_ids": [...]}`,
+    сервер сразу отвечает текущим остатком новых товаров, а затем присылает
+    изменения в виде `{"stock": {"<id товара>": <доступно>}}`.
+    """
+    await websocket.accept()
+
+    subscriber = StockSubscriber()
+    sender = asyncio.create_task(_send_stock_updates(websocket, subscriber))
+    try:
+        while True:
+            data = await websocket.receive_text()
+            try:
+                # некорректный JSON - такая же ошибка валидации, как и неверная схема
+                message = StockSubscriptionMessage.model_validate_json(data)
+            except ValidationError as e:
+                await websocket.send_json(
+                    {
+                        "error": "Некорректное сообщение",
+                        "detail": e.errors(include_url=False, include_context=False),
+                    }
+                )
+                continue
+
+            if message.action == "unsubscribe":
+                stock_feed.unsubscribe(subscriber, message.product_ids)
+                continue
+
+            new_ids = set(message.product_ids) - subscriber.product_ids
+            if len(subscriber.product_ids) + len(new_ids) > settings.STOCK_WS_MAX_PRODUCTS:
+                await websocket.send_json(
+                    {"error": f"Можно подписаться не более чем на {settings.STOCK_WS_MAX_PRODUCTS} товаров"}
+                )
+                continue
+
+            stock_feed.subscribe(subscriber, new_ids)
+            available = await get_available_stock(session, new_ids)
+            # подключение живёт долго - не держим соединение с БД между сообщениями
+            await session.commit()
+            for product_id in new_ids:
+                subscriber.push(product_id, available.get(product_id, 0))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        stock_feed.unsubscribe(subscriber)
+
+
+async def _send_stock_updates(websocket: WebSocket, subscriber: StockSubscriber) -> None:
+    while True:
+        updates = await subscriber.get()
+        if updates:
+            stock = {str(product_id): available for product_id, available in updates.items()}
+            await websocket.send_json({"stock": stock})
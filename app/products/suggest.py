@@ -0,0 +1,236 @@
+"""
+Подсказки поиска по префиксу: названия товаров и категорий.
+
+`SuggestIndex` держит в памяти процесса отсортированный список ключей
+`(нормализованный текст, вид, id)`. Ключей у названия несколько - по одному с
+начала каждого слова ("apple iphone 15" даёт "apple iphone 15", "iphone 15",
+"15"), поэтому запрос "iph" находит товар по второму слову. Поиск - `bisect`
+до первого ключа с префиксом запроса и проход вперёд, пока префикс совпадает;
+кандидаты ранжируются по популярности (у категории - сумма популярности её
+товаров).
+
+Индекс загружается целиком при первом запросе, дальше обновляется
+инкрементально: сервисы товаров и категорий вызывают `index_product` /
+`unindex_product` / `index_category` / `unindex_category` в своей транзакции,
+изменения применяются после коммита в этом процессе и рассылаются остальным
+воркерам через NOTIFY. После пересчёта рейтинга популярности и после
+переподключения LISTEN (NOTIFY могли потеряться) индекс перечитывается целиком
+(`mark_stale`).
+"""
+
+import asyncio
+import heapq
+import re
+from bisect import bisect_left, insort
+from typing import Any
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from app.categories.models import Category
+from app.core.database import async_session_factory
+from app.events.broker import notify, pg_listener
+
+from .models import Product
+
+SUGGEST_CHANNEL = "suggest_changes"
+_PENDING_KEY = "suggest_changes"
+
+PRODUCT = "p"
+CATEGORY = "c"
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    """Нижний регистр, ё -> е, только слова через один пробел"""
+    return " ".join(_WORD_RE.findall(text.casefold().replace("ё", "е")))
+
+
+def _word_keys(text: str) -> list[str]:
+    words = normalize(text).split(" ")
+    return [" ".join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+class SuggestIndex:
+    """Префиксный индекс названий товаров и категорий
+
+    Attributes:
+        session_factory (async_sessionmaker): Фабрика сессий для полной загрузки
+    """
+
+    def __init__(self, session_factory: async_sessionmaker = async_session_factory) -> None:
+        self.session_factory = session_factory
+        self._keys: list[tuple[str, str, int]] = []
+        # товар: (название, категория, популярность, ключи); категория: (название, ключи)
+        self._products: dict[int, tuple[str, int, float, list[str]]] = {}
+        self._categories: dict[int, tuple[str, list[str]]] = {}
+        self._category_scores: dict[int, float] = {}
+        self._loaded = False
+        self._stale = True
+        # изменения, пришедшие во время полной загрузки: применяются повторно поверх неё
+        self._replay: list[dict[str, Any]] | None = None
+        self._lock = asyncio.Lock()
+
+    def mark_stale(self) -> None:
+        self._stale = True
+
+    async def ensure_loaded(self) -> None:
+        if not self._stale:
+            return
+
+        async with self._lock:
+            if self._stale:
+                self._stale = False
+                self._replay = []
+                try:
+                    await self._reload()
+                except BaseException:
+                    self._stale = True
+                    raise
+                finally:
+                    replay, self._replay = self._replay, None
+                for change in replay:
+                    self.apply(change)
+
+    async def _reload(self) -> None:
+        async with self.session_factory() as session:
+            products = (
+                await session.execute(
+                    select(Product.id, Product.title, Product.category_id, Product.popularity_score)
+                )
+            ).all()
+            categories = (await session.execute(select(Category.id, Category.name))).all()
+
+        self._keys, self._products, self._categories, self._category_scores = [], {}, {}, {}
+        for category_id, name in categories:
+            keys = _word_keys(name)
+            self._categories[category_id] = (name, keys)
+            self._keys.extend((key, CATEGORY, category_id) for key in keys)
+        for product_id, title, category_id, popularity in products:
+            keys = _word_keys(title)
+            self._products[product_id] = (title, category_id, popularity, keys)
+            self._category_scores[category_id] = self._category_scores.get(category_id, 0) + popularity
+            self._keys.extend((key, PRODUCT, product_id) for key in keys)
+        self._keys.sort()
+        self._loaded = True
+
+    def apply(self, change: dict[str, Any]) -> None:
+        """Применяет изменение товара или категории (повторное применение ничего не меняет)"""
+        if self._replay is not None:
+            self._replay.append(change)
+        if not self._loaded:
+            # ещё не загружен - полная загрузка увидит изменение сама
+            return
+
+        kind, item_id = change["kind"], change["id"]
+        if kind == PRODUCT:
+            self._remove_product(item_id)
+            if not change.get("deleted"):
+                self._add_product(item_id, change["title"], change["category_id"], change["popularity"])
+        else:
+            self._remove_keys(CATEGORY, item_id, self._categories.pop(item_id, (None, []))[1])
+            if not change.get("deleted"):
+                keys = _word_keys(change["name"])
+                self._categories[item_id] = (change["name"], keys)
+                self._insert_keys(CATEGORY, item_id, keys)
+
+    def _add_product(self, product_id: int, title: str, category_id: int, popularity: float) -> None:
+        keys = _word_keys(title)
+        self._products[product_id] = (title, category_id, popularity, keys)
+        self._category_scores[category_id] = self._category_scores.get(category_id, 0) + popularity
+        self._insert_keys(PRODUCT, product_id, keys)
+
+    def _remove_product(self, product_id: int) -> None:
+        old = self._products.pop(product_id, None)
+        if old is not None:
+            _, category_id, popularity, keys = old
+            self._category_scores[category_id] -= popularity
+            self._remove_keys(PRODUCT, product_id, keys)
+
+    def _insert_keys(self, kind: str, item_id: int, keys: list[str]) -> None:
+        for key in keys:
+            insort(self._keys, (key, kind, item_id))
+
+    def _remove_keys(self, kind: str, item_id: int, keys: list[str]) -> None:
+        for key in keys:
+            i = bisect_left(self._keys, (key, kind, item_id))
+            if i < len(self._keys) and self._keys[i] == (key, kind, item_id):
+                del self._keys[i]
+
+    def search(self, query: str, limit: int) -> dict[str, list[dict[str, Any]]]:
+        """Товары и категории, у которых слово названия начинается с `query`, по популярности"""
+        prefix = normalize(query)
+        products, categories = set(), set()
+        if prefix:
+            keys = self._keys
+            i = bisect_left(keys, (prefix,))
+            while i < len(keys) and keys[i][0].startswith(prefix):
+                _, kind, item_id = keys[i]
+                (products if kind == PRODUCT else categories).add(item_id)
+                i += 1
+
+        top_products = heapq.nsmallest(
+            limit, products, key=lambda i: (-self._products[i][2], self._products[i][0])
+        )
+        top_categories = heapq.nsmallest(
+            limit, categories, key=lambda i: (-self._category_scores.get(i, 0), self._categories[i][0])
+        )
+        return {
+            "products": [{"id": i, "title": self._products[i][0]} for i in top_products],
+            "categories": [{"id": i, "name": self._categories[i][0]} for i in top_categories],
+        }
+
+
+suggest_index = SuggestIndex()
+
+
+def _apply_remote_changes(payload: dict[str, Any]) -> None:
+    for change in payload["changes"]:
+        suggest_index.apply(change)
+
+
+pg_listener.listen(SUGGEST_CHANNEL, _apply_remote_changes, resync=suggest_index.mark_stale)
+
+
+async def _add_change(session: AsyncSession, change: dict[str, Any]) -> None:
+    session.info.setdefault(_PENDING_KEY, []).append(change)
+    await notify(session, SUGGEST_CHANNEL, {"changes": [change]})
+
+
+async def index_product(session: AsyncSession, product: Product) -> None:
+    """Добавляет или обновляет товар в индексе после коммита (товар уже должен иметь id)"""
+    await _add_change(
+        session,
+        {
+            "kind": PRODUCT,
+            "id": product.id,
+            "title": product.title,
+            "category_id": product.category_id,
+            "popularity": product.popularity_score or 0,
+        },
+    )
+
+
+async def unindex_product(session: AsyncSession, product_id: int) -> None:
+    await _add_change(session, {"kind": PRODUCT, "id": product_id, "deleted": True})
+
+
+async def index_category(session: AsyncSession, category: Category) -> None:
+    await _add_change(session, {"kind": CATEGORY, "id": category.id, "name": category.name})
+
+
+async def unindex_category(session: AsyncSession, category_id: int) -> None:
+    await _add_change(session, {"kind": CATEGORY, "id": category_id, "deleted": True})
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_suggest_changes(session):
+    for change in session.info.pop(_PENDING_KEY, ()):
+        suggest_index.apply(change)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_suggest_changes(session):
+    session.info.pop(_PENDING_KEY, None)
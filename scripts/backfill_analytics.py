@@ -0,0 +1,55 @@
+"""
+Пересчёт дневных итогов продаж за историю.
+
+Запуск из корня проекта:
+    python -m scripts.backfill_analytics --from 2025-01-01 --to 2025-12-31 --chunk-days 7
+
+Без --from пересчёт начинается с даты первого заказа, без --to - заканчивается сегодня.
+Каждая пачка дней коммитится отдельно, поэтому прерванный пересчёт можно продолжить с нужной даты.
+"""
+
+import argparse
+import asyncio
+import logging
+from datetime import date
+
+from sqlalchemy import func, select
+
+from app.analytics.rollups import backfill_rollups
+from app.core.database import async_session_factory, engine
+from app.orders.models import Order
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Пересчёт дневных итогов продаж")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="первый день (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, help="последний день (YYYY-MM-DD)")
+    parser.add_argument("--chunk-days", type=int, default=7, help="дней в одной транзакции")
+    return parser.parse_args()
+
+
+async def main() -> None:
+    args = parse_args()
+
+    date_from = args.date_from
+    if date_from is None:
+        async with async_session_factory() as session:
+            first_order_at = await session.scalar(select(func.min(Order.created_at)))
+        if first_order_at is None:
+            logging.info("Заказов нет - пересчитывать нечего")
+            return
+        date_from = first_order_at.date()
+
+    date_to = args.date_to or date.today()
+
+    try:
+        chunks = await backfill_rollups(date_from, date_to, chunk_days=args.chunk_days)
+    finally:
+        await engine.dispose()
+
+    logging.info("Готово: %s - %s, пачек: %s", date_from, date_to, chunks)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    asyncio.run(main())
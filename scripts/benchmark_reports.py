@@ -0,0 +1,134 @@
+"""
+Сравнение отчётов на NumPy с эквивалентными SQL-запросами.
+
+Запуск из корня проекта:
+    python -m scripts.benchmark_reports --from 2025-01-01 --to 2025-12-31 --repeat 5
+
+Для каждого отчёта печатается медианное время: NumPy с загрузкой периода в память,
+NumPy пачками по --chunk-size строк и агрегирующий запрос в Postgres.
+"""
+
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import Date, cast, distinct, func, select
+
+from app.analytics.reports import (
+    BasketSizeReport,
+    CategoryConversionReport,
+    TopSellersReport,
+    order_items_query,
+    run_report,
+)
+from app.core.database import async_session_factory, engine
+from app.orders.models import Order, OrderItem
+from app.orders.schemas import EXCLUDED_STATUSES, OrderStatus
+from app.products.models import Product
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Бенчмарк отчётов: NumPy против SQL")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, required=True)
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, required=True)
+    parser.add_argument("--chunk-size", type=int, default=50_000, help="строк в пачке серверного курсора")
+    parser.add_argument("--repeat", type=int, default=5)
+    return parser.parse_args()
+
+
+def sql_queries(date_from: date, date_to: date) -> dict:
+    period = (Order.created_at >= date_from, Order.created_at < date_to)
+    sold = Order.order_status.not_in(EXCLUDED_STATUSES)
+    lines = (
+        select(Order.id.label("order_id"), OrderItem.quantity, OrderItem.product_price, OrderItem.product_id)
+        .join(OrderItem, OrderItem.order_id == Order.id)
+        .where(*period)
+    )
+
+    top = lines.where(sold).subquery()
+    sizes = (
+        select(func.sum(OrderItem.quantity).label("size"))
+        .join(Order, Order.id == OrderItem.order_id)
+        .where(*period, sold)
+        .group_by(OrderItem.order_id)
+        .subquery()
+    )
+    pairs = lines.add_columns(Product.category_id, Order.order_status).join(
+        Product, Product.id == OrderItem.product_id
+    )
+    pairs = pairs.subquery()
+
+    return {
+        "top-sellers": select(
+            top.c.product_id,
+            func.sum(top.c.quantity),
+            func.sum(top.c.quantity * top.c.product_price).label("revenue"),
+        )
+        .group_by(top.c.product_id)
+        .order_by(func.sum(top.c.quantity * top.c.product_price).desc())
+        .limit(20),
+        "basket-size": select(
+            func.count(),
+            func.avg(sizes.c.size),
+            *(func.percentile_disc(p).within_group(sizes.c.size) for p in (0.5, 0.9, 0.99)),
+        ),
+        "category-conversion": select(
+            pairs.c.category_id,
+            func.count(distinct(pairs.c.order_id)),
+            func.count(distinct(pairs.c.order_id)).filter(pairs.c.order_status == OrderStatus.DELIVERED),
+        ).group_by(pairs.c.category_id),
+    }
+
+
+REPORTS = {
+    "top-sellers": TopSellersReport,
+    "basket-size": BasketSizeReport,
+    "category-conversion": CategoryConversionReport,
+}
+
+
+async def measure(repeat: int, func_) -> float:
+    timings = []
+    for _ in range(repeat):
+        async with async_session_factory() as session:
+            started = time.perf_counter()
+            await func_(session)
+            timings.append((time.perf_counter() - started) * 1000)
+
+    return statistics.median(timings)
+
+
+async def main() -> None:
+    args = parse_args()
+    date_to = args.date_to + timedelta(days=1)
+    query = order_items_query(args.date_from, date_to)
+
+    async with async_session_factory() as session:
+        rows = await session.scalar(select(func.count()).select_from(query.subquery()))
+        days = await session.scalar(
+            select(func.count(distinct(cast(Order.created_at, Date)))).where(
+                Order.created_at >= args.date_from, Order.created_at < date_to
+            )
+        )
+    print(f"Позиций заказов: {rows}, дней с заказами: {days}")
+    print(f"{'отчёт':<22}{'numpy, память':>16}{'numpy, пачки':>16}{'SQL':>12}")
+
+    try:
+        for name, report_class in REPORTS.items():
+            in_memory = await measure(args.repeat, lambda s: run_report(s, report_class(), query, 0))
+            chunked = await measure(
+                args.repeat, lambda s: run_report(s, report_class(), query, args.chunk_size)
+            )
+            sql = sql_queries(args.date_from, date_to)[name]
+            in_db = await measure(args.repeat, lambda s: s.execute(sql))
+            print(f"{name:<22}{in_memory:>13.1f} ms{chunked:>13.1f} ms{in_db:>9.1f} ms")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main())
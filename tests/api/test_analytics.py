@@ -0,0 +1,184 @@
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.analytics import rollups
+from app.analytics.models import DailySales, DirtyDay
+from app.analytics.rollups import backfill_rollups, mark_order_day_dirty, rebuild_rollups, refresh_dirty_days
+from app.core.config import settings
+from app.events.dispatcher import outbox_dispatcher
+from app.events.models import OutboxEvent
+
+
+@pytest.fixture
+async def place_order(
+    auth_client_non_admin,
+    non_admin_user,
+    cart_factory,
+    cart_item_factory,
+    order_create_data_factory,
+):
+    """Оформляет заказ пользователя из одного или нескольких товаров"""
+    cart = await cart_factory(user=non_admin_user)
+
+    async def _place(product, quantity, *more):
+        items = [(product, quantity), *zip(more[::2], more[1::2])]
+        for item_product, item_quantity in items:
+            await cart_item_factory(cart=cart, product=item_product, quantity=item_quantity)
+        resp = await auth_client_non_admin.post("/orders/create", json=order_create_data_factory())
+        assert resp.status_code == 201, resp.text
+        return resp.json()["id"]
+
+    return _place
+
+
+@pytest.mark.asyncio
+async def test_rollups_follow_order_changes(
+    auth_client_non_admin,
+    override_admin_dependency,
+    product_factory,
+    place_order,
+    db_session,
+):
+    """Итоги пересчитываются по событиям заказов: создание и отмена"""
+    cheap = await product_factory(price=10.0)
+    expensive = await product_factory(price=100.0)
+
+    first_id = await place_order(cheap, quantity=3)
+    await place_order(expensive, quantity=1)
+
+    await outbox_dispatcher.dispatch_batch(db_session)
+    assert await refresh_dirty_days(db_session) == 1
+    assert (await db_session.execute(select(DirtyDay))).first() is None
+
+    today = date.today().isoformat()
+    params = {"date_from": today, "date_to": today}
+
+    resp = await auth_client_non_admin.get("/analytics/sales/daily", params=params)
+    assert resp.status_code == 200
+    assert resp.json() == [{"day": today, "orders": 2, "units": 4, "revenue": 130.0}]
+
+    resp = await auth_client_non_admin.get("/analytics/sales/products", params=params)
+    top = [(row["product_id"], row["revenue"]) for row in resp.json()]
+    assert top == [(expensive.id, 100.0), (cheap.id, 30.0)]
+
+    resp = await auth_client_non_admin.get("/analytics/sales/categories", params=params)
+    assert len(resp.json()) == 1
+    assert resp.json()[0]["orders"] == 2
+    assert resp.json()[0]["category_name"] is not None
+
+    # отменённый заказ перестаёт считаться продажей
+    resp = await auth_client_non_admin.patch(f"/orders/{first_id}/cancel/")
+    assert resp.status_code == 200
+    await outbox_dispatcher.dispatch_batch(db_session)
+    await refresh_dirty_days(db_session)
+
+    resp = await auth_client_non_admin.get("/analytics/sales/daily", params=params)
+    assert resp.json() == [{"day": today, "orders": 1, "units": 1, "revenue": 100.0}]
+
+
+@pytest.mark.asyncio
+async def test_refresh_keeps_day_marked_during_rebuild(product_factory, place_order, db_session, monkeypatch):
+    """Отметка, поставленная во время пересчёта дня, не снимается вместе со старой"""
+    order_id = await place_order(await product_factory(price=10.0), quantity=1)
+    await outbox_dispatcher.dispatch_batch(db_session)
+
+    result = await db_session.execute(select(OutboxEvent).where(OutboxEvent.aggregate_id == order_id))
+    event = result.scalars().first()
+
+    async def rebuild_and_remark(session, date_from, date_to):
+        await rebuild_rollups(session, date_from, date_to)
+        await mark_order_day_dirty(event, session)
+
+    monkeypatch.setattr(rollups, "rebuild_rollups", rebuild_and_remark)
+    assert await refresh_dirty_days(db_session) == 1
+    assert (await db_session.execute(select(DirtyDay.day))).scalars().all() == [date.today()]
+
+    monkeypatch.setattr(rollups, "rebuild_rollups", rebuild_rollups)
+    assert await refresh_dirty_days(db_session) == 1
+    assert (await db_session.execute(select(DirtyDay))).first() is None
+
+
+@pytest.mark.asyncio
+async def test_backfill_rollups(product_factory, place_order, db_session):
+    product = await product_factory(price=25.0)
+    await place_order(product, quantity=2)
+
+    # сессии на соединении теста: коммиты пачек остаются внутри его транзакции
+    session_factory = async_sessionmaker(bind=db_session.bind, expire_on_commit=False)
+    today = date.today()
+    chunks = await backfill_rollups(
+        today - timedelta(days=9), today, chunk_days=4, session_factory=session_factory
+    )
+    assert chunks == 3
+
+    result = await db_session.execute(select(DailySales))
+    rows = result.scalars().all()
+    assert [(row.day, row.orders, float(row.revenue)) for row in rows] == [(today, 1, 50.0)]
+
+
+@pytest.mark.asyncio
+async def test_sales_report_validates_period(auth_client_non_admin, override_admin_dependency):
+    resp = await auth_client_non_admin.get(
+        "/analytics/sales/daily", params={"date_from": "2026-02-01", "date_to": "2026-01-01"}
+    )
+    assert resp.status_code == 400
+
+    resp = await auth_client_non_admin.get(
+        "/analytics/sales/daily", params={"date_from": "2020-01-01", "date_to": "2026-01-01"}
+    )
+    assert resp.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_sales_report_non_admin(auth_client_non_admin):
+    resp = await auth_client_non_admin.get(
+        "/analytics/sales/daily", params={"date_from": "2026-01-01", "date_to": "2026-01-31"}
+    )
+    assert resp.status_code == 403
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("chunk_size", [0, 2])
+async def test_numpy_reports(
+    auth_client_non_admin,
+    override_admin_dependency,
+    product_factory,
+    place_order,
+    monkeypatch,
+    chunk_size,
+):
+    """Отчёты совпадают в режиме «всё в памяти» и в режиме пачек, где заказ делится между пачками"""
+    monkeypatch.setattr(settings, "REPORTS_CHUNK_SIZE", chunk_size)
+    first = await product_factory(price=10.0)
+    second = await product_factory(price=50.0)
+
+    await place_order(first, 3)
+    await place_order(first, 1, second, 2)
+    cancelled_id = await place_order(second, 1)
+    resp = await auth_client_non_admin.patch(f"/orders/{cancelled_id}/cancel/")
+    assert resp.status_code == 200
+
+    today = date.today().isoformat()
+    params = {"date_from": today, "date_to": today}
+
+    resp = await auth_client_non_admin.get("/analytics/reports/top-sellers", params=params)
+    assert resp.status_code == 200
+    assert [(row["product_id"], row["units"], row["revenue"]) for row in resp.json()] == [
+        (second.id, 2, 100.0),
+        (first.id, 4, 40.0),
+    ]
+    assert resp.json()[0]["product_title"] == second.title
+
+    resp = await auth_client_non_admin.get("/analytics/reports/basket-size", params=params)
+    data = resp.json()
+    assert data["orders"] == 2
+    assert data["mean"] == 3.0
+    assert data["percentiles"] == {"p50": 3, "p90": 3, "p99": 3}
+    assert {"size": "3", "orders": 2} in data["histogram"]
+
+    resp = await auth_client_non_admin.get("/analytics/reports/category-conversion", params=params)
+    # оба товара в одной категории: три заказа, ни один ещё не доставлен
+    assert [(row["orders"], row["delivered"], row["conversion"]) for row in resp.json()] == [(3, 0, 0.0)]
@@ -1,7 +1,10 @@
 import pytest
+from fastapi import HTTPException, Response
 from httpx import AsyncClient
 
-from app.core.security import get_password_hash
+from app.auth.routers import login_rate_limit
+from app.core.rate_limit import MemoryRateLimitBackend, RateLimiter, parse_rate
+from app.core.security import create_access_token, get_password_hash
 from tests.helpers import assert_user_in_db
 
 
@@ -232,3 +235,50 @@ async def test_admin_endpoint_denied(
         json=data,
     )
     assert resp.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_login_rate_limited(
+    async_client: AsyncClient,
+    user_login_data_factory,
+    monkeypatch,
+):
+    """Превышение лимита попыток входа с одного IP"""
+    monkeypatch.setattr(login_rate_limit, "capacity", 2)
+    login_data = user_login_data_factory(username="nonexistent", password="Password123!")
+
+    for _ in range(2):
+        resp = await async_client.post("/auth/login", data=login_data)
+        assert resp.status_code == 401
+
+    resp = await async_client.post("/auth/login", data=login_data)
+    assert resp.status_code == 429
+    assert int(resp.headers["Retry-After"]) >= 1
+    assert resp.headers["RateLimit-Limit"] == "2"
+    assert resp.headers["RateLimit-Remaining"] == "0"
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_keyed_by_user(async_client: AsyncClient, user_factory):
+    """Токен пользователя даёт отдельную корзину, а не общую по IP"""
+    assert parse_rate("10/minute") == (10, 60)
+    assert parse_rate("100/5minutes") == (100, 300)
+
+    user = await user_factory()
+    token = create_access_token(user=user)
+    limiter = RateLimiter("test", rate="1/hour", backend=MemoryRateLimitBackend())
+
+    class _Request:
+        client = type("Client", (), {"host": "10.0.0.1"})()
+
+        def __init__(self, headers):
+            self.headers = headers
+
+    response = Response()
+    await limiter(_Request({}), response)
+    await limiter(_Request({"Authorization": f"Bearer {token}"}), response)
+    assert response.headers["RateLimit-Remaining"] == "0"
+
+    with pytest.raises(HTTPException) as exc:
+        await limiter(_Request({}), response)
+    assert exc.value.status_code == 429
@@ -1,3 +1,5 @@
+import asyncio
+
 import pytest
 
 from tests.helpers import assert_cart_item_in_db
@@ -88,6 +90,34 @@ async def test_add_product_twice_updates_quantity(
     assert resp.json()["quantity"] == 5
 
 
+@pytest.mark.asyncio
+async def test_add_product_idempotency_key(auth_client_non_admin, product_factory, cart_add_item_factory):
+    """Повторы с тем же Idempotency-Key, в том числе одновременные, не увеличивают количество"""
+    product = await product_factory(stock_quantity=10)
+    add_data = await cart_add_item_factory(product.id, quantity=2)
+    headers = {"Idempotency-Key": "add-1"}
+
+    first, second = await asyncio.gather(
+        auth_client_non_admin.post("/cart/add", json=add_data, headers=headers),
+        auth_client_non_admin.post("/cart/add", json=add_data, headers=headers),
+    )
+    assert first.status_code == second.status_code == 201
+    assert first.json() == second.json()
+
+    resp = await auth_client_non_admin.post("/cart/add", json=add_data, headers=headers)
+    assert resp.status_code == 201
+    assert resp.headers["Idempotent-Replayed"] == "true"
+    assert resp.json()["quantity"] == 2
+
+    # тот же ключ с другим телом запроса
+    add_data = await cart_add_item_factory(product.id, quantity=3)
+    resp = await auth_client_non_admin.post("/cart/add", json=add_data, headers=headers)
+    assert resp.status_code == 422
+
+    resp = await auth_client_non_admin.get("/cart/")
+    assert resp.json()[0]["quantity"] == 2
+
+
 @pytest.mark.asyncio
 async def test_update_product_quantity_success(
     auth_client_non_admin,
@@ -1,8 +1,13 @@
+import asyncio
+import contextlib
+
 import pytest
 from httpx import AsyncClient
 from sqlalchemy import select
 
-from app.categories.models import Category
+from app.categories.catalog import category_catalog
+from app.categories.models import Category, CategoryClosure
+from app.events.broker import pg_listener
 from tests.helpers import assert_category_in_db
 
 
@@ -54,6 +59,131 @@ async def test_get_category_by_id(
     assert data["name"] == cat2.name
 
 
+@pytest.mark.asyncio
+async def test_get_categories_from_snapshot(
+    async_client: AsyncClient,
+    category_factory,
+    override_admin_dependency,
+    monkeypatch,
+):
+    """Чтения идут из снимка в памяти; изменение через API подменяет снимок"""
+    category = await category_factory()
+    other = await category_factory()
+
+    reloads = []
+    reload = category_catalog._reload
+
+    async def _counting_reload():
+        reloads.append(1)
+        await reload()
+
+    monkeypatch.setattr(category_catalog, "_reload", _counting_reload)
+
+    assert [c["id"] for c in (await async_client.get("/category/")).json()] == [category.id, other.id]
+    assert [c["id"] for c in (await async_client.get("/category/?offset=1")).json()] == [other.id]
+    resp = await async_client.get(f"/category/{category.id}")
+    assert resp.json()["name"] == category.name
+    assert len(reloads) == 1
+
+    resp = await async_client.patch(f"/category/{category.id}", json={"name": "Новое название"})
+    assert resp.status_code == 200
+    resp = await async_client.get(f"/category/{category.id}")
+    assert resp.json()["name"] == "Новое название"
+
+    resp = await async_client.delete(f"/category/{other.id}")
+    assert resp.status_code == 204
+    resp = await async_client.get(f"/category/{other.id}")
+    assert resp.status_code == 404
+    assert [c["id"] for c in (await async_client.get("/category/")).json()] == [category.id]
+    assert len(reloads) == 3
+
+
+@pytest.mark.asyncio
+async def test_catalog_resynced_after_listen_connect(async_engine, monkeypatch):
+    """После (пере)подключения LISTEN снимок перечитывается - NOTIFY без соединения теряются"""
+    version = (await category_catalog.get()).version
+
+    monkeypatch.setattr(pg_listener, "engine", async_engine)
+    listener = asyncio.create_task(pg_listener.run())
+    try:
+        for _ in range(100):
+            snapshot = await category_catalog.get()
+            if snapshot.version > version:
+                break
+            await asyncio.sleep(0.02)
+        assert snapshot.version == version + 1
+    finally:
+        listener.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await listener
+
+
+@pytest.mark.asyncio
+async def test_category_tree(
+    async_client: AsyncClient,
+    category_payload_factory,
+    override_admin_dependency,
+    db_session,
+):
+    """Подкатегории: дерево, перенос поддерева, защита от циклов и удаления родителя"""
+
+    async def create(name, parent_id=None):
+        resp = await async_client.post("/category/", json=category_payload_factory(name, parent_id=parent_id))
+        assert resp.status_code == 201, resp.text
+        return resp.json()["id"]
+
+    electronics = await create("Электроника")
+    phones = await create("Телефоны", electronics)
+    smartphones = await create("Смартфоны", phones)
+    books = await create("Книги")
+
+    resp = await async_client.get("/category/tree")
+    assert resp.status_code == 200
+    assert resp.json() == [
+        {
+            "id": electronics,
+            "name": "Электроника",
+            "children": [
+                {
+                    "id": phones,
+                    "name": "Телефоны",
+                    "children": [{"id": smartphones, "name": "Смартфоны", "children": []}],
+                }
+            ],
+        },
+        {"id": books, "name": "Книги", "children": []},
+    ]
+
+    resp = await async_client.patch(f"/category/{electronics}", json={"parent_id": smartphones})
+    assert resp.status_code == 400
+
+    # переносим "Телефоны" вместе со "Смартфонами" в "Книги"
+    resp = await async_client.patch(f"/category/{phones}", json={"parent_id": books})
+    assert resp.status_code == 200
+    assert resp.json()["parent_id"] == books
+
+    result = await db_session.execute(
+        select(CategoryClosure.ancestor_id, CategoryClosure.depth).where(
+            CategoryClosure.descendant_id == smartphones
+        )
+    )
+    assert sorted(result.all()) == sorted([(smartphones, 0), (phones, 1), (books, 2)])
+
+    tree = (await async_client.get("/category/tree")).json()
+    assert [node["children"] for node in tree if node["id"] == electronics] == [[]]
+
+    resp = await async_client.patch(f"/category/{phones}", json={"parent_id": None})
+    assert resp.status_code == 200
+    resp = await async_client.delete(f"/category/{books}")
+    assert resp.status_code == 204
+
+    # ошибки внешних ключей откатывают транзакцию теста - проверки в конце
+    resp = await async_client.delete(f"/category/{phones}")
+    assert resp.status_code == 409
+    resp = await async_client.post("/category/", json=category_payload_factory(parent_id=999999))
+    assert resp.status_code == 404
+
+
 @pytest.mark.asyncio
 async def test_get_category_by_invalid_id(
     async_client: AsyncClient,
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.deadline import Deadline, DeadlineMiddleware, deadline_var, is_query_canceled
+from app.orders.routers import by_status_deadline
+from app.orders.services import OrderService
+
+
+@pytest.mark.asyncio
+async def test_route_deadline_returns_504(
+    auth_client_non_admin: AsyncClient,
+    non_admin_user,
+    db_session,
+    monkeypatch,
+):
+    # выборка по статусу среди всех заказов доступна только админу
+    non_admin_user.is_admin = True
+    await db_session.commit()
+
+    async def slow_orders(self, *args, **kwargs):
+        await asyncio.sleep(5)
+
+    monkeypatch.setattr(by_status_deadline, "timeout", 0.1)
+    monkeypatch.setattr(OrderService, "get_orders_by_status", slow_orders)
+
+    resp = await auth_client_non_admin.get("/orders/", params={"status": "pending"})
+    assert resp.status_code == 504
+    assert resp.json()["detail"] == "Превышено время обработки запроса"
+    assert "X-Request-ID" in resp.headers
+
+
+@pytest.mark.asyncio
+async def test_deadline_sets_statement_timeout(async_engine):
+    deadline = Deadline(0.1)
+    token = deadline_var.set(deadline)
+    try:
+        async with AsyncSession(async_engine) as session:
+            with pytest.raises(DBAPIError) as exc:
+                await session.execute(text("SELECT pg_sleep(2)"))
+    finally:
+        deadline_var.reset(token)
+
+    assert is_query_canceled(exc.value)
+    assert deadline.timed_out
+
+
+@pytest.mark.asyncio
+async def test_client_disconnect_cancels_handler():
+    cancelled = asyncio.Event()
+
+    async def app(scope, receive, send):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def receive():
+        await asyncio.sleep(0.05)
+        return {"type": "http.disconnect"}
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/orders/pending/", "headers": []}
+    await asyncio.wait_for(DeadlineMiddleware(app, timeout=10)(scope, receive, send), timeout=1)
+
+    assert cancelled.is_set()
+    assert sent == []
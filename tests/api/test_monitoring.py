@@ -0,0 +1,263 @@
+import asyncio
+import time
+
+import pytest
+from httpx import AsyncClient
+
+from app.core.admission import AdaptiveLimiter, Rejected, admission_controller
+from app.monitoring.profiler import HEADER_PROFILE_KEY, SamplingProfiler, profiler
+from app.monitoring.slow_queries import normalize_sql, parameter_shape, slow_query_log
+from app.monitoring.tracing import parse_traceparent
+
+
+@pytest.fixture
+def reset_profiler():
+    yield
+    profiler.configure(enabled=False)
+    profiler.reset()
+
+
+@pytest.mark.asyncio
+async def test_profiler_requires_admin(
+    auth_client_non_admin: AsyncClient,
+):
+    resp = await auth_client_non_admin.get("/monitoring/profiler")
+    assert resp.status_code == 403
+
+    resp = await auth_client_non_admin.put("/monitoring/profiler", json={"enabled": True})
+    assert resp.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_profiler_configure(
+    async_client: AsyncClient,
+    override_admin_dependency,
+    reset_profiler,
+):
+    resp = await async_client.put(
+        "/monitoring/profiler",
+        json={"enabled": True, "route": "/products/{product_id}", "sample_rate": 0.5, "interval_ms": 2},
+    )
+    assert resp.status_code == 200, resp.text
+    data = resp.json()
+
+    assert data["enabled"] is True
+    assert data["route"] == "/products/{product_id}"
+    assert data["sample_rate"] == 0.5
+    assert data["interval_ms"] == 2
+
+    resp = await async_client.get("/monitoring/profiler")
+    assert resp.status_code == 200
+    assert resp.json()["enabled"] is True
+
+
+@pytest.mark.asyncio
+async def test_profiler_stacks_by_header(
+    async_client: AsyncClient,
+    override_admin_dependency,
+    reset_profiler,
+):
+    await async_client.put("/monitoring/profiler", json={"enabled": True, "interval_ms": 1})
+
+    resp = await async_client.get("/", headers={"X-Profile": "1"})
+    assert resp.status_code == 200
+
+    resp = await async_client.get("/monitoring/profiler/stacks")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+
+    resp = await async_client.delete("/monitoring/profiler/stacks")
+    assert resp.status_code == 204
+    assert profiler.stats() == {}
+
+
+@pytest.mark.asyncio
+async def test_profiler_samples_busy_task():
+    sampler = SamplingProfiler(interval=0.001)
+
+    def busy_loop(seconds):
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            pass
+
+    async def handler():
+        sampler.register(asyncio.current_task(), HEADER_PROFILE_KEY)
+        try:
+            busy_loop(0.1)
+        finally:
+            sampler.unregister(asyncio.current_task())
+
+    await asyncio.create_task(handler())
+
+    assert sampler.stats()[HEADER_PROFILE_KEY] > 0
+    collapsed = sampler.collapsed(HEADER_PROFILE_KEY)
+    stack, count = collapsed.splitlines()[0].rsplit(" ", 1)
+    assert "busy_loop" in stack
+    assert int(count) > 0
+
+
+@pytest.fixture
+def log_all_queries():
+    threshold = slow_query_log.threshold_ms
+    slow_query_log.threshold_ms = 0
+    slow_query_log.reset()
+    yield
+    slow_query_log.threshold_ms = threshold
+    slow_query_log.reset()
+
+
+@pytest.mark.asyncio
+async def test_slow_queries_correlated_with_request(
+    async_client: AsyncClient,
+    override_admin_dependency,
+    log_all_queries,
+    product_factory,
+):
+    product = await product_factory()
+    slow_query_log.reset()
+
+    resp = await async_client.get(f"/products/{product.id}", headers={"X-Request-ID": "req-123"})
+    assert resp.status_code == 200
+    assert resp.headers["X-Request-ID"] == "req-123"
+
+    resp = await async_client.get("/monitoring/slow-queries/recent")
+    assert resp.status_code == 200
+    entries = [entry for entry in resp.json() if entry["request_id"] == "req-123"]
+
+    assert entries
+    assert all(entry["route"] == "/products/{product_id}" for entry in entries)
+    product_query = next(entry for entry in entries if "FROM products" in entry["statement"])
+    assert str(product.id) not in product_query["statement"]
+    assert product_query["rows"] == 1
+
+    resp = await async_client.get("/monitoring/slow-queries?limit=5")
+    assert resp.status_code == 200
+    top = resp.json()
+    assert 0 < len(top) <= 5
+    assert top[0]["total_ms"] >= top[-1]["total_ms"]
+
+
+def test_normalize_sql():
+    assert normalize_sql("SELECT *\n  FROM t WHERE id = $1::INTEGER AND name = 'x' LIMIT 10") == (
+        "SELECT * FROM t WHERE id = ? AND name = ? LIMIT ?"
+    )
+    assert normalize_sql("SELECT * FROM t WHERE id IN ($1, $2, $3)") == "SELECT * FROM t WHERE id IN (...)"
+    assert parameter_shape((1, "a", [1, 2])) == "(int, str, list[2])"
+    assert parameter_shape([(1, 2), (3, 4)], executemany=True) == "2x(int, int)"
+
+
+@pytest.mark.asyncio
+async def test_tracing_breaks_down_checkout(
+    auth_client_non_admin: AsyncClient,
+    non_admin_user,
+    product_factory,
+    cart_item_factory,
+    order_create_data_factory,
+    override_admin_dependency,
+):
+    product = await product_factory()
+    await cart_item_factory(user=non_admin_user, product=product)
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+
+    resp = await auth_client_non_admin.post(
+        "/orders/create",
+        json=order_create_data_factory(),
+        headers={"traceparent": f"00-{trace_id}-00f067aa0ba902b7-01"},
+    )
+    assert resp.status_code == 201
+    assert resp.headers["traceparent"].startswith(f"00-{trace_id}-")
+
+    resp = await auth_client_non_admin.get(f"/monitoring/traces/{trace_id}")
+    assert resp.status_code == 200
+    spans = resp.json()
+    names = {span["name"] for span in spans}
+
+    root = next(span for span in spans if span["kind"] == "server")
+    assert root["name"] == "POST /orders/create"
+    assert root["parent_id"] == "00f067aa0ba902b7"
+    assert "OrderService.create_order" in names
+    assert "validate_non_empty_cart" in names
+    assert "OrderService._create_order_item_from_cart" in names
+    assert any(span["kind"] == "client" and span["attributes"]["db.statement"] for span in spans)
+
+    resp = await auth_client_non_admin.get("/monitoring/traces?limit=50")
+    assert resp.status_code == 200
+    assert trace_id in {trace["trace_id"] for trace in resp.json()}
+
+
+def test_parse_traceparent():
+    assert parse_traceparent("00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01") == (
+        "4bf92f3577b34da6a3ce929d0e0e4736",
+        "00f067aa0ba902b7",
+        True,
+    )
+    assert parse_traceparent("00-00000000000000000000000000000000-00f067aa0ba902b7-01") is None
+    assert parse_traceparent("garbage") is None
+
+
+@pytest.mark.asyncio
+async def test_admission_rejects_when_queue_full(
+    async_client: AsyncClient,
+    override_admin_dependency,
+    monkeypatch,
+):
+    limiter = admission_controller.limiters["catalog_read"]
+    monkeypatch.setattr(limiter, "in_flight", int(limiter.limit))
+    monkeypatch.setattr(limiter, "queue_size", 0)
+
+    resp = await async_client.get("/products/")
+    assert resp.status_code == 503
+    assert int(resp.headers["Retry-After"]) >= 1
+
+    # остальные классы маршрутов не затронуты
+    resp = await async_client.get("/monitoring/admission")
+    assert resp.status_code == 200
+    assert resp.json()["catalog_read"]["rejected"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_adaptive_limiter_queue_and_aimd():
+    limiter = AdaptiveLimiter(limit=1, target_latency=0.1, queue_size=1, queue_timeout=0.05)
+
+    await limiter.acquire()
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    assert limiter.queued == 1
+
+    # очередь полна - третий запрос отклоняется сразу
+    with pytest.raises(Rejected):
+        await limiter.acquire()
+
+    # освобождённый слот передаётся ожидающему
+    limiter.release(latency=0.01)
+    await waiter
+    assert limiter.in_flight == 1
+
+    # медленный ответ уменьшает лимит, но не ниже min_limit
+    limit_before = limiter.limit
+    limiter.release(latency=1)
+    assert limiter.limit <= limit_before
+    assert limiter.in_flight == 0
+
+    # в очереди никто не освобождает слот - ожидание завершается по таймауту
+    limiter.in_flight = int(limiter.limit)
+    with pytest.raises(Rejected):
+        await limiter.acquire()
+    assert limiter.queued == 0
+
+
+def test_adaptive_limiter_decreases_once_per_burst():
+    limiter = AdaptiveLimiter(limit=64, target_latency=0.1)
+    limiter.in_flight = 32
+
+    # пачка медленных ответов от запросов, начатых до уменьшения, - один шаг вниз
+    for _ in range(32):
+        limiter.release(latency=1)
+    assert limiter.limit == pytest.approx(64 * limiter.backoff)
+    assert limiter.in_flight == 0
+
+    # медленный запрос, начатый после уменьшения, снижает лимит снова
+    limiter._last_decrease -= 10
+    limiter.in_flight = 1
+    limiter.release(latency=1)
+    assert limiter.limit == pytest.approx(64 * limiter.backoff**2)
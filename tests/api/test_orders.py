@@ -1,10 +1,23 @@
 import pytest
 from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
 
 from app.cart.models import Cart, CartItem
+from app.core.counting import row_counter
+from app.events.broker import EventBroker
+from app.events.dispatcher import OutboxDispatcher, outbox_dispatcher
+from app.events.models import OutboxEvent
 from app.orders.models import Order
 from app.orders.schemas import OrderStatus, PaymentStatus
+from app.orders.services import get_order_events_stream_service
+from app.orders.streaming import (
+    OrderEventMessage,
+    get_missed_order_events,
+    order_event_broker,
+    stream_order_events,
+)
 from app.products.models import Product
+from app.products.stock import StockSubscriber, stock_feed
 
 
 @pytest.mark.asyncio
@@ -130,6 +143,305 @@ async def test_create_order_success(
     assert data["order_items"][0]["product_title"] == "Test Product"
 
 
+@pytest.mark.asyncio
+async def test_create_order_idempotent_retry(
+    auth_client_non_admin,
+    non_admin_user,
+    product_factory,
+    cart_item_factory,
+    order_create_data_factory,
+    db_session,
+):
+    """Повтор создания заказа с тем же Idempotency-Key возвращает первый заказ"""
+    product = await product_factory()
+    await cart_item_factory(user=non_admin_user, product=product)
+
+    order_create_data = order_create_data_factory()
+    headers = {"Idempotency-Key": "order-1"}
+    first = await auth_client_non_admin.post("/orders/create", json=order_create_data, headers=headers)
+    assert first.status_code == 201
+
+    retry = await auth_client_non_admin.post("/orders/create", json=order_create_data, headers=headers)
+    assert retry.status_code == 201
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+
+    result = await db_session.execute(select(Order).where(Order.user_id == non_admin_user.id))
+    assert len(result.scalars().all()) == 1
+
+
+@pytest.mark.asyncio
+async def test_order_lifecycle_writes_outbox_events(
+    auth_client_non_admin,
+    non_admin_user,
+    product_factory,
+    cart_item_factory,
+    order_create_data_factory,
+    override_admin_dependency,
+    db_session,
+):
+    """Создание и смена статуса заказа пишут события в outbox, диспетчер их доставляет"""
+    product = await product_factory()
+    await cart_item_factory(user=non_admin_user, product=product)
+
+    resp = await auth_client_non_admin.post("/orders/create", json=order_create_data_factory())
+    assert resp.status_code == 201
+    order_id = resp.json()["id"]
+
+    resp = await auth_client_non_admin.patch(f"/orders/{order_id}/status", json={"status": "confirmed"})
+    assert resp.status_code == 200
+
+    result = await db_session.execute(
+        select(OutboxEvent).where(OutboxEvent.aggregate_id == order_id).order_by(OutboxEvent.id)
+    )
+    events = result.scalars().all()
+    assert [event.event_type for event in events] == ["order.created", "order.status_changed"]
+    assert events[1].payload["old_status"] == "pending"
+    assert events[1].payload["new_status"] == "confirmed"
+
+    dispatcher = OutboxDispatcher(batch_size=10)
+    received = []
+
+    @dispatcher.register("order.created")
+    async def on_created(event, session):
+        received.append(event.event_type)
+
+    @dispatcher.register("order.status_changed")
+    async def on_status_changed(event, session):
+        raise RuntimeError("downstream unavailable")
+
+    assert await dispatcher.dispatch_batch(db_session) >= 2
+    assert received == ["order.created"]
+
+    for event in events:
+        await db_session.refresh(event)
+    assert events[0].processed_at is not None
+    # неудачная обработка откладывает событие для повторной попытки
+    assert events[1].processed_at is None
+    assert events[1].attempts == 1
+    assert "downstream unavailable" in events[1].last_error
+
+
+@pytest.mark.asyncio
+async def test_order_status_transitions(
+    auth_client_non_admin,
+    non_admin_user,
+    product_factory,
+    cart_item_factory,
+    order_create_data_factory,
+    override_admin_dependency,
+    db_session,
+):
+    """Полный путь заказа через PATCH /orders/{id}/status: метки времени и оплата"""
+    product = await product_factory()
+    await cart_item_factory(user=non_admin_user, product=product)
+    resp = await auth_client_non_admin.post("/orders/create", json=order_create_data_factory())
+    order_id = resp.json()["id"]
+
+    # пропустить шаг нельзя
+    resp = await auth_client_non_admin.patch(f"/orders/{order_id}/status", json={"status": "shipped"})
+    assert resp.status_code == 400
+    assert "Текущий статус pending" in resp.json()["detail"]
+
+    for new_status in ("confirmed", "processing", "shipped"):
+        resp = await auth_client_non_admin.patch(f"/orders/{order_id}/status", json={"status": new_status})
+        assert resp.status_code == 200
+        assert resp.json()["order_status"] == new_status
+
+    assert resp.json()["shipped_at"] is not None
+    assert resp.json()["payment_status"] == "pending"
+
+    resp = await auth_client_non_admin.patch(f"/orders/{order_id}/status", json={"status": "delivered"})
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["delivered_at"] is not None
+    assert data["payment_status"] == "completed"
+    assert data["paid_at"] is not None
+
+    # доставленный заказ отменить нельзя
+    resp = await auth_client_non_admin.patch(f"/orders/{order_id}/cancel/")
+    assert resp.status_code == 400
+
+    result = await db_session.execute(
+        select(OutboxEvent.event_type).where(OutboxEvent.aggregate_id == order_id).order_by(OutboxEvent.id)
+    )
+    assert result.scalars().all() == [
+        "order.created",
+        "order.status_changed",
+        "order.status_changed",
+        "order.status_changed",
+        "order.status_changed",
+        "order.payment_status_changed",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_order_status_transition_errors(
+    auth_client_non_admin,
+    override_admin_dependency,
+    order_factory,
+    user_factory,
+):
+    """Переход несуществующего заказа, в недопустимый статус и отмена чужого заказа"""
+    resp = await auth_client_non_admin.patch("/orders/999999/status", json={"status": "confirmed"})
+    assert resp.status_code == 404
+
+    other_order = await order_factory(user=await user_factory())
+
+    resp = await auth_client_non_admin.patch(f"/orders/{other_order.id}/status", json={"status": "pending"})
+    assert resp.status_code == 400
+
+    resp = await auth_client_non_admin.patch(f"/orders/{other_order.id}/cancel/")
+    assert resp.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_get_orders_filtered_by_status(
+    auth_client_non_admin,
+    non_admin_user,
+    order_factory,
+    user_factory,
+    db_session,
+):
+    """GET /orders/?status=: пользователю - свои заказы, админу - заказы всех пользователей"""
+    own = await order_factory(user=non_admin_user, order_status=OrderStatus.CONFIRMED)
+    await order_factory(user=non_admin_user, order_status=OrderStatus.PENDING)
+    other = await order_factory(user=await user_factory(), order_status=OrderStatus.CONFIRMED)
+
+    resp = await auth_client_non_admin.get("/orders/", params={"status": "confirmed"})
+    assert resp.status_code == 200
+    assert [order["id"] for order in resp.json()] == [own.id]
+
+    non_admin_user.is_admin = True
+    await db_session.commit()
+
+    resp = await auth_client_non_admin.get("/orders/", params={"status": "confirmed"})
+    assert resp.status_code == 200
+    assert {order["id"] for order in resp.json()} == {own.id, other.id}
+
+    row_counter.clear()
+    resp = await auth_client_non_admin.get(
+        "/orders/", params={"status": "confirmed", "limit": 1, "count": "exact"}
+    )
+    assert len(resp.json()) == 1
+    assert resp.headers["X-Total-Count"] == "2"
+    resp = await auth_client_non_admin.get("/orders/", params={"count": "estimated"})
+    assert resp.headers["X-Total-Count"] == "2"
+
+
+@pytest.mark.asyncio
+async def test_get_orders_sparse_fields(
+    auth_client_non_admin,
+    non_admin_user,
+    order_factory,
+):
+    """GET /orders/?fields=: только запрошенные поля, адрес и позиции - только по запросу"""
+    order = await order_factory(user=non_admin_user)
+
+    row_counter.clear()
+    params = {"fields": "total,order_status", "count": "exact"}
+    resp = await auth_client_non_admin.get("/orders/", params=params)
+    assert resp.status_code == 200
+    assert resp.json() == [{"id": order.id, "total": 200.0, "order_status": "pending"}]
+    assert resp.headers["X-Total-Count"] == "1"
+
+    resp = await auth_client_non_admin.get("/orders/", params={"fields": "delivery_address"})
+    assert resp.json()[0]["delivery_address"]["city"] == "Test City"
+    assert set(resp.json()[0]) == {"id", "delivery_address"}
+
+    resp = await auth_client_non_admin.get("/orders/", params={"fields": "total,user_password"})
+    assert resp.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_order_events_stream(
+    auth_client_non_admin,
+    non_admin_user,
+    product_factory,
+    cart_item_factory,
+    order_create_data_factory,
+    override_admin_dependency,
+    db_session,
+):
+    """SSE: досылка пропущенного по Last-Event-ID, затем живые события и heartbeat"""
+    product = await product_factory()
+    await cart_item_factory(user=non_admin_user, product=product)
+    resp = await auth_client_non_admin.post("/orders/create", json=order_create_data_factory())
+    order_id = resp.json()["id"]
+    await auth_client_non_admin.patch(f"/orders/{order_id}/status", json={"status": "confirmed"})
+
+    result = await db_session.execute(select(OutboxEvent.id).where(OutboxEvent.aggregate_id == order_id))
+    created_id = min(result.scalars().all())
+
+    subscription = order_event_broker.subscribe(non_admin_user.id)
+    missed = await get_missed_order_events(db_session, user_id=non_admin_user.id, last_event_id=created_id)
+    assert [message.event for message in missed] == ["order.status_changed"]
+
+    stream = stream_order_events(subscription, missed, last_event_id=created_id, heartbeat=0.05)
+    assert (await anext(stream)).startswith("retry:")
+    assert '"new_status": "confirmed"' in await anext(stream)
+
+    await auth_client_non_admin.patch(f"/orders/{order_id}/cancel/")
+    await outbox_dispatcher.dispatch_batch(db_session)
+
+    # уже отправленные при досылке события не дублируются
+    chunk = await anext(stream)
+    assert chunk.startswith("id: ")
+    assert '"new_status": "cancelled"' in chunk
+    # отмена неоплаченного заказа меняет и статус оплаты
+    assert "event: order.payment_status_changed" in await anext(stream)
+    assert await anext(stream) == ": ping\n\n"
+
+    # событие с меньшим id, опубликованное позже, доставляется, повтор - нет
+    late = OrderEventMessage(id=created_id - 1, event="order.status_changed", data={"order_id": order_id})
+    order_event_broker.publish(non_admin_user.id, late)
+    assert (await anext(stream)).startswith(f"id: {late.id}\n")
+    order_event_broker.publish(non_admin_user.id, late)
+    assert await anext(stream) == ": ping\n\n"
+
+    await stream.aclose()
+    order_event_broker.unsubscribe(subscription)
+    assert order_event_broker.subscriber_count() == 0
+
+    # досылка повторяет события, обработанные вместе с последним полученным
+    result = await db_session.execute(select(OutboxEvent.id).where(OutboxEvent.aggregate_id == order_id))
+    missed = await get_missed_order_events(
+        db_session, user_id=non_admin_user.id, last_event_id=max(result.scalars().all())
+    )
+    assert "order.created" in [message.event for message in missed]
+
+
+@pytest.mark.asyncio
+async def test_order_events_stream_skips_last_event_id(non_admin_user, db_session):
+    """Живое событие с ID из Last-Event-ID клиенту повторно не отправляется"""
+    last_event_id = 10**9
+    subscription = order_event_broker.subscribe(non_admin_user.id)
+    stream = await get_order_events_stream_service(
+        user=non_admin_user, subscription=subscription, session=db_session, last_event_id=last_event_id
+    )
+    try:
+        assert (await anext(stream)).startswith("retry:")
+        for event_id in (last_event_id, last_event_id + 1):
+            message = OrderEventMessage(id=event_id, event="order.status_changed", data={})
+            order_event_broker.publish(non_admin_user.id, message)
+        assert (await anext(stream)).startswith(f"id: {last_event_id + 1}\n")
+    finally:
+        await stream.aclose()
+        order_event_broker.unsubscribe(subscription)
+
+
+def test_event_broker_closes_slow_subscription():
+    broker = EventBroker(queue_size=2)
+    subscription = broker.subscribe(1)
+
+    assert broker.publish(1, "a") == 1
+    assert broker.publish(1, "b") == 1
+    # очередь переполнена - подписка закрывается, клиент переподключится с Last-Event-ID
+    assert broker.publish(1, "c") == 0
+    assert subscription.closed
+    assert broker.subscriber_count() == 0
+
+
 @pytest.mark.asyncio
 async def test_create_order_insufficient_stock(
     auth_client_non_admin,
@@ -220,6 +532,31 @@ async def test_create_order_reserves_products(
     assert updated_product.stock_quantity == 10
 
 
+@pytest.mark.asyncio
+async def test_create_order_pushes_available_stock(
+    auth_client_non_admin,
+    non_admin_user,
+    product_factory,
+    cart_item_factory,
+    order_create_data_factory,
+    db_session,
+):
+    """Резерв при оформлении заказа рассылается подписчикам остатков"""
+    product = await product_factory()
+    await cart_item_factory(user=non_admin_user, product=product, quantity=4)
+
+    subscriber = StockSubscriber()
+    stock_feed.subscribe(subscriber, [product.id])
+    try:
+        resp = await auth_client_non_admin.post("/orders/create", json=order_create_data_factory())
+        assert resp.status_code == 201
+
+        await stock_feed.flush(db_session)
+        assert await subscriber.get() == {product.id: 6}
+    finally:
+        stock_feed.unsubscribe(subscriber)
+
+
 @pytest.mark.asyncio
 async def test_create_order_clears_cart(
     auth_client_non_admin,
@@ -292,3 +629,49 @@ async def test_create_order_unauthorized(
     order_create_data = order_create_data_factory()
     resp = await async_client.post("/orders/create", json=order_create_data)
     assert resp.status_code == 401
+
+
+@pytest.fixture
+def lagging_replica(async_engine, monkeypatch):
+    """Реплика, которая не видит данные теста: они живут в незакоммиченной внешней транзакции"""
+    from app.core.database import replica_router
+
+    monkeypatch.setattr(replica_router, "session_factory", async_sessionmaker(async_engine))
+    monkeypatch.setattr(replica_router, "lag_check_interval", float("inf"))
+    monkeypatch.setattr(replica_router, "_lag_checked_at", 0.0)
+    monkeypatch.setattr(replica_router, "_lag", 0.0)
+    monkeypatch.setattr(replica_router, "_sticky_until", {})
+
+    return replica_router
+
+
+@pytest.mark.asyncio
+async def test_get_orders_read_your_writes(
+    auth_client_non_admin,
+    non_admin_user,
+    product_factory,
+    cart_item_factory,
+    order_create_data_factory,
+    lagging_replica,
+):
+    """После создания заказа чтения пользователя идут в основную БД, а не в отстающую реплику"""
+    product = await product_factory()
+    await cart_item_factory(user=non_admin_user, product=product)
+
+    resp = await auth_client_non_admin.post("/orders/create", json=order_create_data_factory())
+    assert resp.status_code == 201
+    assert lagging_replica.is_sticky(non_admin_user.id)
+
+    resp = await auth_client_non_admin.get("/orders/")
+    assert resp.status_code == 200
+    assert len(resp.json()) == 1
+
+    # окно read-your-writes закончилось - чтение уходит в реплику, где заказа ещё нет
+    lagging_replica._sticky_until.clear()
+    resp = await auth_client_non_admin.get("/orders/")
+    assert resp.status_code == 404
+
+    # реплика отстаёт больше порога - чтение возвращается в основную БД
+    lagging_replica._lag = lagging_replica.max_lag + 1
+    resp = await auth_client_non_admin.get("/orders/")
+    assert resp.status_code == 200
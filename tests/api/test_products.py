@@ -1,11 +1,43 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
 import pytest
 from httpx import AsyncClient
-from sqlalchemy import select
-
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.counting import row_counter
+from app.main import app
+from app.orders.models import OrderItem
+from app.orders.schemas import OrderStatus
+from app.products.facets import facet_index
+from app.products.helpers import build_product_query_with_filters
 from app.products.models import Product
+from app.products.popularity import POPULARITY_LOCK, refresh_popularity_scores
+from app.products.recommendations import RECOMMENDATIONS_LOCK, rebuild_recommendations
+from app.products.stock import StockSubscriber, stock_feed
+from app.products.suggest import suggest_index
 from tests.helpers import assert_product_in_db
 
 
+async def place_order(order_factory, db_session, quantities, **kwargs):
+    """Заказ с позициями {товар: количество} в обход корзины"""
+    order = await order_factory(**kwargs)
+    db_session.add_all(
+        OrderItem(
+            order_id=order.id,
+            product_id=product.id,
+            product_title=product.title,
+            product_price=product.price,
+            quantity=quantity,
+        )
+        for product, quantity in quantities.items()
+    )
+    await db_session.commit()
+    return order
+
+
 @pytest.mark.asyncio
 async def test_get_product(
     async_client: AsyncClient,
@@ -51,6 +83,251 @@ async def test_get_products_sorted(
     assert prices == {20.0, 10.0}
 
 
+@pytest.mark.asyncio
+async def test_get_products_sorted_by_popularity(
+    async_client: AsyncClient,
+    product_factory,
+    order_factory,
+    user_factory,
+    db_session,
+):
+    """sort=popular: недавние продажи весят больше старых, отменённые заказы не считаются"""
+    user = await user_factory()
+    recent, old, cancelled, unsold = [await product_factory() for _ in range(4)]
+    await place_order(order_factory, db_session, {recent: 2, old: 1}, user=user)
+    # 5 штук два месяца назад весят меньше 2 штук сегодня (период полураспада 14 дней)
+    two_months_ago = datetime.now() - timedelta(days=60)
+    await place_order(order_factory, db_session, {old: 5}, user=user, created_at=two_months_ago)
+    await place_order(
+        order_factory, db_session, {cancelled: 10}, user=user, order_status=OrderStatus.CANCELLED
+    )
+
+    assert await refresh_popularity_scores(db_session, lookback_days=90, half_life_days=14) == 2
+    await db_session.commit()
+
+    resp = await async_client.get("/products/", params={"sort": "popular"})
+    assert resp.status_code == 200
+    assert [p["id"] for p in resp.json()] == [recent.id, old.id, cancelled.id, unsold.id]
+
+    resp = await async_client.get("/products/", params={"sort": "popular", "sort_price": "asc"})
+    assert resp.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_get_products_filters_and_facets(
+    async_client: AsyncClient,
+    category,
+    category_factory,
+    product_factory,
+    product_payload_factory,
+    override_admin_dependency,
+    db_session,
+    monkeypatch,
+):
+    """Фильтры по категориям, цене и наличию; фасеты пересчитываются после изменения товара"""
+    other = await category_factory()
+    await product_factory(price=100.0, stock_quantity=5)
+    await product_factory(price=700.0, stock_quantity=0)
+    expensive = Product(**product_payload_factory(category_id=other.id, price=1200.0, stock_quantity=3))
+    reserved = Product(**product_payload_factory(category_id=other.id, price=300.0, stock_quantity=2))
+    reserved.reserved = 2
+    db_session.add_all([expensive, reserved])
+    await db_session.commit()
+
+    monkeypatch.setattr(facet_index, "session_factory", async_sessionmaker(bind=db_session.bind))
+    monkeypatch.setattr(facet_index, "reload_interval", 0)
+    facet_index.mark_stale()
+
+    resp = await async_client.get(
+        "/products/",
+        params={"category_ids": [category.id, other.id], "min_price": 200, "in_stock": True},
+    )
+    assert resp.status_code == 200
+    assert [p["id"] for p in resp.json()] == [expensive.id]
+
+    resp = await async_client.get("/products/", params={"min_price": 500, "max_price": 100})
+    assert resp.status_code == 400
+    # несуществующая категория - 404, но проверяется только когда страница пуста
+    resp = await async_client.get("/products/", params={"category_ids": [other.id, 999999], "max_price": 10})
+    assert resp.status_code == 404
+    resp = await async_client.get("/products/", params={"category_ids": [other.id, 999999]})
+    assert resp.status_code == 200
+    assert {p["id"] for p in resp.json()} == {expensive.id, reserved.id}
+
+    params = {"category_ids": [category.id], "max_price": 1000, "in_stock": True}
+    resp = await async_client.get("/products/facets", params=params)
+    assert resp.status_code == 200
+    facets = resp.json()
+    assert facets["total"] == 1
+    # фильтр по категориям не сужает счётчики категорий, но дорогой товар отсечён ценой
+    assert facets["categories"] == [{"id": category.id, "name": category.name, "count": 1}]
+    assert facets["prices"][0] == {"min": 0, "max": 500, "count": 1}
+    assert sum(bucket["count"] for bucket in facets["prices"]) == 1
+
+    resp = await async_client.patch(f"/products/{expensive.id}", json={"price": 900.0})
+    assert resp.status_code == 200
+
+    facets = (await async_client.get("/products/facets", params=params)).json()
+    assert {c["id"]: c["count"] for c in facets["categories"]} == {category.id: 1, other.id: 1}
+    assert facets["total"] == 1
+
+    # границы начинаются не с 0 - товар за 100 не попадает в верхний диапазон
+    monkeypatch.setattr(facet_index, "price_edges", (500, 1000))
+    facet_index.mark_stale()
+    facets = (await async_client.get("/products/facets", params={"category_ids": [category.id]})).json()
+    assert [bucket["count"] for bucket in facets["prices"]] == [1, 0]
+
+
+@pytest.mark.asyncio
+async def test_get_products_include_descendants(
+    async_client: AsyncClient,
+    category,
+    category_factory,
+    product_factory,
+    product_payload_factory,
+    db_session,
+    monkeypatch,
+):
+    """Фильтр по категории с подкатегориями - в списке и фасетах"""
+    child = await category_factory(parent_id=category.id)
+    grandchild = await category_factory(parent_id=child.id)
+    own = await product_factory()
+    nested = Product(**product_payload_factory(category_id=grandchild.id))
+    db_session.add(nested)
+    await db_session.commit()
+
+    monkeypatch.setattr(facet_index, "session_factory", async_sessionmaker(bind=db_session.bind))
+    monkeypatch.setattr(facet_index, "reload_interval", 0)
+    facet_index.mark_stale()
+
+    resp = await async_client.get("/products/", params={"category_id": category.id})
+    assert [p["id"] for p in resp.json()] == [own.id]
+
+    params = {"category_id": category.id, "include_descendants": True}
+    resp = await async_client.get("/products/", params=params)
+    assert [p["id"] for p in resp.json()] == [own.id, nested.id]
+    resp = await async_client.get("/products/", params={"category_id": child.id, "include_descendants": True})
+    assert [p["id"] for p in resp.json()] == [nested.id]
+
+    facets = (await async_client.get("/products/facets", params=params)).json()
+    assert facets["total"] == 2
+
+
+@pytest.mark.asyncio
+async def test_get_product_suggestions(
+    async_client: AsyncClient,
+    category,
+    product_factory,
+    product_payload_factory,
+    override_admin_dependency,
+    db_session,
+    monkeypatch,
+):
+    """Подсказки по началу любого слова, по популярности; индекс следует за изменениями товаров"""
+    monkeypatch.setattr(suggest_index, "session_factory", async_sessionmaker(bind=db_session.bind))
+    suggest_index.mark_stale()
+
+    rare = await product_factory(title="Чехол для iPhone 15")
+    popular = await product_factory(title="Apple iPhone 15 Pro")
+    charger = await product_factory(title="Зарядка USB-C")
+    for product, score in ((rare, 1.0), (popular, 10.0), (charger, 5.0)):
+        product.popularity_score = score
+    await db_session.commit()
+
+    resp = await async_client.get("/products/suggest", params={"q": "IPH"})
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["products"] == [
+        {"id": popular.id, "title": popular.title},
+        {"id": rare.id, "title": rare.title},
+    ]
+    assert data["categories"] == []
+
+    resp = await async_client.get("/products/suggest", params={"q": "iph", "limit": 1})
+    assert [p["id"] for p in resp.json()["products"]] == [popular.id]
+
+    # после загрузки индекс обновляется без перечитывания
+    payload = product_payload_factory(category_id=category.id, title="iPhone 16 Pro Max")
+    resp = await async_client.post("/products/", json=payload)
+    assert resp.status_code == 201
+    created = resp.json()
+    resp = await async_client.patch(f"/products/{rare.id}", json={"title": "Чехол для Pixel"})
+    assert resp.status_code == 200
+    resp = await async_client.delete(f"/products/{popular.id}")
+    assert resp.status_code == 204
+
+    data = (await async_client.get("/products/suggest", params={"q": "iph"})).json()
+    assert data["products"] == [{"id": created["id"], "title": "iPhone 16 Pro Max"}]
+    resp = await async_client.patch(f"/category/{category.id}", json={"name": "Смартфоны и гаджеты"})
+    assert resp.status_code == 200
+    data = (await async_client.get("/products/suggest", params={"q": "гадж"})).json()
+    assert data["categories"] == [{"id": category.id, "name": "Смартфоны и гаджеты"}]
+
+    resp = await async_client.get("/products/suggest", params={"q": "i"})
+    assert resp.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_get_products_total_count(
+    async_client: AsyncClient,
+    category,
+    product_factory,
+):
+    """X-Total-Count только по запросу; точное количество кэшируется, оценка помечается неточной"""
+    row_counter.clear()
+    for price in (10.0, 20.0, 30.0):
+        await product_factory(price=price)
+
+    resp = await async_client.get("/products/", params={"limit": 1})
+    assert "X-Total-Count" not in resp.headers
+
+    resp = await async_client.get("/products/", params={"limit": 1, "count": "exact", "min_price": 15})
+    assert len(resp.json()) == 1
+    assert resp.headers["X-Total-Count"] == "2"
+    assert resp.headers["X-Total-Count-Exact"] == "true"
+
+    # в пределах COUNT_CACHE_TTL_SECONDS количество берётся из кэша
+    await product_factory(price=40.0)
+    resp = await async_client.get("/products/", params={"offset": 1, "count": "exact", "min_price": 15})
+    assert resp.headers["X-Total-Count"] == "2"
+
+    # маленькая выборка - estimated считает точно
+    params = {"count": "estimated", "category_id": category.id}
+    resp = await async_client.get("/products/", params=params)
+    assert resp.headers["X-Total-Count"] == "4"
+    assert resp.headers["X-Total-Count-Exact"] == "true"
+
+    resp = await async_client.get("/products/", params={"count": "planned"})
+    assert resp.status_code == 200
+    assert int(resp.headers["X-Total-Count"]) >= 0
+    assert resp.headers["X-Total-Count-Exact"] == "false"
+
+
+@pytest.mark.asyncio
+async def test_get_products_sparse_fields(
+    async_client: AsyncClient,
+    category,
+    product_factory,
+):
+    """fields= ограничивает колонки запроса и поля ответа"""
+    product = await product_factory(price=42.0)
+
+    resp = await async_client.get("/products/", params={"fields": "title,price"})
+    assert resp.status_code == 200
+    assert resp.json() == [{"id": product.id, "title": product.title, "price": 42.0}]
+
+    resp = await async_client.get("/products/", params={"fields": "category", "count": "exact"})
+    assert resp.json() == [{"id": product.id, "category": {"id": category.id, "name": category.name}}]
+    assert resp.headers["X-Total-Count"] == "1"
+
+    resp = await async_client.get("/products/", params={"fields": "title,secret"})
+    assert resp.status_code == 400
+
+    sql = str(build_product_query_with_filters(fields=frozenset({"id", "title"})))
+    assert "products.title" in sql
+    assert "products.description" not in sql
+
+
 @pytest.mark.asyncio
 async def test_get_products_pagination(
     async_client: AsyncClient,
@@ -81,6 +358,29 @@ async def test_get_product_by_id(
     assert data["title"] == product2.title
 
 
+@pytest.mark.asyncio
+async def test_get_products_batch(
+    async_client: AsyncClient,
+    product_factory,
+    category,
+):
+    """Несколько товаров одним запросом: порядок запроса, без повторов, с отсутствующими id"""
+    first = await product_factory()
+    second = await product_factory()
+
+    resp = await async_client.get("/products/batch", params={"ids": [second.id, 999999, first.id, second.id]})
+    assert resp.status_code == 200
+    data = resp.json()
+    assert [p["id"] for p in data["products"]] == [second.id, first.id]
+    assert data["products"][0]["category"] == {"id": category.id, "name": category.name}
+    assert data["missing"] == [999999]
+
+    resp = await async_client.get("/products/batch", params={"ids": list(range(1, 102))})
+    assert resp.status_code == 422
+    resp = await async_client.get("/products/batch")
+    assert resp.status_code == 422
+
+
 @pytest.mark.asyncio
 async def test_get_product_by_invalid_id(
     async_client: AsyncClient,
@@ -136,6 +436,24 @@ async def test_create_product_edge_cases(
     assert resp.status_code == 201
 
 
+@pytest.mark.asyncio
+async def test_create_product_invalid_category(
+    async_client: AsyncClient,
+    product_payload_factory,
+    override_admin_dependency,
+    db_session,
+):
+    """Создание с несуществующей категорией - 404 по нарушению внешнего ключа"""
+    payload = product_payload_factory(99999)
+
+    resp = await async_client.post("/products/", json=payload)
+    assert resp.status_code == 404
+    assert resp.json()["detail"] == "Категория не найдена"
+
+    result = await db_session.execute(select(Product).where(Product.title == payload["title"]))
+    assert result.scalars().first() is None
+
+
 @pytest.mark.asyncio
 async def test_create_product_validation_errors(
     async_client: AsyncClient,
@@ -473,3 +791,153 @@ async def test_delete_product_invalid_id(
 
     data = resp.json()
     assert data["detail"] == "Товар не найден"
+
+
+@pytest.mark.asyncio
+async def test_stock_feed_coalesces_admin_updates(
+    async_client: AsyncClient,
+    product_factory,
+    override_admin_dependency,
+    db_session,
+):
+    """Несколько правок остатка до рассылки приходят подписчику одним значением"""
+    product = await product_factory(stock_quantity=5)
+    other = await product_factory(stock_quantity=5)
+
+    subscriber = StockSubscriber()
+    stock_feed.subscribe(subscriber, [product.id])
+    try:
+        for quantity in (8, 3):
+            resp = await async_client.patch(f"/products/{product.id}", json={"stock_quantity": quantity})
+            assert resp.status_code == 200
+        # на этот товар никто не подписан - в рассылку он не попадает
+        resp = await async_client.patch(f"/products/{other.id}", json={"stock_quantity": 1})
+        assert resp.status_code == 200
+
+        assert await stock_feed.flush(db_session) == 1
+        assert await asyncio.wait_for(subscriber.get(), timeout=1) == {product.id: 3}
+        assert await stock_feed.flush(db_session) == 0
+    finally:
+        stock_feed.unsubscribe(subscriber)
+
+
+@pytest.mark.asyncio
+async def test_stock_websocket_subscribe(
+    async_client: AsyncClient,
+    product_factory,
+    override_admin_dependency,
+    db_session,
+):
+    """WebSocket: текущий остаток при подписке, затем изменения"""
+    product = await product_factory(stock_quantity=5)
+
+    # httpx не умеет WebSocket - общаемся с ASGI-приложением напрямую
+    incoming: asyncio.Queue = asyncio.Queue()
+    outgoing: asyncio.Queue = asyncio.Queue()
+    scope = {
+        "type": "websocket",
+        "asgi": {"version": "3.0"},
+        "scheme": "ws",
+        "path": "/products/stock/ws",
+        "raw_path": b"/products/stock/ws",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [],
+        "client": ("127.0.0.1", 12345),
+        "server": ("test", 80),
+        "subprotocols": [],
+    }
+
+    async def receive_json():
+        message = await asyncio.wait_for(outgoing.get(), timeout=5)
+        return json.loads(message["text"])
+
+    await incoming.put({"type": "websocket.connect"})
+    connection = asyncio.create_task(app(scope, incoming.get, outgoing.put))
+    try:
+        assert (await asyncio.wait_for(outgoing.get(), timeout=5))["type"] == "websocket.accept"
+
+        await incoming.put({"type": "websocket.receive", "text": json.dumps({"action": "watch"})})
+        assert (await receive_json())["error"] == "Некорректное сообщение"
+        await incoming.put({"type": "websocket.receive", "text": "{not json"})
+        assert (await receive_json())["error"] == "Некорректное сообщение"
+
+        subscribe = {"action": "subscribe", "product_ids": [product.id]}
+        await incoming.put({"type": "websocket.receive", "text": json.dumps(subscribe)})
+        assert await receive_json() == {"stock": {str(product.id): 5}}
+
+        resp = await async_client.patch(f"/products/{product.id}", json={"stock_quantity": 9})
+        assert resp.status_code == 200
+        await stock_feed.flush(db_session)
+        assert await receive_json() == {"stock": {str(product.id): 9}}
+    finally:
+        await incoming.put({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(connection, timeout=5)
+
+
+@pytest.mark.asyncio
+async def test_related_products(
+    async_client: AsyncClient,
+    product_factory,
+    order_factory,
+    user_factory,
+    db_session,
+):
+    """Рекомендации строятся по совместным заказам, отменённые заказы не учитываются;
+    товару без рекомендаций отдаются популярные товары категории"""
+    user = await user_factory()
+    first, second, third, lonely = [await product_factory() for _ in range(4)]
+    baskets = [
+        (OrderStatus.PENDING, [first, second]),
+        (OrderStatus.DELIVERED, [first, second]),
+        (OrderStatus.PENDING, [first, third]),
+        (OrderStatus.SHIPPED, [first, third, second]),
+        (OrderStatus.PENDING, [third]),
+        # пара встречается реже порога RECOMMENDATIONS_MIN_ORDERS
+        (OrderStatus.PENDING, [third, lonely]),
+        (OrderStatus.CANCELLED, [first, lonely]),
+        (OrderStatus.CANCELLED, [first, lonely]),
+    ]
+    for order_status, products in baskets:
+        quantities = {product: 1 for product in products}
+        await place_order(order_factory, db_session, quantities, user=user, order_status=order_status)
+
+    # first-second: 3 общих заказа, first-third и second-third: 2 и 1
+    assert await rebuild_recommendations(db_session, min_orders=2, metric="cosine") == 4
+    await db_session.commit()
+
+    resp = await async_client.get(f"/products/{first.id}/related")
+    assert resp.status_code == 200
+    assert [p["id"] for p in resp.json()] == [second.id, third.id]
+    assert resp.json()[0]["category"]["id"] == second.category_id
+
+    resp = await async_client.get(f"/products/{first.id}/related", params={"limit": 1})
+    assert [p["id"] for p in resp.json()] == [second.id]
+
+    resp = await async_client.get(f"/products/{third.id}/related")
+    assert [p["id"] for p in resp.json()] == [first.id]
+
+    third.popularity_score = 5
+    await db_session.commit()
+    resp = await async_client.get(f"/products/{lonely.id}/related")
+    assert resp.status_code == 200
+    assert [p["id"] for p in resp.json()] == [third.id, first.id, second.id]
+
+    resp = await async_client.get("/products/999999/related")
+    assert resp.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_refresh_popularity_skips_when_running(db_session, async_engine):
+    """Пока рейтинг пересчитывается в другой транзакции, запуск пропускается"""
+    async with async_engine.connect() as other:
+        await other.execute(select(func.pg_advisory_xact_lock(POPULARITY_LOCK)))
+        assert await refresh_popularity_scores(db_session) is None
+
+
+@pytest.mark.asyncio
+async def test_rebuild_recommendations_skips_when_running(db_session, async_engine):
+    """Пока пересчёт идёт в другой транзакции, запуск пропускается"""
+    async with async_engine.connect() as other:
+        await other.execute(select(func.pg_advisory_xact_lock(RECOMMENDATIONS_LOCK)))
+        assert await rebuild_recommendations(db_session) is None
@@ -6,8 +6,10 @@ from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_asyn
 from sqlalchemy.pool import NullPool
 
 from app.auth.services import validate_user_admin_service
+from app.categories.catalog import category_catalog
 from app.core.config import settings
 from app.core.database import Base, get_async_session
+from app.core.rate_limit import rate_limit_backend
 from app.main import app
 from app.users.models import User
 
@@ -81,6 +83,21 @@ async def async_client(override_get_db):
     app.dependency_overrides.clear()
 
 
+@pytest.fixture(autouse=True)
+async def reset_rate_limits():
+    # корзины токенов общие для процесса - каждый тест начинает с полными лимитами
+    await rate_limit_backend.reset()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def reset_category_catalog(db_session, monkeypatch):
+    # снимок категорий общий для процесса, а данные теста откатываются вместе с транзакцией;
+    # справочник перечитывается через соединение теста, чтобы видеть его данные
+    monkeypatch.setattr(category_catalog, "session_factory", async_sessionmaker(bind=db_session.bind))
+    category_catalog.mark_stale()
+
+
 @pytest.fixture()
 async def override_admin_dependency():
     async def _fake_admin():
@@ -114,7 +131,7 @@ async def auth_client_non_admin(async_client, non_admin_user):
         get_current_auth_user = None
 
     async def _override_get_current_user(
-        session: AsyncSession = Depends(get_async_session),
+        session: AsyncSession = Depends(get_async_session, scope="function"),
     ):
         result = await session.execute(select(User).where(User.id == non_admin_user.id))
         user = result.scalars().first()
@@ -5,6 +5,8 @@ import pytest
 from app.cart.models import Cart, CartItem
 from app.categories.models import Category
 from app.core.security import get_password_hash
+from app.orders.models import DeliveryAddress, Order
+from app.orders.schemas import OrderStatus, PaymentMethods, PaymentStatus
 from app.products.models import Product
 from app.users.models import User
 
@@ -13,11 +15,12 @@ from app.users.models import User
 async def category_payload_factory():
     """Возвращает фабрику payload'ов для категорий"""
 
-    def _factory(name=None, description="Test Description Cat"):
+    def _factory(name=None, description="Test Description Cat", parent_id=None):
         name = name or f"Test Cat {uuid.uuid4().hex[:6]}"
         return {
             "name": name,
             "description": description,
+            "parent_id": parent_id,
         }
 
     return _factory
@@ -234,3 +237,30 @@ def order_create_data_factory():
         return {**defaults, **kwargs}
 
     return _factory
+
+
+@pytest.fixture
+async def order_factory(db_session, user_factory):
+    """Фабрика для создания заказа (без товаров, с адресом доставки)"""
+
+    async def _factory(**kwargs):
+        user = kwargs.pop("user", None)
+        if user is None:
+            user = await user_factory()
+
+        defaults = {
+            "subtotal": 0,
+            "shipping_price": 200,
+            "total": 200,
+            "payment_method": PaymentMethods.CASH,
+            "order_status": OrderStatus.PENDING,
+            "payment_status": PaymentStatus.PENDING,
+        }
+        order = Order(user_id=user.id, **{**defaults, **kwargs})
+        order.delivery_address = DeliveryAddress(city="Test City", country="Test Country")
+        db_session.add(order)
+        await db_session.commit()
+        await db_session.refresh(order)
+        return order
+
+    return _factory